@@ -0,0 +1,139 @@
+import hashlib
+import inspect
+import json
+import os
+import tempfile
+from config_trace import trace_config_reads
+
+# Content-addressed artifact cache for build.py stages.
+#
+# A stage's cache key is a hash of its generator sources, its input files and
+# the values of only those config attributes it actually read the last time it
+# ran, as traced by config_trace.trace_config_reads(). Cache layout (safe to
+# share between machines, e.g. on a network drive, since every file is written
+# atomically and never modified):
+#
+#   manifests/<stage key>.json   -> lists of config attribute names read
+#   entries/<full key>.json      -> {output path: object hash}
+#   objects/<ab>/<object hash>   -> artifact bytes
+
+DEFAULT_CACHE_DIR = os.environ.get("ESPHID_CACHE_DIR", ".build_cache")
+
+MISSING = "<missing>"
+
+def sha256_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def atomic_write(path, data):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def stage_key(stage):
+    # Everything that identifies a stage except the config values it reads.
+    # config.py itself is deliberately excluded: only the attributes read count.
+    digest = hashlib.sha256()
+    digest.update(stage.name.encode())
+    digest.update(repr(stage.args).encode())
+    digest.update(inspect.getsource(stage.func).encode())
+    for path in stage.inputs:
+        if os.path.basename(path) == "config.py":
+            continue
+        digest.update(path.encode())
+        digest.update(sha256_file(path).encode() if os.path.exists(path) else MISSING.encode())
+    return digest.hexdigest()
+
+def values_key(base_key, attribute_names):
+    import config
+    digest = hashlib.sha256(base_key.encode())
+    for name in sorted(attribute_names):
+        value = getattr(config, name, MISSING)
+        digest.update(f"{name}={value!r}\n".encode())
+    return digest.hexdigest()
+
+class ArtifactCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def _path(self, *parts):
+        return os.path.join(self.cache_dir, *parts)
+
+    def _object_path(self, object_hash):
+        return self._path("objects", object_hash[:2], object_hash)
+
+    def _read_json(self, path, default):
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return default
+
+    def restore(self, stage):
+        # Copy cached outputs back into place; returns True on a cache hit
+        base_key = stage_key(stage)
+        for attribute_names in self._read_json(self._path("manifests", base_key + ".json"), []):
+            entry = self._read_json(self._path("entries", values_key(base_key, attribute_names) + ".json"), None)
+            if entry is None:
+                continue
+            outputs = entry["outputs"]
+            if set(outputs) != set(stage.outputs):
+                continue
+            if not all(os.path.exists(self._object_path(h)) for h in outputs.values()):
+                continue
+            for output, object_hash in outputs.items():
+                with open(self._object_path(object_hash), "rb") as f:
+                    atomic_write(output, f.read())
+            return True
+        return False
+
+    def store(self, stage, attribute_names):
+        # Record the outputs of a freshly run stage; skipped if any output is missing
+        if not all(os.path.exists(output) for output in stage.outputs):
+            return False
+        base_key = stage_key(stage)
+        outputs = {}
+        for output in stage.outputs:
+            with open(output, "rb") as f:
+                data = f.read()
+            object_hash = sha256_bytes(data)
+            if not os.path.exists(self._object_path(object_hash)):
+                atomic_write(self._object_path(object_hash), data)
+            outputs[output] = object_hash
+
+        full_key = values_key(base_key, attribute_names)
+        entry = {"stage": stage.name, "config": sorted(attribute_names), "outputs": outputs}
+        atomic_write(self._path("entries", full_key + ".json"), json.dumps(entry, indent=2).encode())
+
+        manifest_path = self._path("manifests", base_key + ".json")
+        known = self._read_json(manifest_path, [])
+        names = sorted(attribute_names)
+        if names not in known:
+            known.append(names)
+            atomic_write(manifest_path, json.dumps(known).encode())
+        return True
+
+def run_cached(stage, cache):
+    # Restore a stage's outputs from the cache or run it and store the result.
+    # Stages without outputs (e.g. printed reports) always run.
+    if stage.outputs and cache.restore(stage):
+        print(f"Restored {', '.join(stage.outputs)} from cache")
+        return True
+    with trace_config_reads() as tracer:
+        stage.func(*stage.args)
+    if stage.outputs:
+        cache.store(stage, tracer.reads)
+    return False
@@ -0,0 +1,269 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import timeit
+from contextlib import contextmanager
+import config
+
+# Benchmark suite for the generators, scaled by button count.
+# Every benchmark runs against a synthetic config with NUM_BUTTONS buttons (the
+# case is lengthened so the footswitch row still fits, which also scales the
+# number of holes on the top panel), inside a scratch directory so no tracked
+# artifact is touched. Nothing here needs openscad, ImageMagick or graphviz's
+# `dot`. Results are compared against a stored baseline; a benchmark that got
+# slower than the baseline by more than the threshold fails the run.
+
+DEFAULT_BASELINE = "benchmark_baseline.json"
+DEFAULT_BUTTON_COUNTS = [7, 50, 200, 1000]
+DEFAULT_THRESHOLD = 0.25 # Fail when more than 25% slower than the baseline
+
+def synthetic_values(num_buttons):
+    # Config overrides for a build with num_buttons footswitches in one row
+    footswitch_row = num_buttons * config.FOOTSWITCH_CAP_DIAMETER + (num_buttons - 1) * config.BUTTON_SPACING
+    return {
+        "NUM_BUTTONS": num_buttons,
+        "BUTTON_WIRING": "direct",
+        "BUTTON_GPIO_PINS": list(range(num_buttons)),
+        "CASE_LENGTH": max(config.CASE_LENGTH, footswitch_row + 2 * config.BUTTON_SPACING),
+    }
+
+@contextmanager
+def synthetic_config(num_buttons):
+    # Temporarily patch the shared config module, which the generators read directly
+    values = synthetic_values(num_buttons)
+    saved = {name: getattr(config, name) for name in values}
+    for name, value in values.items():
+        setattr(config, name, value)
+    try:
+        yield config
+    finally:
+        for name, value in saved.items():
+            setattr(config, name, value)
+
+# --- Benchmarks: each takes the patched config and returns a callable to time ---
+
+def bench_pcb_netlist(cfg):
+    import generate_button_pcb
+    return generate_button_pcb.generate_button_pcb_netlist
+
+def bench_pcb_route(cfg):
+    # Placement and routing of a square key matrix with NUM_BUTTONS keys, the
+    # wiring that makes routing hard; capped at the firmware's 256 matrix positions
+    import math
+    import generate_button_pcb
+    import pcb_router
+    keys = min(cfg.NUM_BUTTONS, 256)
+    rows = math.ceil(math.sqrt(keys))
+    cols = math.ceil(keys / rows)
+    matrix = {
+        "NUM_BUTTONS": keys,
+        "BUTTON_WIRING": "matrix",
+        "MATRIX_ROW_PINS": list(range(rows)),
+        "MATRIX_COL_PINS": list(range(rows, rows + cols)),
+        "BUTTON_ACTIONS": [((i // cols, i % cols), "KEY_A", "auto") for i in range(keys)],
+    }
+    def run():
+        saved = {name: getattr(cfg, name) for name in matrix}
+        for name, value in matrix.items():
+            setattr(cfg, name, value)
+        try:
+            board = pcb_router.route_board(generate_button_pcb.netlist_components(), generate_button_pcb.netlist_nets(), cfg)
+        finally:
+            for name, value in saved.items():
+                setattr(cfg, name, value)
+        if board.unrouted:
+            raise RuntimeError(f"pcb_router left {len(board.unrouted)} net(s) unrouted")
+    return run
+
+def bench_circuit_schematic(cfg):
+    # Grid schematic SVG and PNG drawn from the netlist model
+    import circuit_schematic
+    import generate_button_pcb
+    components, nets, gpios = generate_button_pcb.netlist_components(), generate_button_pcb.netlist_nets(), generate_button_pcb.connector_gpios()
+    return lambda: circuit_schematic.write_schematic(components, nets, gpios, "button_circuit_diagram.svg", "button_circuit_diagram.png")
+
+def bench_footswitch_holes(cfg):
+    import generate_case
+    from solid.solidpython import scad_render
+    return lambda: scad_render(generate_case.create_footswitch_holes())
+
+def bench_assemble_case(cfg):
+    import generate_case
+    from solid.solidpython import scad_render
+    return lambda: scad_render(generate_case.assemble_case())
+
+def bench_case_scad_files(cfg):
+    # The base and lid .scad sources written by write_case_scad()
+    import generate_case
+    return lambda: (generate_case.case_base_scad(), generate_case.case_lid_scad())
+
+def bench_lasercut_case(cfg):
+    import generate_lasercut_case
+    return lambda: generate_lasercut_case.generate_lasercut_case(cfg)
+
+def bench_lasercut_case_dxf_stream(cfg):
+    import generate_lasercut_case
+    return lambda: generate_lasercut_case.generate_lasercut_case(cfg, writer="stream")
+
+def bench_dxf_to_svg(cfg):
+    import generate_lasercut_case
+    import render_cases
+    generate_lasercut_case.generate_panel("top", cfg)
+    def run():
+        render_cases.convert_dxf_to_svg("esp32_lasercut_case_top.dxf", "esp32_lasercut_case_top.svg")
+        if not os.path.exists("esp32_lasercut_case_top.svg"):
+            raise RuntimeError("convert_dxf_to_svg did not write an SVG")
+    return run
+
+def bench_dxf_preview_tiles(cfg):
+    # Streamed DXF -> tile pyramid of the top panel, whose hole count scales with the buttons
+    import dxf_preview
+    import generate_lasercut_case
+    generate_lasercut_case.generate_panel("top", cfg)
+    return lambda: dxf_preview.write_tile_pyramid("esp32_lasercut_case_top.dxf", "preview_top", cfg=cfg)
+
+def bench_lasercut_png_in_memory(cfg):
+    # Generator -> renderer without writing or re-reading a DXF
+    import generate_lasercut_case
+    import render_cases
+    return lambda: render_cases.rasterize_dxf(generate_lasercut_case.build_panel("top", cfg))
+
+def bench_design_rules(cfg):
+    import design_rules
+    return lambda: design_rules.check_design(cfg)
+
+def bench_print_estimates(cfg):
+    from generate_bom_and_estimates import calculate_3d_print_estimates
+    return lambda: calculate_3d_print_estimates(cfg)
+
+def bench_sliced_print_estimates(cfg):
+    import generate_case
+    import print_slicer
+    return lambda: print_slicer.sliced_print_estimates(generate_case.assemble_case(), cfg)
+
+def bench_laser_estimates(cfg):
+    from generate_bom_and_estimates import calculate_laser_cut_estimates
+    return lambda: calculate_laser_cut_estimates(cfg)
+
+BENCHMARKS = {
+    "pcb_netlist": bench_pcb_netlist,
+    "pcb_route": bench_pcb_route,
+    "circuit_schematic": bench_circuit_schematic,
+    "footswitch_holes_scad": bench_footswitch_holes,
+    "assemble_case_scad": bench_assemble_case,
+    "case_scad_files": bench_case_scad_files,
+    "lasercut_case_dxf": bench_lasercut_case,
+    "lasercut_case_dxf_stream": bench_lasercut_case_dxf_stream,
+    "dxf_to_svg": bench_dxf_to_svg,
+    "dxf_preview_tiles": bench_dxf_preview_tiles,
+    "lasercut_png_in_memory": bench_lasercut_png_in_memory,
+    "design_rules": bench_design_rules,
+    "print_estimates": bench_print_estimates,
+    "sliced_print_estimates": bench_sliced_print_estimates,
+    "laser_estimates": bench_laser_estimates,
+}
+
+@contextmanager
+def quiet():
+    # The generators print a status line per file; keep the benchmark output readable
+    stdout = sys.stdout
+    with open(os.devnull, "w") as devnull:
+        sys.stdout = devnull
+        try:
+            yield
+        finally:
+            sys.stdout = stdout
+
+def time_benchmark(name, num_buttons, repeat):
+    # Best of `repeat` runs, each averaged over enough calls to take ~0.2 s
+    with synthetic_config(num_buttons) as cfg, quiet():
+        func = BENCHMARKS[name](cfg)
+        timer = timeit.Timer(func)
+        number, _ = timer.autorange()
+        return min(timer.repeat(repeat, number)) / number
+
+def run_benchmarks(names, button_counts, repeat):
+    results = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        try:
+            for name in names:
+                for num_buttons in button_counts:
+                    results.setdefault(name, {})[str(num_buttons)] = time_benchmark(name, num_buttons, repeat)
+                    yield name, num_buttons, results[name][str(num_buttons)]
+        finally:
+            os.chdir(cwd)
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def save_baseline(path, results):
+    # Merged into an existing baseline, so a subset can be re-measured on its own
+    merged = (load_baseline(path) or {}).get("results", {})
+    for name, timings in results.items():
+        merged.setdefault(name, {}).update(timings)
+    baseline = {
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "processor": platform.processor()},
+        "results": merged,
+    }
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"Saved baseline: {path}")
+
+def format_seconds(seconds):
+    if seconds >= 1:
+        return f"{seconds:.3f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.3f} ms"
+    return f"{seconds * 1e6:.1f} us"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the generators against synthetic configs and a stored baseline.")
+    parser.add_argument("benchmarks", nargs="*", help=f"Benchmarks to run (default: all). Available: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--buttons", default=",".join(str(n) for n in DEFAULT_BUTTON_COUNTS), help="Button counts, comma separated")
+    parser.add_argument("--repeat", type=int, default=7, help="Timing repeats per benchmark (best is kept)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed slowdown as a fraction, e.g. 0.25")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    args = parser.parse_args()
+
+    names = args.benchmarks or list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        raise SystemExit(f"Unknown benchmark(s): {', '.join(unknown)}. Available: {', '.join(BENCHMARKS)}")
+    button_counts = [int(n) for n in args.buttons.split(",")]
+    baseline = None if args.save_baseline else load_baseline(args.baseline)
+    baseline_results = baseline["results"] if baseline else {}
+
+    print(f"\n--- Benchmarks (best of {args.repeat}, threshold +{args.threshold * 100:.0f}%) ---")
+    print(f"  {'benchmark':<24} {'buttons':>7} {'time':>12} {'baseline':>12} {'change':>8}")
+    results = {}
+    regressions = []
+    for name, num_buttons, seconds in run_benchmarks(names, button_counts, args.repeat):
+        results.setdefault(name, {})[str(num_buttons)] = seconds
+        reference = baseline_results.get(name, {}).get(str(num_buttons))
+        status = ""
+        if reference:
+            change = seconds / reference - 1
+            status = f"{change * 100:+7.1f}%"
+            if change > args.threshold:
+                status += "  REGRESSION"
+                regressions.append((name, num_buttons, change))
+        print(f"  {name:<24} {num_buttons:>7} {format_seconds(seconds):>12} "
+              f"{format_seconds(reference) if reference else '-':>12} {status}")
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+    elif baseline is None:
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one.")
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) slower than the baseline by more than {args.threshold * 100:.0f}%.")
+        raise SystemExit(1)
@@ -0,0 +1,254 @@
+import argparse
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import profiling
+
+# Parallel build runner for all generated artifacts.
+# Each stage declares the files it reads and writes; a stage is started as soon
+# as every input produced by another stage exists, so e.g. a DXF is rendered
+# while the other panels are still being written. All stages share one process
+# pool, so solid/ezdxf/graphviz are imported once per worker instead of once
+# per script. Unless disabled, outputs are restored from a content-addressed
+# cache (artifact_cache.py) keyed on the config values each stage reads. The
+# design rule check (design_rules.py) runs first, so a config with holes off
+# the panel or colliding parts is rejected before anything is rendered.
+
+RENDERINGS_DIR = "renderings"
+
+Stage = namedtuple("Stage", ["name", "func", "args", "inputs", "outputs"])
+
+LASERCUT_PANELS = ["top", "bottom", "front_back", "left_right"]
+CASE_PARTS = {"base": "esp32_footswitch_case_base.scad", "lid": "esp32_footswitch_case_lid.scad"}
+
+# --- Stage functions (module-level so they can be sent to worker processes) ---
+
+def build_config_h():
+    import generate_firmware_config
+    generate_firmware_config.generate_firmware_config_h()
+
+def build_case_scad(base_file, lid_file):
+    import generate_case
+    generate_case.write_case_scad(base_file, lid_file)
+
+def build_case_stl(stl_file, preview_png):
+    import case_mesh
+    case_mesh.write_case_stl(stl_file, preview_png=preview_png)
+
+def build_lasercut_panel(panel):
+    import config
+    import generate_lasercut_case
+    generate_lasercut_case.generate_panel(panel, config)
+
+def build_lasercut_sheets():
+    import config
+    import generate_lasercut_sheets
+    generate_lasercut_sheets.generate_lasercut_sheets(config)
+
+def build_scad_rendering(scad_file, output_png):
+    import config
+    import render_cases
+    render_cases.render_openscad_model(scad_file, output_png, camera_params=config.RENDERING_CAMERA_PARAMS_3D)
+
+def build_dxf_rendering(dxf_file, output_png):
+    import config
+    import render_cases
+    render_cases.convert_dxf_to_png(dxf_file, output_png, width=config.RENDERING_IMAGE_WIDTH, height=config.RENDERING_IMAGE_HEIGHT)
+
+def build_bom():
+    import generate_bom_and_estimates
+    generate_bom_and_estimates.print_bom_and_estimates()
+
+def build_pcb_netlist():
+    import generate_button_pcb
+    generate_button_pcb.generate_button_pcb_netlist()
+
+def build_pcb_layout():
+    import generate_button_pcb
+    generate_button_pcb.generate_conceptual_layout()
+
+def build_pcb_board():
+    import generate_button_pcb
+    generate_button_pcb.generate_kicad_pcb()
+
+def build_circuit_diagram():
+    # Both renderers write the SVG and the PNG
+    import generate_button_pcb
+    generate_button_pcb.render_circuit_diagram()
+
+# --- Stage graph ---
+
+def define_stages():
+    stages = [
+        Stage("config_h", build_config_h, (),
+              ["generate_firmware_config.py", "config.py"], ["config.h"]),
+        Stage("case_scad", build_case_scad, tuple(CASE_PARTS.values()),
+              ["generate_case.py", "layout.py", "config.py"], list(CASE_PARTS.values())),
+        Stage("case_stl", build_case_stl,
+              ("esp32_footswitch_case.stl", os.path.join(RENDERINGS_DIR, "esp32_footswitch_case_preview.png")),
+              ["case_mesh.py", "generate_case.py", "layout.py", "config.py"],
+              ["esp32_footswitch_case.stl", os.path.join(RENDERINGS_DIR, "esp32_footswitch_case_preview.png")]),
+    ]
+
+    for part, scad_file in CASE_PARTS.items():
+        png_file = os.path.join(RENDERINGS_DIR, f"esp32_footswitch_case_{part}.png")
+        stages.append(Stage(f"render_case_{part}", build_scad_rendering, (scad_file, png_file),
+                            ["render_cases.py", "canonical_output.py", "config.py", scad_file], [png_file]))
+
+    for panel in LASERCUT_PANELS:
+        dxf_file = f"esp32_lasercut_case_{panel}.dxf"
+        png_file = os.path.join(RENDERINGS_DIR, f"esp32_lasercut_case_{panel}.png")
+        stages.append(Stage(f"lasercut_{panel}", build_lasercut_panel, (panel,),
+                            ["generate_lasercut_case.py", "layout.py", "dxf_writer.py", "laser_toolpath.py", "canonical_output.py", "config.py"], [dxf_file]))
+        stages.append(Stage(f"render_lasercut_{panel}", build_dxf_rendering, (dxf_file, png_file),
+                            ["render_cases.py", "config.py", dxf_file],
+                            [png_file]))
+
+    stages += [
+        # The sheet count depends on the nesting result, so the sheet DXFs are
+        # not declared as outputs and this stage always runs
+        Stage("lasercut_sheets", build_lasercut_sheets, (),
+              ["generate_lasercut_sheets.py", "generate_lasercut_case.py", "layout.py", "dxf_writer.py", "laser_toolpath.py", "canonical_output.py", "config.py"], []),
+        Stage("bom", build_bom, (),
+              ["generate_bom_and_estimates.py", "print_slicer.py", "generate_case.py", "generate_lasercut_case.py", "layout.py", "case_mesh.py", "config.py"], []),
+        Stage("pcb_netlist", build_pcb_netlist, (),
+              ["generate_button_pcb.py", "config.py"], ["button_pcb.net"]),
+        Stage("pcb_layout", build_pcb_layout, (),
+              ["generate_button_pcb.py", "layout.py", "config.py"], ["button_pcb_layout.txt"]),
+        Stage("pcb_board", build_pcb_board, (),
+              ["generate_button_pcb.py", "pcb_router.py", "layout.py", "config.py"], ["button_pcb.kicad_pcb"]),
+        Stage("circuit_diagram", build_circuit_diagram, (),
+              ["generate_button_pcb.py", "circuit_schematic.py", "canonical_output.py", "config.py"],
+              [os.path.join(RENDERINGS_DIR, "button_circuit_diagram.svg"), os.path.join(RENDERINGS_DIR, "button_circuit_diagram.png")]),
+    ]
+    return stages
+
+def stage_dependencies(stages):
+    # A stage depends on whichever stages produce its inputs
+    producers = {}
+    for stage in stages:
+        for output in stage.outputs:
+            producers[output] = stage.name
+    return {
+        stage.name: {producers[i] for i in stage.inputs if i in producers and producers[i] != stage.name}
+        for stage in stages
+    }
+
+def select_stages(stages, targets):
+    # Restrict the graph to the requested stages plus everything they depend on
+    if not targets:
+        return stages
+    by_name = {stage.name: stage for stage in stages}
+    unknown = [t for t in targets if t not in by_name]
+    if unknown:
+        raise SystemExit(f"Unknown stage(s): {', '.join(unknown)}. Available: {', '.join(by_name)}")
+    deps = stage_dependencies(stages)
+    wanted = set()
+    todo = list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in wanted:
+            wanted.add(name)
+            todo.extend(deps[name])
+    return [stage for stage in stages if stage.name in wanted]
+
+def run_stage(stage, cache_dir=None, profile=False):
+    # Executed in a worker process; returns (wall time in seconds, cache hit, profile spans)
+    if profile:
+        profiling.start_profiling()
+    start = time.perf_counter()
+    try:
+        with profiling.profiled(stage.name, "stage"):
+            if cache_dir:
+                import artifact_cache
+                hit = artifact_cache.run_cached(stage, artifact_cache.ArtifactCache(cache_dir))
+            else:
+                stage.func(*stage.args)
+                hit = False
+    finally:
+        spans = profiling.stop_profiling()
+    return time.perf_counter() - start, hit, spans
+
+def run_stages(stages, jobs=None, cache_dir=None, spans=None):
+    # Pass a list as `spans` to profile every stage; the workers' spans are appended to it
+    deps = stage_dependencies(stages)
+    pending = {stage.name: stage for stage in stages}
+    running = {}
+    timings = {}
+    cached = set()
+    failed = {}
+
+    os.makedirs(RENDERINGS_DIR, exist_ok=True)
+    build_start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            for name in list(pending):
+                blocked = [d for d in deps[name] if d in failed]
+                if blocked:
+                    failed[name] = f"skipped, depends on failed stage {blocked[0]}"
+                    del pending[name]
+                elif all(d in timings for d in deps[name]):
+                    running[pool.submit(run_stage, pending.pop(name), cache_dir, spans is not None)] = name
+
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    timings[name], hit, stage_spans = future.result()
+                    if hit:
+                        cached.add(name)
+                    if spans is not None:
+                        spans.extend(stage_spans)
+                except Exception as e:
+                    failed[name] = f"{type(e).__name__}: {e}"
+    total_wall = time.perf_counter() - build_start
+
+    return timings, cached, failed, total_wall
+
+def print_report(timings, cached, failed, total_wall):
+    print("\n--- Build Report ---")
+    for name, seconds in sorted(timings.items(), key=lambda item: -item[1]):
+        print(f"  {name:<28} {seconds:8.3f} s{'  (cached)' if name in cached else ''}")
+    for name, reason in failed.items():
+        print(f"  {name:<28}   FAILED ({reason})")
+    print(f"  {'sum of stages':<28} {sum(timings.values()):8.3f} s")
+    print(f"  {'total wall time':<28} {total_wall:8.3f} s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build all generated artifacts in parallel.")
+    parser.add_argument("stages", nargs="*", help="Stages to build (default: all). Dependencies are included.")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--list", action="store_true", help="List stages and exit")
+    parser.add_argument("--cache-dir", default=None, help="Artifact cache directory (default: $ESPHID_CACHE_DIR or .build_cache)")
+    parser.add_argument("--no-cache", action="store_true", help="Always rebuild, bypassing the artifact cache")
+    parser.add_argument("--no-drc", action="store_true", help="Build even if the design rule check fails")
+    profiling.add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    stages = define_stages()
+    if args.list:
+        deps = stage_dependencies(stages)
+        for stage in stages:
+            after = f" (after {', '.join(sorted(deps[stage.name]))})" if deps[stage.name] else ""
+            print(f"{stage.name}{after}")
+        raise SystemExit(0)
+
+    if not args.no_drc:
+        import design_rules
+        design_rules.require_clean_design()
+
+    cache_dir = None
+    if not args.no_cache:
+        import artifact_cache
+        cache_dir = args.cache_dir or artifact_cache.DEFAULT_CACHE_DIR
+
+    spans = [] if (args.profile or args.chrome_trace) else None
+    timings, cached, failed, total_wall = run_stages(select_stages(stages, args.stages), args.jobs, cache_dir, spans)
+    print_report(timings, cached, failed, total_wall)
+    if spans is not None:
+        profiling.finish_profile(sorted(spans, key=lambda s: s["start_time"]), args, "build")
+    if failed:
+        raise SystemExit(1)
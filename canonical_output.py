@@ -0,0 +1,124 @@
+import argparse
+import filecmp
+import os
+import struct
+import subprocess
+import sys
+import tempfile
+from collections import OrderedDict
+import ezdxf
+from ezdxf.document import CREATED_BY_EZDXF, ezdxf_marker_string
+import config
+
+# Canonical output mode (config.CANONICAL_OUTPUT): identical designs give
+# identical artifact bytes, so the artifact cache, release diffs and uploads
+# can skip unchanged files.
+#
+# Handles and float formatting are stable in every generator. What varies
+# between runs is what the tools add on their own:
+#   - ezdxf writes creation/update dates, fresh $VERSIONGUID/$FINGERPRINTGUID
+#     values and "ezdxf <version> @ <timestamp>" markers (one stamped by
+#     ezdxf.new(), one by each save), and orders the CLASSES section by
+#     iterating a set of entity types, which follows PYTHONHASHSEED
+#   - graphviz, ImageMagick and OpenSCAD PNGs carry text/time chunks (tool
+#     version, creation date)
+# `canonical_output.py --check` runs the generators under different hash
+# seeds and compares every output byte for byte.
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Ancillary PNG chunks that hold comments, software names and dates, never pixels
+PNG_METADATA_CHUNKS = {b"tEXt", b"zTXt", b"iTXt", b"tIME", b"eXIf"}
+
+# Generators run by --check, and the hash seeds they are compared under
+CHECK_SCRIPTS = ["generate_case.py", "generate_lasercut_case.py", "generate_lasercut_sheets.py", "generate_button_pcb.py"]
+CHECK_SEEDS = ["1", "4"]
+
+def save_dxf(doc, filename, cfg=None):
+    # doc.saveas() with fixed header dates, GUIDs and marker string in canonical mode
+    cfg = config if cfg is None else cfg
+    fixed = ezdxf.options.write_fixed_meta_data_for_testing
+    ezdxf.options.write_fixed_meta_data_for_testing = fixed or cfg.CANONICAL_OUTPUT
+    try:
+        if cfg.CANONICAL_OUTPUT:
+            doc.ezdxf_metadata()[CREATED_BY_EZDXF] = ezdxf_marker_string()
+            # Register every class saveas() would add, then fix their order;
+            # saveas() only appends classes that are still missing
+            doc.classes.add_required_classes(doc.dxfversion)
+            doc.classes.classes = OrderedDict(sorted(doc.classes.classes.items()))
+        doc.saveas(filename)
+    finally:
+        ezdxf.options.write_fixed_meta_data_for_testing = fixed
+
+def strip_png_chunks(data):
+    # PNG bytes without metadata chunks; anything that is not a PNG is returned unchanged
+    if not data.startswith(PNG_SIGNATURE):
+        return data
+    kept = [PNG_SIGNATURE]
+    pos = len(PNG_SIGNATURE)
+    while pos + 8 <= len(data):
+        length, kind = struct.unpack(">I4s", data[pos:pos + 8])
+        end = pos + 12 + length # length, type, data, CRC
+        if kind not in PNG_METADATA_CHUNKS:
+            kept.append(data[pos:end])
+        pos = end
+    return b"".join(kept)
+
+def strip_png_metadata(png_file, cfg=None):
+    # Rewrite a PNG written by an external tool in place, only if it carried metadata
+    cfg = config if cfg is None else cfg
+    if not cfg.CANONICAL_OUTPUT or not os.path.exists(png_file):
+        return
+    with open(png_file, "rb") as f:
+        data = f.read()
+    stripped = strip_png_chunks(data)
+    if stripped != data:
+        with open(png_file, "wb") as f:
+            f.write(stripped)
+
+def run_generators(out_dir, seed):
+    # Every CHECK_SCRIPTS generator in out_dir, with the given PYTHONHASHSEED
+    env = dict(os.environ, PYTHONHASHSEED=seed)
+    source_dir = os.path.dirname(os.path.abspath(__file__))
+    os.makedirs(os.path.join(out_dir, "renderings"), exist_ok=True)
+    for script in CHECK_SCRIPTS:
+        subprocess.run([sys.executable, os.path.join(source_dir, script)], cwd=out_dir, env=env,
+                       check=True, capture_output=True, text=True)
+
+def output_files(out_dir):
+    return sorted(os.path.relpath(os.path.join(root, name), out_dir)
+                  for root, _, names in os.walk(out_dir) for name in names)
+
+def check_byte_stability(seeds=CHECK_SEEDS):
+    # Run the generators once per seed and compare their outputs; returns the differing files
+    with tempfile.TemporaryDirectory() as scratch:
+        runs = [os.path.join(scratch, f"seed_{seed}") for seed in seeds]
+        for run, seed in zip(runs, seeds):
+            print(f"Running generators with PYTHONHASHSEED={seed}...")
+            run_generators(run, seed)
+        files = output_files(runs[0])
+        differing = set()
+        for run in runs[1:]:
+            if output_files(run) != files:
+                differing.update(set(output_files(run)) ^ set(files))
+            differing.update(f for f in files if os.path.exists(os.path.join(run, f))
+                             and not filecmp.cmp(os.path.join(runs[0], f), os.path.join(run, f), shallow=False))
+    return len(files), sorted(differing)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that the generators write byte-identical files under different hash seeds.")
+    parser.add_argument("--check", action="store_true", help="Run the generators per seed and compare their outputs")
+    parser.add_argument("--seeds", default=",".join(CHECK_SEEDS), help="Comma separated PYTHONHASHSEED values (at least two)")
+    args = parser.parse_args()
+
+    if not args.check:
+        parser.print_help()
+        raise SystemExit(0)
+    seeds = args.seeds.split(",")
+    if len(seeds) < 2:
+        parser.error("--seeds needs at least two values")
+    count, differing = check_byte_stability(seeds)
+    if differing:
+        for path in differing:
+            print(f"  differs: {path}")
+        raise SystemExit(f"Byte stability check failed: {len(differing)} of {count} file(s) differ between seeds {', '.join(seeds)}")
+    print(f"Byte stability check passed: {count} file(s) identical under seeds {', '.join(seeds)}")
@@ -0,0 +1,500 @@
+import argparse
+import math
+import os
+from collections import namedtuple
+import numpy as np
+import config
+from profiling import add_profile_arguments, profile_command, profiled
+
+# Native mesh/STL export for the 3D printed case, without OpenSCAD.
+# generate_case.assemble_case() builds a SolidPython tree of cubes and
+# cylinders combined with union/difference/translate; this module walks that
+# same tree, tessellates the primitives the way OpenSCAD does ($fa=12, $fs=2
+# unless a segment count is given) and evaluates the booleans with BSP-tree
+# CSG. Every solid is kept as a list of parts with disjoint bounding boxes, so
+# a boolean only touches the parts it overlaps (each footswitch hole is cut from
+# the lid on its own, the standoffs never meet the walls' BSP tree). The result
+# is welded into a watertight triangle mesh, written as binary STL and rendered
+# to a flat-shaded PNG preview. OpenSCAD stays the reference renderer.
+
+EPSILON = 1e-5    # Plane thickness for the BSP classification, in mm
+WELD_DECIMALS = 6 # Vertices closer than this are merged when building the mesh
+STL_HEADER = b"esp-hid case mesh"
+
+Mesh = namedtuple("Mesh", ["vertices", "faces"]) # (N, 3) float64 vertices, (M, 3) int triangle indices
+
+# --- Polygons and BSP-tree CSG ---
+
+class Polygon:
+    # Convex planar polygon; vertices are (k, 3), counter-clockwise seen from outside
+    __slots__ = ("vertices", "normal", "w")
+
+    def __init__(self, vertices, normal=None, w=None):
+        self.vertices = vertices
+        if normal is None:
+            # Newell's method, robust to collinear neighbours
+            rolled = np.roll(vertices, -1, axis=0)
+            normal = np.cross(vertices, rolled).sum(axis=0)
+            normal = normal / np.linalg.norm(normal)
+            w = float(normal @ vertices.mean(axis=0))
+        self.normal = normal
+        self.w = w
+
+    def flipped(self):
+        return Polygon(self.vertices[::-1], -self.normal, -self.w)
+
+    def translated(self, offset):
+        return Polygon(self.vertices + offset, self.normal, self.w + float(self.normal @ offset))
+
+def split_point(vi, di, vj, dj):
+    # Always interpolated from the lexicographically smaller end, so the two
+    # polygons sharing an edge get bit-identical split points
+    if tuple(vi) > tuple(vj):
+        vi, di, vj, dj = vj, dj, vi, di
+    return vi + (vj - vi) * (di / (di - dj))
+
+def split_polygon(normal, w, polygon, coplanar_front, coplanar_back, front, back):
+    d = (polygon.vertices @ normal - w).tolist() # Python floats: numpy reductions cost more on 3-30 values
+    lo, hi = min(d), max(d)
+    if lo >= -EPSILON and hi <= EPSILON:
+        (coplanar_front if normal @ polygon.normal > 0 else coplanar_back).append(polygon)
+    elif lo >= -EPSILON:
+        front.append(polygon)
+    elif hi <= EPSILON:
+        back.append(polygon)
+    else:
+        vertices = polygon.vertices
+        count = len(vertices)
+        f, b = [], []
+        for i in range(count):
+            j = (i + 1) % count
+            di, dj = d[i], d[j]
+            if di >= -EPSILON:
+                f.append(vertices[i])
+            if di <= EPSILON:
+                b.append(vertices[i])
+            if (di > EPSILON and dj < -EPSILON) or (di < -EPSILON and dj > EPSILON):
+                point = split_point(vertices[i], di, vertices[j], dj)
+                f.append(point)
+                b.append(point)
+        if len(f) >= 3:
+            front.append(Polygon(np.array(f), polygon.normal, polygon.w))
+        if len(b) >= 3:
+            back.append(Polygon(np.array(b), polygon.normal, polygon.w))
+
+class BSPNode:
+    # Iterative versions of the csg.js operations; the trees get deeper than
+    # Python's recursion limit for finely tessellated parts
+    __slots__ = ("normal", "w", "front", "back", "polygons")
+
+    def __init__(self, polygons=None):
+        self.normal = None
+        self.w = None
+        self.front = None
+        self.back = None
+        self.polygons = []
+        if polygons:
+            self.build(polygons)
+
+    def nodes(self):
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            if node.front:
+                stack.append(node.front)
+            if node.back:
+                stack.append(node.back)
+
+    def invert(self):
+        for node in self.nodes():
+            node.polygons = [p.flipped() for p in node.polygons]
+            if node.normal is not None:
+                node.normal, node.w = -node.normal, -node.w
+            node.front, node.back = node.back, node.front
+
+    def clip_polygons(self, polygons):
+        # Removes the parts of `polygons` inside this tree's solid
+        if self.normal is None:
+            return list(polygons)
+        result = []
+        stack = [(self, polygons)]
+        while stack:
+            node, polygons = stack.pop()
+            front, back = [], []
+            for polygon in polygons:
+                split_polygon(node.normal, node.w, polygon, front, back, front, back)
+            if front:
+                if node.front:
+                    stack.append((node.front, front))
+                else:
+                    result.extend(front)
+            if back and node.back:
+                stack.append((node.back, back))
+        return result
+
+    def clip_to(self, bsp):
+        for node in self.nodes():
+            node.polygons = bsp.clip_polygons(node.polygons)
+
+    def all_polygons(self):
+        return [p for node in self.nodes() for p in node.polygons]
+
+    def build(self, polygons):
+        stack = [(self, polygons)]
+        while stack:
+            node, polygons = stack.pop()
+            if node.normal is None:
+                node.normal, node.w = polygons[0].normal, polygons[0].w
+            front, back = [], []
+            for polygon in polygons:
+                split_polygon(node.normal, node.w, polygon, node.polygons, node.polygons, front, back)
+            if front:
+                node.front = node.front or BSPNode()
+                stack.append((node.front, front))
+            if back:
+                node.back = node.back or BSPNode()
+                stack.append((node.back, back))
+
+def bsp_union(a, b):
+    a, b = BSPNode(a), BSPNode(b)
+    a.clip_to(b)
+    b.clip_to(a)
+    b.invert()
+    b.clip_to(a)
+    b.invert()
+    a.build(b.all_polygons())
+    return a.all_polygons()
+
+def bsp_difference(a, b):
+    a, b = BSPNode(a), BSPNode(b)
+    a.invert()
+    a.clip_to(b)
+    b.clip_to(a)
+    b.invert()
+    b.clip_to(a)
+    b.invert()
+    a.build(b.all_polygons())
+    a.invert()
+    return a.all_polygons()
+
+def bsp_intersection(a, b):
+    a, b = BSPNode(a), BSPNode(b)
+    a.invert()
+    b.clip_to(a)
+    b.invert()
+    a.clip_to(b)
+    b.clip_to(a)
+    a.build(b.all_polygons())
+    a.invert()
+    return a.all_polygons()
+
+# --- Solids as lists of parts with disjoint bounding boxes ---
+
+Part = namedtuple("Part", ["polygons", "lo", "hi"])
+
+def make_part(polygons):
+    points = np.concatenate([p.vertices for p in polygons])
+    return Part(polygons, points.min(axis=0), points.max(axis=0))
+
+def overlaps(a, b):
+    # Touching boxes count as overlapping, so coincident faces are merged by the BSP
+    return bool(np.all(a.lo <= b.hi + EPSILON) and np.all(b.lo <= a.hi + EPSILON))
+
+def union_parts(parts, others):
+    parts = list(parts)
+    for other in others:
+        touching = [p for p in parts if overlaps(p, other)]
+        for part in touching:
+            parts.remove(part)
+            other = make_part(bsp_union(part.polygons, other.polygons))
+        parts.append(other)
+    return parts
+
+def difference_parts(parts, tools):
+    parts = list(parts)
+    for tool in tools:
+        result = []
+        for part in parts:
+            if overlaps(part, tool):
+                polygons = bsp_difference(part.polygons, tool.polygons)
+                if polygons:
+                    result.append(make_part(polygons))
+            else:
+                result.append(part)
+        parts = result
+    return parts
+
+def intersection_parts(parts, others):
+    result = []
+    for part in parts:
+        for other in others:
+            if overlaps(part, other):
+                polygons = bsp_intersection(part.polygons, other.polygons)
+                if polygons:
+                    result.append(make_part(polygons))
+    return result
+
+# --- SolidPython tree evaluation ---
+
+def circle_fragments(r, segments=None):
+    # OpenSCAD's get_fragments_from_r() with the default $fa=12, $fs=2
+    if segments:
+        return max(int(segments), 3)
+    return int(math.ceil(max(min(360.0 / 12, r * 2 * math.pi / 2), 5)))
+
+def cube_polygons(size, center=False):
+    size = np.array([size] * 3 if np.isscalar(size) else size, dtype=float)
+    lo = -size / 2 if center else np.zeros(3)
+    corners = np.array([[(i & 1) * size[0], (i >> 1 & 1) * size[1], (i >> 2 & 1) * size[2]] for i in range(8)]) + lo
+    faces = [[0, 4, 6, 2], [1, 3, 7, 5], [0, 1, 5, 4], [2, 6, 7, 3], [0, 2, 3, 1], [4, 5, 7, 6]]
+    return [Polygon(corners[face]) for face in faces]
+
+def cylinder_radii(params):
+    # (bottom, top) radius of a cylinder() call, resolving r/d/r1/r2/d1/d2 like OpenSCAD
+    r = params["r"] if params.get("r") is not None else 1
+    if params.get("d") is not None:
+        r = params["d"] / 2
+    r1 = params["d1"] / 2 if params.get("d1") is not None else params.get("r1") if params.get("r1") is not None else r
+    r2 = params["d2"] / 2 if params.get("d2") is not None else params.get("r2") if params.get("r2") is not None else r
+    return r1, r2
+
+def cylinder_polygons(params, segments=None):
+    h = params["h"] if params.get("h") is not None else 1
+    r1, r2 = cylinder_radii(params)
+    count = circle_fragments(max(r1, r2), params.get("segments") or segments)
+    angles = 2 * np.pi * np.arange(count) / count
+    ring = np.column_stack([np.cos(angles), np.sin(angles), np.zeros(count)])
+    z0 = -h / 2 if params.get("center") else 0
+    bottom = ring * [r1, r1, 0] + [0, 0, z0]
+    top = ring * [r2, r2, 0] + [0, 0, z0 + h]
+    polygons = []
+    if r1 > 0:
+        polygons.append(Polygon(bottom[::-1].copy()))
+    if r2 > 0:
+        polygons.append(Polygon(top))
+    for i in range(count):
+        j = (i + 1) % count
+        side = [bottom[i], bottom[j], top[j], top[i]]
+        if r1 == 0:
+            side = side[1:]
+        elif r2 == 0:
+            side = side[:3]
+        polygons.append(Polygon(np.array(side)))
+    return polygons
+
+def evaluate(node, segments=None):
+    # Returns the solid described by a SolidPython object as a list of parts
+    children = [evaluate(child, segments) for child in node.children]
+    if node.name == "cube":
+        return [make_part(cube_polygons(node.params["size"], node.params.get("center")))]
+    if node.name == "cylinder":
+        return [make_part(cylinder_polygons(node.params, segments))]
+    if node.name == "translate":
+        offset = np.array(node.params["v"], dtype=float)
+        return [
+            Part([p.translated(offset) for p in part.polygons], part.lo + offset, part.hi + offset)
+            for part in union_all(children)
+        ]
+    if node.name == "union":
+        return union_all(children)
+    if node.name == "difference":
+        if not children:
+            return []
+        return difference_parts(children[0], [tool for child in children[1:] for tool in child])
+    if node.name == "intersection":
+        if not children:
+            return []
+        parts = children[0]
+        for child in children[1:]:
+            parts = intersection_parts(parts, child)
+        return parts
+    raise ValueError(f"case_mesh does not support the OpenSCAD '{node.name}' module")
+
+def union_all(children):
+    parts = []
+    for child in children:
+        parts = union_parts(parts, child)
+    return parts
+
+# --- Mesh assembly and measurements ---
+
+def polygons_to_mesh(polygons):
+    # Weld vertices, split edges at T-junctions left by the BSP splits, triangulate
+    points = np.concatenate([p.vertices for p in polygons])
+    vertices, inverse = np.unique(np.round(points, WELD_DECIMALS), axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    loops = []
+    offset = 0
+    for polygon in polygons:
+        loop = []
+        for index in inverse[offset:offset + len(polygon.vertices)].tolist():
+            if not loop or loop[-1] != index:
+                loop.append(index)
+        offset += len(polygon.vertices)
+        if len(loop) > 1 and loop[0] == loop[-1]:
+            loop.pop()
+        if len(loop) >= 3:
+            loops.append(loop)
+
+    # An edge without its reverse borders a T-junction: the neighbouring polygon
+    # has an extra vertex somewhere along it
+    edges = {(loop[i], loop[(i + 1) % len(loop)]) for loop in loops for i in range(len(loop))}
+    inserts = {}
+    for a, b in edges:
+        if (b, a) in edges:
+            continue
+        direction = vertices[b] - vertices[a]
+        length_sq = direction @ direction
+        t = (vertices - vertices[a]) @ direction / length_sq
+        distance_sq = ((vertices - vertices[a] - t[:, None] * direction) ** 2).sum(axis=1)
+        on_edge = np.nonzero((t > EPSILON) & (t < 1 - EPSILON) & (distance_sq < EPSILON ** 2))[0]
+        if len(on_edge):
+            inserts[(a, b)] = on_edge[np.argsort(t[on_edge])].tolist()
+
+    extra = []
+    triangles = []
+    for loop in loops:
+        split = []
+        for i, a in enumerate(loop):
+            split.append(a)
+            split.extend(inserts.get((a, loop[(i + 1) % len(loop)]), ()))
+        if len(split) == len(loop):
+            triangles.extend((loop[0], loop[i], loop[i + 1]) for i in range(1, len(loop) - 1))
+        else:
+            # Fan from the centroid, so collinear edge vertices give no slivers
+            center = len(vertices) + len(extra)
+            extra.append(vertices[loop].mean(axis=0))
+            triangles.extend((center, split[i], split[(i + 1) % len(split)]) for i in range(len(split)))
+    if extra:
+        vertices = np.concatenate([vertices, extra])
+    return Mesh(vertices, np.array(triangles, dtype=np.int64).reshape(-1, 3))
+
+def open_edge_count(mesh):
+    # Directed edges without exactly one opposite edge; 0 for a watertight, consistently oriented mesh
+    faces = mesh.faces
+    directed = np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]])
+    keys, counts = np.unique(directed, axis=0, return_counts=True)
+    reverse = {tuple(k): c for k, c in zip(keys[:, ::-1].tolist(), counts.tolist())}
+    return sum(1 for k, c in zip(keys.tolist(), counts.tolist()) if c != 1 or reverse.get(tuple(k)) != 1)
+
+def mesh_volume(mesh):
+    # Divergence theorem: sum of signed tetrahedra against the origin
+    v0, v1, v2 = (mesh.vertices[mesh.faces[:, i]] for i in range(3))
+    return float(np.einsum("ij,ij->i", v0, np.cross(v1, v2)).sum() / 6)
+
+def mesh_bounds(mesh):
+    used = mesh.vertices[np.unique(mesh.faces)]
+    return used.min(axis=0), used.max(axis=0)
+
+def face_normals(mesh):
+    v0, v1, v2 = (mesh.vertices[mesh.faces[:, i]] for i in range(3))
+    normals = np.cross(v1 - v0, v2 - v0)
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    return normals / np.where(lengths > 0, lengths, 1)
+
+def write_binary_stl(mesh, path):
+    record = np.dtype([("normal", "<f4", (3,)), ("vertices", "<f4", (3, 3)), ("attribute", "<u2")])
+    data = np.zeros(len(mesh.faces), dtype=record)
+    data["normal"] = face_normals(mesh)
+    data["vertices"] = mesh.vertices[mesh.faces]
+    with open(path, "wb") as f:
+        f.write(STL_HEADER.ljust(80, b" "))
+        f.write(np.uint32(len(data)).tobytes())
+        f.write(data.tobytes())
+
+def render_mesh_png(mesh, output_png=None, camera_params=None, width=None, height=None, margin=20):
+    # Flat-shaded orthographic preview rasterized with a depth buffer; returns the
+    # Pillow image and also saves it when output_png is given.
+    # Uses the rotation from the OpenSCAD camera string "tx,ty,tz,rx,ry,rz,dist".
+    # Defaults are read from config at call time (fleet.py patches it per variant).
+    from PIL import Image
+    camera_params = camera_params or config.RENDERING_CAMERA_PARAMS_3D
+    width = width or config.RENDERING_IMAGE_WIDTH
+    height = height or config.RENDERING_IMAGE_HEIGHT
+    rx, ry, rz = (math.radians(float(v)) for v in camera_params.split(",")[3:6])
+    cx, sx, cy, sy, cz, sz = math.cos(rx), math.sin(rx), math.cos(ry), math.sin(ry), math.cos(rz), math.sin(rz)
+    rot_x = np.array([[1, 0, 0], [0, cx, -sx], [0, sx, cx]])
+    rot_y = np.array([[cy, 0, sy], [0, 1, 0], [-sy, 0, cy]])
+    rot_z = np.array([[cz, -sz, 0], [sz, cz, 0], [0, 0, 1]])
+    view = rot_z @ rot_y @ rot_x # Row vectors: the scene is rotated by -rz, -ry, -rx like OpenSCAD's gimbal camera
+    points = mesh.vertices @ view
+    normals = face_normals(mesh) @ view
+
+    lo, hi = points[:, :2].min(axis=0), points[:, :2].max(axis=0)
+    scale = min((width - 2 * margin) / max(hi[0] - lo[0], 1e-9), (height - 2 * margin) / max(hi[1] - lo[1], 1e-9))
+    screen = np.empty_like(points)
+    screen[:, 0] = (points[:, 0] - (lo[0] + hi[0]) / 2) * scale + width / 2
+    screen[:, 1] = height / 2 - (points[:, 1] - (lo[1] + hi[1]) / 2) * scale
+    screen[:, 2] = points[:, 2] # Larger is closer to the camera
+
+    base_color = np.array([249, 215, 44], dtype=float) # OpenSCAD's default model colour
+    pixels = np.empty((height, width, 3))
+    pixels[:] = [255, 255, 229]
+    depth = np.full((height, width), -np.inf)
+    visible = np.nonzero(normals[:, 2] > 1e-9)[0] # Back faces are never seen on a closed mesh
+    for index in visible.tolist():
+        (x0, y0, z0), (x1, y1, z1), (x2, y2, z2) = screen[mesh.faces[index]].tolist()
+        area = (x1 - x0) * (y2 - y0) - (x2 - x0) * (y1 - y0)
+        if abs(area) < 1e-12:
+            continue
+        left, right = max(int(min(x0, x1, x2)), 0), min(int(max(x0, x1, x2)) + 1, width)
+        top, bottom = max(int(min(y0, y1, y2)), 0), min(int(max(y0, y1, y2)) + 1, height)
+        if left >= right or top >= bottom:
+            continue
+        px, py = np.meshgrid(np.arange(left, right) + 0.5, np.arange(top, bottom) + 0.5)
+        w1 = ((px - x0) * (y2 - y0) - (x2 - x0) * (py - y0)) / area
+        w2 = ((x1 - x0) * (py - y0) - (px - x0) * (y1 - y0)) / area
+        w0 = 1 - w1 - w2
+        z = w0 * z0 + w1 * z1 + w2 * z2
+        region = depth[top:bottom, left:right]
+        hit = (w0 >= 0) & (w1 >= 0) & (w2 >= 0) & (z > region)
+        region[hit] = z[hit]
+        pixels[top:bottom, left:right][hit] = base_color * (0.35 + 0.65 * normals[index, 2])
+    image = Image.fromarray(pixels.astype(np.uint8))
+    if output_png:
+        os.makedirs(os.path.dirname(output_png) or ".", exist_ok=True)
+        image.save(output_png)
+        print(f"Rendered {output_png}")
+    return image
+
+def build_case_mesh(segments=None, case=None):
+    # segments overrides config.MESH_SEGMENTS; case is a SolidPython tree, by default the assembled case
+    if case is None:
+        import generate_case
+        with profiled("assemble_case"):
+            case = generate_case.assemble_case()
+    with profiled("csg"):
+        parts = evaluate(case, segments or config.MESH_SEGMENTS)
+    with profiled("weld"):
+        return polygons_to_mesh([p for part in parts for p in part.polygons])
+
+def write_case_stl(path="esp32_footswitch_case.stl", segments=None, preview_png=None):
+    mesh = build_case_mesh(segments)
+    with profiled("write_stl"):
+        write_binary_stl(mesh, path)
+    open_edges = open_edge_count(mesh)
+    lo, hi = mesh_bounds(mesh)
+    size = hi - lo
+    print(f"Generated {path} ({len(mesh.faces)} triangles, {'watertight' if open_edges == 0 else f'{open_edges} open edges'})")
+    print(f"  Volume: {mesh_volume(mesh):.2f} mm^3")
+    print(f"  Bounding box: ({lo[0]:.2f}, {lo[1]:.2f}, {lo[2]:.2f}) to ({hi[0]:.2f}, {hi[1]:.2f}, {hi[2]:.2f}) mm, "
+          f"{size[0]:.2f} x {size[1]:.2f} x {size[2]:.2f} mm")
+    if preview_png:
+        with profiled("render_preview"):
+            render_mesh_png(mesh, preview_png)
+    return mesh
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the 3D printable case as a binary STL without OpenSCAD.")
+    parser.add_argument("--output", default="esp32_footswitch_case.stl", help="STL file to write")
+    parser.add_argument("--segments", type=int, default=None,
+                        help="Facets per cylinder (default: config.MESH_SEGMENTS, else OpenSCAD's $fa/$fs rule)")
+    parser.add_argument("--preview", default=os.path.join("renderings", "esp32_footswitch_case_preview.png"),
+                        help="PNG preview to render from the mesh")
+    parser.add_argument("--no-preview", action="store_true", help="Skip the PNG preview")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    with profile_command(args, "case_mesh"):
+        write_case_stl(args.output, args.segments, None if args.no_preview else args.preview)
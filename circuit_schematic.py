@@ -0,0 +1,243 @@
+import math
+from xml.sax.saxutils import escape
+from PIL import Image, ImageDraw, ImageFont
+
+# Grid-based schematic of the button board, drawn straight from the netlist
+# model (generate_button_pcb.netlist_components/netlist_nets) as SVG and PNG.
+# Nothing is laid out by a graph solver: every symbol goes into a fixed grid
+# cell, so drawing is linear in the number of parts and the same netlist always
+# gives the same picture. Nets that reach many parts are drawn as buses:
+#   direct wiring - a GPIO label above each switch and a ground rail under
+#                   every row of switches, joined by one GND bus
+#   matrix        - a vertical rail per column and a horizontal rail per row,
+#                   with each switch and its diode in the cell where they cross
+# The connector is split into units of as many pins as fit the drawing's height
+# and connects to the rails by net label, as in a hand-drawn schematic.
+
+GRID = 10             # Drawing grid (px); every symbol is a few grid units tall
+PIN_SPACING = 2 * GRID
+MARGIN = 3 * GRID
+FONT_SIZE = 11
+MIN_UNIT_PINS = 16    # Connector pins per unit before it is split
+
+class Sheet:
+    # Drawing primitives in px, y down; written out by svg_text() and png_image()
+    def __init__(self):
+        self.lines = []    # (x0, y0, x1, y1)
+        self.circles = []  # (x, y, r, filled)
+        self.polygons = [] # list of (x, y), filled
+        self.texts = []    # (x, y, text, anchor); y is the text's vertical middle, anchor start/middle/end
+
+    def line(self, x0, y0, x1, y1):
+        self.lines.append((x0, y0, x1, y1))
+
+    def circle(self, x, y, r, filled=False):
+        self.circles.append((x, y, r, filled))
+
+    def junction(self, x, y):
+        self.circle(x, y, 3, filled=True)
+
+    def polygon(self, points):
+        self.polygons.append(points)
+
+    def text(self, x, y, text, anchor="start"):
+        self.texts.append((x, y, text, anchor))
+
+    def size(self):
+        # Texts are assumed at most FONT_SIZE wide per character
+        xs = [v for x0, _, x1, _ in self.lines for v in (x0, x1)]
+        xs += [x + FONT_SIZE * len(text) * (anchor != "end") for x, _, text, anchor in self.texts]
+        ys = [v for _, y0, _, y1 in self.lines for v in (y0, y1)] + [y for _, y, _, _ in self.texts]
+        return int(max(xs)) + MARGIN, int(max(ys)) + MARGIN
+
+# --- Symbols: all vertical, from a top terminal at (x, y) to a bottom one at (x, y + 4 * GRID) ---
+
+def switch_symbol(sheet, x, y, ref):
+    sheet.line(x, y, x, y + GRID - 3)
+    sheet.circle(x, y + GRID, 3)
+    sheet.circle(x, y + 3 * GRID, 3)
+    sheet.line(x, y + 3 * GRID + 3, x, y + 4 * GRID)
+    # Contact bar and plunger
+    sheet.line(x - GRID, y + GRID, x - GRID, y + 3 * GRID)
+    sheet.line(x - 1.6 * GRID, y + 2 * GRID, x - GRID, y + 2 * GRID)
+    sheet.text(x + 6, y + 2 * GRID, ref)
+
+def diode_symbol(sheet, x, y, ref):
+    # Anode at the top, cathode at the bottom
+    half = 0.6 * GRID
+    sheet.line(x, y, x, y + 1.5 * GRID)
+    sheet.polygon([(x - half, y + 1.5 * GRID), (x + half, y + 1.5 * GRID), (x, y + 2.5 * GRID)])
+    sheet.line(x - half, y + 2.5 * GRID, x + half, y + 2.5 * GRID)
+    sheet.line(x, y + 2.5 * GRID, x, y + 4 * GRID)
+    sheet.text(x + 8, y + 2 * GRID, ref)
+
+def ground_symbol(sheet, x, y):
+    sheet.line(x, y, x, y + GRID)
+    for i, half in enumerate((GRID, 0.6 * GRID, 0.2 * GRID)):
+        sheet.line(x - half, y + GRID + i * 4, x + half, y + GRID + i * 4)
+
+def connector_units(sheet, ref, pins, x, y, height):
+    # Pins as (number, label); split into side-by-side units no taller than height.
+    # Returns the x just right of the last unit.
+    per_unit = max(MIN_UNIT_PINS, int(height // PIN_SPACING))
+    box = 3 * GRID
+    width = box + 3 * GRID + GRID * max(len(label) for _, label in pins) * 0.7
+    for start in range(0, len(pins), per_unit):
+        unit = pins[start:start + per_unit]
+        top = y + GRID
+        bottom = top + len(unit) * PIN_SPACING
+        name = ref if len(pins) <= per_unit else f"{ref} (pins {unit[0][0]}-{unit[-1][0]})"
+        sheet.text(x, y, name)
+        for x0, y0, x1, y1 in ((x, top, x + box, top), (x, bottom, x + box, bottom), (x, top, x, bottom), (x + box, top, x + box, bottom)):
+            sheet.line(x0, y0, x1, y1)
+        for i, (number, label) in enumerate(unit):
+            py = top + (i + 0.5) * PIN_SPACING
+            sheet.line(x + box, py, x + box + GRID, py)
+            sheet.text(x + box / 2, py, str(number), "middle")
+            sheet.text(x + box + GRID + 4, py, label)
+        x += width
+    return x
+
+# --- Netlist model -> sheet ---
+
+def node_nets(nets):
+    return {node: net for net in nets for node in net.nodes}
+
+def net_label(net, gpios):
+    # Nets named after a connector pad read better as the GPIO they go to
+    if net.name.startswith("Net-(J1-Pad"):
+        pin = next(p for r, p in net.nodes if r == "J1")
+        return f"GPIO{gpios[pin]}" if pin in gpios else net.name
+    return net.name
+
+def connector_pins(components, nets, gpios):
+    pin_net = {p: net for net in nets for r, p in net.nodes if r == "J1"}
+    pins = []
+    for pin in sorted(pin_net):
+        label = net_label(pin_net[pin], gpios)
+        if pin in gpios and not label.startswith("GPIO"):
+            label += f" (GPIO{gpios[pin]})"
+        pins.append((pin, label))
+    return pins
+
+def direct_sheet(components, nets, gpios):
+    # Switches in rows of at least 8, each with its GPIO label above and the ground rail below
+    switches = [c.ref for c in components if c.ref.startswith("SW")]
+    by_node = node_nets(nets)
+    per_row = max(8, math.ceil(math.sqrt(len(switches))))
+    lines = math.ceil(len(switches) / per_row)
+    cell_w, cell_h = 6 * GRID, 9 * GRID
+
+    sheet = Sheet()
+    x0 = connector_units(sheet, "J1", connector_pins(components, nets, gpios), MARGIN, MARGIN, lines * cell_h) + 3 * GRID
+    bus_x = x0
+    ground = by_node[(switches[0], 2)].name if switches else "GND"
+    top = MARGIN + GRID
+    sheet.text(bus_x, top - GRID, ground, "middle")
+    for line_index in range(lines):
+        row = switches[line_index * per_row:(line_index + 1) * per_row]
+        ty = top + line_index * cell_h
+        rail_y = ty + 7 * GRID
+        for i, ref in enumerate(row):
+            x = bus_x + (i + 1) * cell_w
+            sheet.text(x, ty + GRID, net_label(by_node[(ref, 1)], gpios), "middle")
+            sheet.line(x, ty + 2 * GRID, x, ty + 2.5 * GRID)
+            switch_symbol(sheet, x, ty + 2.5 * GRID, ref)
+            sheet.line(x, ty + 6.5 * GRID, x, rail_y)
+            sheet.junction(x, rail_y)
+        sheet.line(bus_x, rail_y, bus_x + len(row) * cell_w, rail_y)
+        if line_index:
+            sheet.junction(bus_x, rail_y)
+    last_rail = top + (lines - 1) * cell_h + 7 * GRID
+    sheet.line(bus_x, top, bus_x, last_rail + GRID)
+    ground_symbol(sheet, bus_x, last_rail + GRID)
+    return sheet
+
+def matrix_sheet(components, nets, gpios):
+    # Rows and columns are the nets on the diode cathodes and switch inputs, in connector pin order
+    by_node = node_nets(nets)
+    switches = [c.ref for c in components if c.ref.startswith("SW")]
+    diode_of = {}
+    for net in nets:
+        refs = [r for r, p in net.nodes if r.startswith("SW") and p == 2]
+        diodes = [r for r, p in net.nodes if r.startswith("D") and p == 2]
+        if refs and diodes:
+            diode_of[refs[0]] = diodes[0]
+    pin_of = {net.name: p for net in nets for r, p in net.nodes if r == "J1"}
+    row_nets = sorted({by_node[(diode_of[sw], 1)].name for sw in switches}, key=pin_of.get)
+    col_nets = sorted({by_node[(sw, 1)].name for sw in switches}, key=pin_of.get)
+    row_index = {name: i for i, name in enumerate(row_nets)}
+    col_index = {name: i for i, name in enumerate(col_nets)}
+    cell_w, cell_h = 8 * GRID, 10 * GRID
+
+    sheet = Sheet()
+    x0 = connector_units(sheet, "J1", connector_pins(components, nets, gpios), MARGIN, MARGIN, len(row_nets) * cell_h) + 6 * GRID
+    top = MARGIN + 2 * GRID
+    right = x0 + len(col_nets) * cell_w
+    bottom = top + len(row_nets) * cell_h
+    for c, name in enumerate(col_nets):
+        x = x0 + c * cell_w
+        sheet.text(x, top - GRID, name, "middle")
+        sheet.line(x, top, x, bottom)
+    for r, name in enumerate(row_nets):
+        y = top + r * cell_h + 9 * GRID
+        sheet.text(x0 - 4 * GRID, y, name, "end")
+        sheet.line(x0 - 3 * GRID, y, right, y)
+    for sw in switches:
+        diode = diode_of[sw]
+        ty = top + row_index[by_node[(diode, 1)].name] * cell_h
+        cx = x0 + col_index[by_node[(sw, 1)].name] * cell_w
+        x = cx + 3 * GRID
+        sheet.junction(cx, ty + GRID)
+        sheet.line(cx, ty + GRID, x, ty + GRID)
+        switch_symbol(sheet, x, ty + GRID, sw)
+        diode_symbol(sheet, x, ty + 5 * GRID, diode)
+        sheet.junction(x, ty + 9 * GRID)
+    return sheet
+
+def build_sheet(components, nets, gpios):
+    if any(c.ref.startswith("D") for c in components):
+        return matrix_sheet(components, nets, gpios)
+    return direct_sheet(components, nets, gpios)
+
+# --- Output ---
+
+def svg_text(sheet):
+    width, height = sheet.size()
+    out = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}">',
+           f'<rect width="{width}" height="{height}" fill="white"/>',
+           '<g stroke="black" stroke-width="1.5" fill="none">']
+    out += [f'<line x1="{x0:g}" y1="{y0:g}" x2="{x1:g}" y2="{y1:g}"/>' for x0, y0, x1, y1 in sheet.lines]
+    fills = {True: ' fill="black"', False: ""}
+    out += [f'<circle cx="{x:g}" cy="{y:g}" r="{r:g}"{fills[filled]}/>' for x, y, r, filled in sheet.circles]
+    out += ['<polygon points="' + " ".join(f"{x:g},{y:g}" for x, y in points) + '" fill="black"/>' for points in sheet.polygons]
+    out.append("</g>")
+    out.append(f'<g font-family="sans-serif" font-size="{FONT_SIZE}" dominant-baseline="middle">')
+    out += [f'<text x="{x:g}" y="{y:g}" text-anchor="{anchor}">{escape(text)}</text>' for x, y, text, anchor in sheet.texts]
+    out.append("</g>")
+    out.append("</svg>")
+    return "\n".join(out) + "\n"
+
+def png_image(sheet):
+    image = Image.new("RGB", sheet.size(), "white")
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(FONT_SIZE)
+    for x0, y0, x1, y1 in sheet.lines:
+        draw.line((x0, y0, x1, y1), fill="black", width=1)
+    for x, y, r, filled in sheet.circles:
+        draw.ellipse((x - r, y - r, x + r, y + r), outline="black", fill="black" if filled else None)
+    for points in sheet.polygons:
+        draw.polygon(points, fill="black")
+    shift = {"start": 0, "middle": 0.5, "end": 1}
+    for x, y, text, anchor in sheet.texts:
+        left, upper, right, lower = draw.textbbox((0, 0), text, font=font)
+        draw.text((x - shift[anchor] * (right - left) - left, y - (upper + lower) / 2), text, fill="black", font=font)
+    return image
+
+def write_schematic(components, nets, gpios, svg_path, png_path):
+    # gpios maps connector pin numbers to the GPIO they are wired to
+    sheet = build_sheet(components, nets, gpios)
+    with open(svg_path, "w") as f:
+        f.write(svg_text(sheet))
+    png_image(sheet).save(png_path)
+    return sheet
@@ -5,22 +5,30 @@
 // Auto-generated from config.py
 
 // Firmware Parameters
-#define PIN_ENTER 4
-#define PIN_ESC 5
-#define PIN_PAGE_UP 6
-#define PIN_PAGE_DOWN 7
-#define PIN_MACRO_1 8
-#define PIN_MACRO_2 9
-#define PIN_MACRO_3 10
 #define PIN_LED 2
 
 #define DEBOUNCE_MS 50
+#define LOOP_DELAY_MS 10
 
 #define BLE_KEYBOARD_NAME "ESP32-S3 Keyboard"
 #define BLE_MOUSE_NAME "ESP32-S3 Mouse"
 
-#define MACRO_1_OUTPUT "Macro 1 Output"
-#define MACRO_2_OUTPUT "Macro 2 Output"
-#define MACRO_3_OUTPUT "Macro 3 Output"
+// Buttons, dispatched by table index (see BUTTON_ACTIONS in config.py)
+#define NUM_BUTTONS 7
+#define BUTTON_MATRIX 0
+
+// { pin (matrix: row * MATRIX_COLS + column), type, target, key, macro }
+#define BUTTON_ACTION_TABLE { \
+    {4, ACTION_KEY, TARGET_AUTO, KEY_RETURN, ""}, \
+    {5, ACTION_KEY, TARGET_AUTO, KEY_ESC, ""}, \
+    {6, ACTION_KEY, TARGET_AUTO, KEY_PAGE_UP, ""}, \
+    {7, ACTION_KEY, TARGET_AUTO, KEY_PAGE_DOWN, ""}, \
+    {8, ACTION_MACRO, TARGET_AUTO, 0, "Macro 1 Output"}, \
+    {9, ACTION_MACRO, TARGET_AUTO, 0, "Macro 2 Output"}, \
+    {10, ACTION_MACRO, TARGET_AUTO, 0, "Macro 3 Output"}, \
+}
+
+// Initial debounce state for each button
+#define BUTTON_STATE_TABLE { {4, 1, true, 0, false}, {5, 2, true, 0, false}, {6, 3, true, 0, false}, {7, 4, true, 0, false}, {8, 5, true, 0, false}, {9, 6, true, 0, false}, {10, 7, true, 0, false} }
 
 #endif // CONFIG_H
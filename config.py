@@ -15,6 +15,7 @@ PIN_MACRO_3 = 10
 PIN_LED = 2 # Common LED_BUILTIN for LOLIN S3 Mini
 
 DEBOUNCE_MS = 50
+LOOP_DELAY_MS = 10 # Delay at the end of each main loop pass
 
 BLE_KEYBOARD_NAME = "ESP32-S3 Keyboard"
 BLE_MOUSE_NAME = "ESP32-S3 Mouse"
@@ -24,8 +25,23 @@ MACRO_1_OUTPUT = "Macro 1 Output"
 MACRO_2_OUTPUT = "Macro 2 Output"
 MACRO_3_OUTPUT = "Macro 3 Output"
 
+# Button actions, in button order: (GPIO pin, key, target)
+# key: a KEY_* name (or raw key code) is sent as one key press, any other string is typed as a macro
+# target: "auto" (BLE when connected, otherwise USB), "ble" or "usb"
+# Adding a button only needs a new entry here plus BUTTON_GPIO_PINS/NUM_BUTTONS below.
+# With BUTTON_WIRING = "matrix" the first field is the (row, column) position in the key matrix instead.
+BUTTON_ACTIONS = [
+    (PIN_ENTER, "KEY_RETURN", "auto"),
+    (PIN_ESC, "KEY_ESC", "auto"),
+    (PIN_PAGE_UP, "KEY_PAGE_UP", "auto"),
+    (PIN_PAGE_DOWN, "KEY_PAGE_DOWN", "auto"),
+    (PIN_MACRO_1, MACRO_1_OUTPUT, "auto"),
+    (PIN_MACRO_2, MACRO_2_OUTPUT, "auto"),
+    (PIN_MACRO_3, MACRO_3_OUTPUT, "auto"),
+]
+
 # --- Case Design Parameters (used in generate_case.py, generate_lasercut_case.py) ---
-CASE_LENGTH = 150  # Overall length of the case
+CASE_LENGTH = 220  # Overall length of the case; fits the footswitch row (NUM_BUTTONS caps, BUTTON_SPACING apart) with margin
 CASE_WIDTH = 100   # Overall width of the case
 CASE_HEIGHT = 30   # Overall height of the case
 WALL_THICKNESS = 2 # Thickness of the case walls (for 3D print)
@@ -34,6 +50,7 @@ MATERIAL_THICKNESS = 3 # Thickness of the acrylic material (for laser cut)
 BOARD_LENGTH = 34.3 # LOLIN S3 Mini length
 BOARD_WIDTH = 25.4  # LOLIN S3 Mini width
 BOARD_THICKNESS = 3 # Approximate thickness of the PCB
+BOARD_OFFSET_Y = 25 # Board centre from the front (USB-C) wall, between the USB-C receptacle and the footswitch row
 
 FOOTSWITCH_MOUNT_DIAMETER = 12 # Diameter of the hole for mounting the footswitch
 FOOTSWITCH_CAP_DIAMETER = 16   # Diameter of the footswitch cap (for spacing)
@@ -56,6 +73,13 @@ BOARD_STANDOFF_DIAMETER = 4
 BOARD_STANDOFF_HEIGHT = 5
 BOARD_STANDOFF_SCREW_DIAMETER = 2.5
 
+# Facets per circle for each round case feature: $fn in the SCAD files, also
+# followed by case_mesh.py and print_slicer.py. 0 keeps OpenSCAD's $fa/$fs default.
+FN_FOOTSWITCH_HOLE = 0
+FN_LED_HOLE = 0
+FN_STANDOFF = 0
+FN_STANDOFF_SCREW_HOLE = 0
+
 # Lid assembly parameters
 LID_OVERLAP = 5 # How much the lid walls overlap the base walls
 SCREW_DIAMETER = 3.2 # For M3 screws (slightly larger for clearance)
@@ -67,20 +91,62 @@ SCREW_OFFSET = 5 # Distance from corner for screw holes
 # Finger joint parameters for laser cut case
 FINGER_JOINT_SIZE = 10 # Size of each finger in the joint
 
+# Sheet nesting parameters for laser cut case (used in generate_lasercut_sheets.py)
+STOCK_SHEET_LENGTH = 600 # Length of the acrylic stock sheets
+STOCK_SHEET_WIDTH = 400  # Width of the acrylic stock sheets
+NESTING_SPACING = MATERIAL_THICKNESS # Gap between parts and to the sheet edge (kerf allowance)
+DXF_WRITER = "ezdxf" # Panel/sheet DXF back end: "ezdxf" (full document) or "stream" (dxf_writer.py, for bulk output)
+
 # --- BOM and Estimates Parameters (used in generate_bom_and_estimates.py) ---
 FILAMENT_DENSITY_G_MM3 = 1.24e-3 # PLA density (g/mm^3)
 FILAMENT_COST_PER_KG = 20 # USD
-PRINTING_SPEED_MM3_S = 20 # Very rough average printing speed
 INFILL_PERCENTAGE = 0.20 # 20% infill for 3D printed parts
+PRINT_LAYER_HEIGHT = 0.2     # Layer height for print_slicer.py (mm)
+PRINT_LINE_WIDTH = 0.4       # Extrusion width (mm)
+PRINT_PERIMETERS = 2         # Outline loops per layer
+PRINT_TOP_BOTTOM_LAYERS = 4  # Solid layers under/over open air
+PRINT_SPEED_MM_S = 60        # Average print head speed while extruding
+PRINT_LAYER_CHANGE_S = 2     # Travel, retraction and z move per layer (s)
+PRINT_RESOLUTION = 0.2       # Slice bitmap pixel size (mm)
 
 LASER_CUT_SPEED_MM_S = 10 # Very rough average cutting speed
+LASER_TRAVEL_SPEED_MM_S = 100 # Rapid (non-cutting) head travel speed
 ACRYLIC_COST_PER_MM2 = 0.0001 # Very rough cost per mm^2 for 3mm acrylic
 
 # --- PCB Design Parameters (used in generate_button_pcb.py) ---
 NUM_BUTTONS = 7
 BUTTON_GPIO_PINS = [4, 5, 6, 7, 8, 9, 10] # GPIO pins for the buttons
 
+# Button wiring: "direct" (one GPIO per button, common GND) or "matrix"
+# (row/column grid with one diode per switch, for builds with more buttons than free GPIOs)
+BUTTON_WIRING = "direct"
+MATRIX_ROW_PINS = [11, 12, 13, 14, 15, 16, 17, 18, 21, 1] # Driven LOW one at a time
+MATRIX_COL_PINS = [33, 34, 35, 36, 37, 38, 39, 40, 41, 42, 47, 48] # Inputs with pull-ups, at most 32
+MATRIX_SETTLE_US = 2 # Wait after selecting a row before reading the columns
+LATENCY_TARGET_MS = 75 # p99 press-to-report latency budget checked by simulate_buttons.py
+
+# Button board routing (pcb_router.py, writes button_pcb.kicad_pcb)
+PCB_TRACK_WIDTH = 0.25 # mm
+PCB_CLEARANCE = 0.2    # Minimum copper-to-copper and copper-to-edge gap (mm)
+PCB_VIA_DIAMETER = 0.6
+PCB_VIA_DRILL = 0.3
+PCB_GRID = 0.5         # Routing grid pitch (mm); at least PCB_TRACK_WIDTH + PCB_CLEARANCE
+PCB_ROUTE_PASSES = 10  # Rip-up-and-retry passes before the remaining nets are left unrouted
+
 # --- Rendering Parameters (used in render_cases.py) ---
 RENDERING_CAMERA_PARAMS_3D = "0,0,0,45,0,45,100" # OpenSCAD camera position for 3D models
+OPENSCAD_BACKEND = None # None renders with OpenSCAD's default (CGAL); "manifold" uses the much faster Manifold backend (OpenSCAD 2024+)
 RENDERING_IMAGE_WIDTH = 800 # Width for generated PNGs
 RENDERING_IMAGE_HEIGHT = 600 # Height for generated PNGs
+CIRCUIT_DIAGRAM_RENDERER = "grid" # "grid" (circuit_schematic.py, any size, no dot needed) or "graphviz" (boards up to 32 buttons)
+PREVIEW_PX_PER_MM = 4 # Full-resolution scale of dxf_preview.py's tiled sheet previews
+PREVIEW_TILE_SIZE = 256 # Preview tile edge (px); peak memory of a preview grows with this, not with the sheet
+MESH_SEGMENTS = None # Facets per cylinder for case_mesh.py's STL; None follows OpenSCAD's default $fa/$fs rule
+
+# --- Generated Artifacts (canonical_output.py) ---
+CANONICAL_OUTPUT = True # Byte-stable outputs: fixed DXF header dates/GUIDs and no text/time chunks in tool-written PNGs
+
+# --- Design Rule Check (design_rules.py, run before build.py renders anything) ---
+DRC_EDGE_MARGIN = 3 # Minimum material between a cut and the panel edge (mm)
+DRC_MIN_WEB = 3     # Minimum material between two cuts (mm)
+DRC_CLEARANCE = 0.5 # Minimum gap between parts: caps, screw heads, standoffs, board, USB-C, LED (mm)
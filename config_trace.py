@@ -0,0 +1,50 @@
+import sys
+from contextlib import contextmanager
+
+# Config read tracing, shared by the build cache, watch mode and the layout model.
+# trace_config_reads() swaps the `config` module for a ConfigTracer proxy while
+# a stage runs, so every `config.X` lookup is recorded by name.
+
+class ConfigTracer:
+    # Proxy around the config module that records every attribute read
+    def __init__(self, cfg):
+        object.__setattr__(self, "_cfg", cfg)
+        object.__setattr__(self, "reads", set())
+
+    def __getattr__(self, name):
+        value = getattr(self._cfg, name)
+        if not name.startswith("__"):
+            self.reads.add(name)
+        return value
+
+    def __setattr__(self, name, value):
+        setattr(self._cfg, name, value)
+
+def is_traced(cfg):
+    return isinstance(cfg, ConfigTracer)
+
+def untraced(cfg):
+    # The config behind a ConfigTracer, for reads that must not be recorded
+    return cfg._cfg if is_traced(cfg) else cfg
+
+@contextmanager
+def trace_config_reads():
+    # Route every `config.X` lookup (in already-imported modules and in modules
+    # imported while tracing) through a ConfigTracer
+    import config
+    real_config = untraced(config)
+    tracer = ConfigTracer(real_config)
+
+    def rebind(old_test, new_value):
+        for module in list(sys.modules.values()):
+            namespace = getattr(module, "__dict__", {})
+            if old_test(namespace.get("config")):
+                namespace["config"] = new_value
+
+    sys.modules["config"] = tracer
+    rebind(lambda c: c is real_config or is_traced(c), tracer)
+    try:
+        yield tracer
+    finally:
+        sys.modules["config"] = real_config
+        rebind(lambda c: c is tracer, real_config)
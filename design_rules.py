@@ -0,0 +1,250 @@
+import argparse
+import math
+from collections import defaultdict, namedtuple
+import config
+from layout import get_layout
+from profiling import add_profile_arguments, profile_command, profiled
+
+# Design-rule check for the case geometry, run before anything is rendered.
+# Features are collected from both generators (the laser-cut panels, the 3D
+# printed case and, optionally, the nested stock sheets) from the same
+# layout.py positions the generators draw with. Every surface is checked for:
+#   outside     - a cut or part that misses its panel entirely
+#   edge_margin - a cut closer than DRC_EDGE_MARGIN to the panel edge, or a
+#                 part that overhangs it
+#   web         - two cuts with less than DRC_MIN_WEB of material between them
+#   clearance   - two parts (caps, screw heads, standoffs, board, USB, LED)
+#                 closer than DRC_CLEARANCE, when their heights overlap
+# Pairs are found through a uniform grid, so checking thousands of features
+# (big matrices, batch nesting) stays near-linear.
+
+# A circle when radius is set (centre is the middle of lo/hi), otherwise the
+# rectangle lo..hi. z is the (bottom, top) height range of a part, None for
+# "all heights". kind is "cut" (material removed) or "part" (must not collide).
+Feature = namedtuple("Feature", ["label", "kind", "lo", "hi", "radius", "z"])
+Surface = namedtuple("Surface", ["name", "lo", "hi", "features", "edge_margin", "min_web"])
+Violation = namedtuple("Violation", ["rule", "surface", "labels", "message"])
+
+def circle(label, kind, x, y, radius, z=None):
+    return Feature(label, kind, (x - radius, y - radius), (x + radius, y + radius), radius, z)
+
+def rect(label, kind, x0, y0, x1, y1, z=None):
+    return Feature(label, kind, (min(x0, x1), min(y0, y1)), (max(x0, x1), max(y0, y1)), None, z)
+
+def center(feature):
+    return ((feature.lo[0] + feature.hi[0]) / 2, (feature.lo[1] + feature.hi[1]) / 2)
+
+# --- Feature collection ---
+
+def lasercut_surfaces(cfg):
+    from generate_lasercut_case import panel_size
+    layout = get_layout(cfg)
+    margin, web = cfg.DRC_EDGE_MARGIN, cfg.DRC_MIN_WEB
+    top = []
+    for i, (x, y) in enumerate(layout.footswitches.tolist(), 1):
+        top.append(circle(f"footswitch {i} hole", "cut", x, y, cfg.FOOTSWITCH_MOUNT_DIAMETER / 2))
+        top.append(circle(f"footswitch {i} cap", "part", x, y, cfg.FOOTSWITCH_CAP_DIAMETER / 2))
+    x, y = layout.led.tolist()
+    top.append(circle("LED hole", "cut", x, y, cfg.LED_HOLE_DIAMETER / 2))
+    top.append(circle("LED", "part", x, y, cfg.LED_HOLE_DIAMETER / 2))
+    bottom = []
+    for i, (x, y) in enumerate(layout.lid_screws.tolist(), 1):
+        for features in (top, bottom):
+            features.append(circle(f"lid screw {i} hole", "cut", x, y, cfg.SCREW_DIAMETER / 2))
+            features.append(circle(f"lid screw {i} head", "part", x, y, cfg.SCREW_HEAD_DIAMETER / 2))
+    for i, (x, y) in enumerate(layout.board_holes.tolist(), 1):
+        bottom.append(circle(f"board screw {i} hole", "cut", x, y, cfg.BOARD_STANDOFF_SCREW_DIAMETER / 2))
+        bottom.append(circle(f"board standoff {i}", "part", x, y, cfg.BOARD_STANDOFF_DIAMETER / 2))
+    front = [rect("USB cutout", "cut", *layout.usb_cutout.tolist())]
+
+    surfaces = []
+    for name, features in (("top", top), ("bottom", bottom), ("front_back", front), ("left_right", [])):
+        width, height = panel_size(name, cfg)
+        surfaces.append(Surface(f"lasercut {name}", (0, 0), (width, height), features, margin, web))
+    return surfaces
+
+def case_surfaces(cfg):
+    layout = get_layout(cfg)
+    margin, web, wall = cfg.DRC_EDGE_MARGIN, cfg.DRC_MIN_WEB, cfg.WALL_THICKNESS
+    lid = []
+    interior = [] # Plan view of the cavity; parts carry their height range
+    footswitch_bottom = cfg.CASE_HEIGHT - wall - cfg.FOOTSWITCH_DEPTH
+    for i, (x, y) in enumerate(layout.footswitches.tolist(), 1):
+        lid.append(circle(f"footswitch {i} hole", "cut", x, y, cfg.FOOTSWITCH_MOUNT_DIAMETER / 2))
+        lid.append(circle(f"footswitch {i} cap", "part", x, y, cfg.FOOTSWITCH_CAP_DIAMETER / 2))
+        interior.append(circle(f"footswitch {i} body", "part", x, y, cfg.FOOTSWITCH_MOUNT_DIAMETER / 2,
+                               (footswitch_bottom, cfg.CASE_HEIGHT)))
+    x, y, z = layout.led_hole_center().tolist()
+    lid.append(circle("LED hole", "cut", x, y, cfg.LED_HOLE_DIAMETER / 2))
+    interior.append(circle("LED", "part", x, y, cfg.LED_HOLE_DIAMETER / 2, (cfg.CASE_HEIGHT - wall, cfg.CASE_HEIGHT)))
+
+    standoff_top = wall + cfg.BOARD_STANDOFF_HEIGHT
+    for i, (x, y, z) in enumerate(layout.standoff_positions().tolist(), 1):
+        interior.append(circle(f"board standoff {i}", "part", x, y, cfg.BOARD_STANDOFF_DIAMETER / 2,
+                               (z, z + cfg.BOARD_STANDOFF_HEIGHT)))
+    interior.append(rect("board", "part", *layout.board.tolist(), (standoff_top, standoff_top + cfg.BOARD_THICKNESS)))
+
+    # The USB-C receptacle sits behind the front wall cutout
+    x, y, z = layout.usb_cutout_center().tolist()
+    usb_z = (z - cfg.USB_C_HEIGHT / 2, z + cfg.USB_C_HEIGHT / 2)
+    front_wall = [rect("USB cutout", "cut", x - cfg.USB_C_WIDTH / 2, usb_z[0], x + cfg.USB_C_WIDTH / 2, usb_z[1])]
+    interior.append(rect("USB-C receptacle", "part", x - cfg.USB_C_WIDTH / 2, wall,
+                         x + cfg.USB_C_WIDTH / 2, wall + cfg.USB_C_DEPTH, usb_z))
+
+    return [
+        Surface("case lid", (0, 0), (cfg.CASE_LENGTH, cfg.CASE_WIDTH), lid, margin, web),
+        Surface("case interior", (wall, wall), (cfg.CASE_LENGTH - wall, cfg.CASE_WIDTH - wall), interior, margin, web),
+        # Cuts in the front wall must stay clear of the floor and the lid
+        Surface("case front wall", (0, wall), (cfg.CASE_LENGTH, cfg.CASE_HEIGHT - wall), front_wall, margin, web),
+    ]
+
+def sheet_surfaces(cfg, batch):
+    from generate_lasercut_sheets import nest_panels, required_panels
+    placements = nest_panels(required_panels(cfg, batch), cfg.STOCK_SHEET_LENGTH, cfg.STOCK_SHEET_WIDTH, cfg.NESTING_SPACING)
+    return [
+        Surface(f"sheet {i}", (0, 0), (cfg.STOCK_SHEET_LENGTH, cfg.STOCK_SHEET_WIDTH),
+                [rect(f"{name} #{j}", "cut", x, y, x + width, y + height)
+                 for j, (name, x, y, width, height, _) in enumerate(sheet, 1)],
+                cfg.NESTING_SPACING, cfg.NESTING_SPACING)
+        for i, sheet in enumerate(placements, 1)
+    ]
+
+# --- Geometry ---
+
+def gap(a, b):
+    # Distance between two features' outlines, negative when they overlap
+    if a.radius is not None and b.radius is not None:
+        (ax, ay), (bx, by) = center(a), center(b)
+        return math.hypot(ax - bx, ay - by) - a.radius - b.radius
+    if a.radius is not None or b.radius is not None:
+        c, r = (a, b) if a.radius is not None else (b, a)
+        (x, y), (x0, y0), (x1, y1) = center(c), r.lo, r.hi
+        if x0 <= x <= x1 and y0 <= y <= y1:
+            return -min(x - x0, x1 - x, y - y0, y1 - y) - c.radius
+        return math.hypot(max(x0 - x, 0, x - x1), max(y0 - y, 0, y - y1)) - c.radius
+    dx = max(b.lo[0] - a.hi[0], a.lo[0] - b.hi[0])
+    dy = max(b.lo[1] - a.hi[1], a.lo[1] - b.hi[1])
+    if dx < 0 and dy < 0:
+        return max(dx, dy)
+    return math.hypot(max(dx, 0), max(dy, 0))
+
+def edge_distance(feature, surface):
+    # Smallest distance from the feature to the surface edge, negative when it crosses it
+    if feature.radius is not None:
+        x, y = center(feature)
+        return min(x - surface.lo[0], y - surface.lo[1], surface.hi[0] - x, surface.hi[1] - y) - feature.radius
+    return min(feature.lo[0] - surface.lo[0], feature.lo[1] - surface.lo[1],
+               surface.hi[0] - feature.hi[0], surface.hi[1] - feature.hi[1])
+
+def heights_overlap(a, b):
+    return a.z is None or b.z is None or (a.z[0] < b.z[1] and b.z[0] < a.z[1])
+
+class SpatialGrid:
+    # Uniform grid hash: a feature is filed under every cell its box touches
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = defaultdict(list)
+
+    def cell_range(self, lo, hi):
+        size = self.cell_size
+        for i in range(math.floor(lo[0] / size), math.floor(hi[0] / size) + 1):
+            for j in range(math.floor(lo[1] / size), math.floor(hi[1] / size) + 1):
+                yield i, j
+
+    def insert(self, index, lo, hi):
+        for cell in self.cell_range(lo, hi):
+            self.cells[cell].append(index)
+
+    def candidates(self, lo, hi):
+        found = set()
+        for cell in self.cell_range(lo, hi):
+            found.update(self.cells.get(cell, ()))
+        return found
+
+def close_pairs(features, distance):
+    # Index pairs (i < j) whose boxes come within `distance` of each other
+    if not features:
+        return []
+    sizes = sorted(max(f.hi[0] - f.lo[0], f.hi[1] - f.lo[1]) for f in features)
+    grid = SpatialGrid(max(sizes[len(sizes) // 2], distance, 1e-3) * 2)
+    for index, feature in enumerate(features):
+        grid.insert(index, feature.lo, feature.hi)
+    pairs = []
+    for i, feature in enumerate(features):
+        lo = (feature.lo[0] - distance, feature.lo[1] - distance)
+        hi = (feature.hi[0] + distance, feature.hi[1] + distance)
+        pairs.extend((i, j) for j in sorted(grid.candidates(lo, hi)) if j > i)
+    return pairs
+
+# --- Checks ---
+
+def check_surface(surface, clearance):
+    violations = []
+    for feature in surface.features:
+        distance = edge_distance(feature, surface)
+        outside = (feature.hi[0] <= surface.lo[0] or feature.lo[0] >= surface.hi[0]
+                   or feature.hi[1] <= surface.lo[1] or feature.lo[1] >= surface.hi[1])
+        if outside:
+            violations.append(Violation("outside", surface.name, (feature.label,),
+                                        f"{feature.label} is outside the {surface.name} outline"))
+        elif feature.kind == "cut" and distance < surface.edge_margin - 1e-9:
+            state = f"crosses the edge by {-distance:.2f} mm" if distance < 0 else f"is {distance:.2f} mm from the edge"
+            violations.append(Violation("edge_margin", surface.name, (feature.label,),
+                                        f"{feature.label} {state} (minimum {surface.edge_margin} mm)"))
+        elif feature.kind == "part" and distance < -1e-9:
+            violations.append(Violation("edge_margin", surface.name, (feature.label,),
+                                        f"{feature.label} overhangs the edge by {-distance:.2f} mm"))
+
+    for i, j in close_pairs(surface.features, max(surface.min_web, clearance)):
+        a, b = surface.features[i], surface.features[j]
+        if a.kind != b.kind:
+            continue
+        distance = gap(a, b)
+        if a.kind == "cut" and distance < surface.min_web - 1e-9:
+            violations.append(Violation("web", surface.name, (a.label, b.label),
+                                        f"{a.label} and {b.label} leave {distance:.2f} mm of material (minimum {surface.min_web} mm)"))
+        elif a.kind == "part" and distance < clearance - 1e-9 and heights_overlap(a, b):
+            state = f"overlap by {-distance:.2f} mm" if distance < 0 else f"are {distance:.2f} mm apart"
+            violations.append(Violation("clearance", surface.name, (a.label, b.label),
+                                        f"{a.label} and {b.label} {state} (minimum {clearance} mm)"))
+    return violations
+
+def design_surfaces(cfg=None, batch=None):
+    cfg = config if cfg is None else cfg
+    surfaces = lasercut_surfaces(cfg) + case_surfaces(cfg)
+    if batch:
+        surfaces += sheet_surfaces(cfg, batch)
+    return surfaces
+
+def check_design(cfg=None, batch=None):
+    # All violations for the current design; pass a batch size to also check the nested sheets
+    cfg = config if cfg is None else cfg
+    with profiled("collect_features"):
+        surfaces = design_surfaces(cfg, batch)
+    with profiled("check_surfaces"):
+        return [v for surface in surfaces for v in check_surface(surface, cfg.DRC_CLEARANCE)]
+
+def print_violations(violations):
+    print(f"\n--- Design Rule Check: {len(violations)} violation(s) ---")
+    for v in violations:
+        print(f"  [{v.rule}] {v.surface}: {v.message}")
+
+def require_clean_design(cfg=None):
+    # For build entry points: stop before any rendering when the design breaks a rule
+    violations = check_design(cfg)
+    if violations:
+        print_violations(violations)
+        raise SystemExit("Design rule check failed; fix config.py or pass --no-drc to build anyway.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the case design for holes off the panel, thin webs and colliding parts.")
+    parser.add_argument("--batch", type=int, default=None, help="Also check the stock sheets nested for this many enclosures")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    with profile_command(args, "design_rules"):
+        violations = check_design(config, args.batch)
+    if violations:
+        print_violations(violations)
+        raise SystemExit(1)
+    print("Design rule check passed.")
@@ -0,0 +1,164 @@
+import argparse
+import csv
+import re
+import time
+from types import SimpleNamespace
+import numpy as np
+import config
+from generate_bom_and_estimates import calculate_3d_print_estimates, calculate_laser_cut_estimates
+from profiling import add_profile_arguments, profile_command, profiled
+
+# Vectorized design-space sweep over the BOM estimators.
+# The estimators in generate_bom_and_estimates.py are plain arithmetic on a cfg
+# object, so handing them a namespace of equally-shaped numpy arrays scores every
+# variant in one call. Parameters that are not swept keep their config.py value.
+
+# Parameters that affect the estimates or the fit checks
+SWEEP_PARAMETERS = [
+    "CASE_LENGTH", "CASE_WIDTH", "CASE_HEIGHT", "WALL_THICKNESS", "MATERIAL_THICKNESS",
+    "INFILL_PERCENTAGE", "NUM_BUTTONS", "FOOTSWITCH_MOUNT_DIAMETER", "FOOTSWITCH_CAP_DIAMETER",
+    "FOOTSWITCH_DEPTH", "BUTTON_SPACING", "BOARD_LENGTH", "BOARD_WIDTH",
+]
+
+ESTIMATE_FIELDS = [
+    ("print_volume_mm3", "total_volume_mm3", calculate_3d_print_estimates),
+    ("print_weight_g", "total_weight_g", calculate_3d_print_estimates),
+    ("print_cost_usd", "total_cost_usd", calculate_3d_print_estimates),
+    ("print_time_hours", "estimated_print_time_hours", calculate_3d_print_estimates),
+    ("laser_area_mm2", "total_area_mm2", calculate_laser_cut_estimates),
+    ("laser_cut_length_mm", "total_perimeter_mm", calculate_laser_cut_estimates),
+    ("laser_sheets", "sheet_count", calculate_laser_cut_estimates),
+    ("laser_cost_usd", "total_cost_usd", calculate_laser_cut_estimates),
+    ("laser_time_minutes", "estimated_cut_time_minutes", calculate_laser_cut_estimates),
+]
+
+def variant_config(params):
+    # Overlay the (broadcast) parameter arrays on every upper-case config value
+    names = list(params)
+    arrays = np.broadcast_arrays(*[np.asarray(params[name], dtype=float) for name in names])
+    cfg = SimpleNamespace(**{name: getattr(config, name) for name in dir(config) if name.isupper()})
+    for name, values in zip(names, arrays):
+        setattr(cfg, name, np.ravel(values))
+    return cfg, arrays[0].size if arrays else 1
+
+def sweep_grid(**ranges):
+    # Cartesian product of the given 1-D value ranges, flattened
+    names = list(ranges)
+    grids = np.meshgrid(*[np.atleast_1d(np.asarray(ranges[name], dtype=float)) for name in names], indexing="ij")
+    return {name: grid.ravel() for name, grid in zip(names, grids)}
+
+def fits_mask(cfg, shell_thickness):
+    # True where the footswitch row, footswitch depth and board fit inside the shell
+    inner_length = cfg.CASE_LENGTH - 2 * shell_thickness
+    inner_width = cfg.CASE_WIDTH - 2 * shell_thickness
+    inner_height = cfg.CASE_HEIGHT - 2 * shell_thickness
+    footswitch_row = cfg.NUM_BUTTONS * cfg.FOOTSWITCH_CAP_DIAMETER + (cfg.NUM_BUTTONS - 1) * cfg.BUTTON_SPACING
+    return (
+        (footswitch_row <= inner_length)
+        & (cfg.FOOTSWITCH_CAP_DIAMETER <= inner_width)
+        & (cfg.FOOTSWITCH_DEPTH <= inner_height)
+        & (cfg.BOARD_LENGTH <= inner_length)
+        & (cfg.BOARD_WIDTH <= inner_width)
+    )
+
+def evaluate_variants(**params):
+    # Score every variant; returns a numpy structured array with one row per variant
+    cfg, count = variant_config(params)
+    print_estimates = calculate_3d_print_estimates(cfg)
+    laser_estimates = calculate_laser_cut_estimates(cfg)
+
+    fields = [(name, "f8") for name in params]
+    fields += [(name, "f8") for name, _, _ in ESTIMATE_FIELDS]
+    fields += [("print_fits", "?"), ("laser_fits", "?")]
+    results = np.empty(count, dtype=fields)
+    for name in params:
+        results[name] = getattr(cfg, name)
+    for name, key, estimator in ESTIMATE_FIELDS:
+        estimates = print_estimates if estimator is calculate_3d_print_estimates else laser_estimates
+        results[name] = estimates[key]
+    results["print_fits"] = fits_mask(cfg, cfg.WALL_THICKNESS)
+    results["laser_fits"] = fits_mask(cfg, cfg.MATERIAL_THICKNESS)
+    return results
+
+def parse_constraint(text):
+    # "FIELD<=VALUE", "FIELD>=VALUE" or "FIELD==VALUE"
+    match = re.fullmatch(r"\s*(\w+)\s*(<=|>=|==)\s*([-+0-9.eE]+)\s*", text)
+    if not match:
+        raise ValueError(f"Invalid constraint: {text}")
+    return match.group(1), match.group(2), float(match.group(3))
+
+def constraint_mask(results, constraints):
+    mask = np.ones(len(results), dtype=bool)
+    for field, op, value in constraints:
+        column = results[field]
+        if op == "<=":
+            mask &= column <= value
+        elif op == ">=":
+            mask &= column >= value
+        else:
+            mask &= np.isclose(column, value)
+    return mask
+
+def minimize(results, objective, constraints=(), count=1):
+    # Indices of the `count` feasible variants with the lowest objective, best first
+    feasible = np.flatnonzero(constraint_mask(results, constraints))
+    if feasible.size == 0:
+        return feasible
+    count = min(count, feasible.size)
+    values = results[objective][feasible]
+    best = np.argpartition(values, count - 1)[:count]
+    return feasible[best[np.argsort(values[best], kind="stable")]]
+
+def write_csv(results, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(results.dtype.names)
+        writer.writerows(results.tolist())
+    print(f"Wrote {len(results)} variants to {path}")
+
+def parse_range(text):
+    # "start:stop:step" (stop inclusive), "a,b,c" or a single value
+    if ":" in text:
+        start, stop, step = (float(v) for v in text.split(":"))
+        return np.arange(start, stop + step / 2, step)
+    return np.array([float(v) for v in text.split(",")])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score enclosure variants and find the cheapest one that fits.")
+    parser.add_argument("ranges", nargs="+", metavar="NAME=RANGE",
+                        help="Parameter range, e.g. CASE_LENGTH=120:300:5 or NUM_BUTTONS=5,7,9")
+    parser.add_argument("--process", choices=["print", "laser"], default="print", help="Which build process to optimize for")
+    parser.add_argument("--objective", default=None, help="Field to minimize (default: <process>_cost_usd)")
+    parser.add_argument("--constraint", action="append", default=[], help="Extra constraint, e.g. print_time_hours<=4")
+    parser.add_argument("--top", type=int, default=5, help="Number of best variants to print")
+    parser.add_argument("--csv", default=None, help="Write every scored variant to this CSV file")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    ranges = {}
+    for item in args.ranges:
+        name, _, text = item.partition("=")
+        if name not in SWEEP_PARAMETERS:
+            raise SystemExit(f"Unknown parameter {name}. Sweepable: {', '.join(SWEEP_PARAMETERS)}")
+        ranges[name] = parse_range(text)
+
+    with profile_command(args, "design_sweep"):
+        start = time.perf_counter()
+        with profiled("evaluate_variants"):
+            results = evaluate_variants(**sweep_grid(**ranges))
+        objective = args.objective or f"{args.process}_cost_usd"
+        constraints = [(f"{args.process}_fits", "==", 1)] + [parse_constraint(c) for c in args.constraint]
+        with profiled("minimize"):
+            best = minimize(results, objective, constraints, args.top)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        print(f"\n--- Design Sweep ({len(results)} variants, {elapsed_ms:.1f} ms) ---")
+        if best.size == 0:
+            print("  No variant satisfies the constraints.")
+        for rank, index in enumerate(best, 1):
+            row = results[index]
+            swept = ", ".join(f"{name}={row[name]:g}" for name in ranges)
+            print(f"  {rank}. {objective}={row[objective]:.4f}  ({swept})")
+
+        if args.csv:
+            write_csv(results, args.csv)
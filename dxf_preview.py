@@ -0,0 +1,280 @@
+import argparse
+import json
+import math
+import os
+import shutil
+import struct
+import tempfile
+from xml.sax.saxutils import quoteattr
+import numpy as np
+from PIL import Image, ImageDraw
+from ezdxf import path as ezdxf_path
+from ezdxf.addons.iterdxf import binary_tagger
+from ezdxf.entities import factory
+from ezdxf.entities.subentity import entity_linker
+from ezdxf.filemanagement import dxf_file_info
+from ezdxf.lldxf.extendedtags import ExtendedTags
+from ezdxf.lldxf.tagger import tag_compiler
+from ezdxf.math import Matrix44
+import config
+from profiling import add_profile_arguments, profile_command, profiled
+
+# Memory-bounded previews of large DXF files such as the nested stock sheets.
+# render_cases.py loads the whole document with ezdxf and builds the complete
+# SVG or image in memory, which is fine for one panel. Here the file is read
+# as a stream of tags (ezdxf's iterdxf tagger) and every entity is flattened into a
+# polyline in a scratch "spill" file, so only one entity is in memory at a
+# time:
+#   - write_preview_svg() copies the spill into an SVG, one element at a time
+#   - write_tile_pyramid() sorts the spill into bands of tile rows, draws each
+#     band a few tiles at a time and saves the tiles as PNGs. It then halves
+#     the resolution level by level, each tile built from its four children,
+#     down to a one-tile thumbnail (a "deep zoom" pyramid for the review UI).
+# Peak memory depends on PREVIEW_TILE_SIZE and not on the sheet size. Block
+# definitions (the ezdxf sheet writer places panels as blocks) are read up
+# front and kept, so memory grows with the number of distinct panels, not
+# their copies.
+
+COLUMN_GROUP = 16  # Tiles drawn side by side per band image
+MAX_BANDS = 256    # Band files open at once; tile rows are merged beyond this
+HEADER = struct.Struct("<5d") # Spill record: point count, bounding box; then x, y pairs
+
+# --- Streaming geometry ---
+
+def iter_entities(dxf_file):
+    # (section, entity) for each entity of the BLOCKS and ENTITIES sections, loaded one at a time.
+    # iterdxf.single_pass_modelspace() would do for the modelspace, but it drops the last entity
+    # before ENDSEC (ezdxf 1.4) and skips the block definitions that sheet panels refer to.
+    encoding = dxf_file_info(str(dxf_file)).encoding
+    linked_entity = entity_linker()
+    section, queued, tags = None, None, []
+    with open(dxf_file, "rb") as stream:
+        for tag in tag_compiler(binary_tagger(stream, encoding)):
+            if tag.code == 0:
+                if tags and section in ("BLOCKS", "ENTITIES") and tags[0].value not in ("SECTION", "ENDSEC"):
+                    entity = factory.load(ExtendedTags(tags))
+                    # VERTEX/SEQEND and ATTRIB entities are attached to the POLYLINE/INSERT before them
+                    if not linked_entity(entity):
+                        if queued:
+                            yield queued
+                        queued = (section, entity)
+                if tag.value == "EOF":
+                    break
+                tags = []
+            elif tag.code == 2 and len(tags) == 1 and tags[0].value == "SECTION":
+                section = tag.value
+            tags.append(tag)
+    if queued:
+        yield queued
+
+def entity_paths(entity, blocks):
+    # (layer, ezdxf Path) pairs of one entity; block references expand to their block's paths
+    if entity.dxftype() == "INSERT":
+        m = entity.matrix44()
+        return [(layer, p.transform(m)) for layer, p in blocks.get(entity.dxf.name, [])]
+    try:
+        return [(entity.dxf.layer, ezdxf_path.make_path(entity))]
+    except TypeError:
+        return [] # Text, dimensions and other entities without a plain outline
+
+def iter_polylines(dxf_file, flattening):
+    # (layer, [(x, y), ...]) of every modelspace outline, one at a time. Block definitions
+    # come before the modelspace and are kept as paths relative to their base point.
+    blocks, current, base = {}, None, None
+    for section, entity in iter_entities(dxf_file):
+        if section == "BLOCKS":
+            if entity.dxftype() == "BLOCK":
+                current = blocks.setdefault(entity.dxf.name, [])
+                base = Matrix44.translate(*(-entity.dxf.base_point))
+            elif entity.dxftype() == "ENDBLK":
+                current = None
+            elif current is not None:
+                current.extend((layer, p.transform(base)) for layer, p in entity_paths(entity, blocks))
+        elif not entity.dxf.get("paperspace", 0):
+            for layer, p in entity_paths(entity, blocks):
+                for sub_path in p.sub_paths():
+                    points = [(v.x, v.y) for v in sub_path.flattening(flattening)]
+                    if points:
+                        yield layer, points
+
+def write_record(f, points):
+    xs = [x for x, _ in points]
+    ys = [y for _, y in points]
+    f.write(HEADER.pack(len(points), min(xs), min(ys), max(xs), max(ys)))
+    f.write(struct.pack(f"<{2 * len(points)}d", *(v for point in points for v in point)))
+
+def read_records(f):
+    # Yields (bbox, flat x, y tuple) until the end of the file
+    while True:
+        header = f.read(HEADER.size)
+        if not header:
+            return
+        count, *bbox = HEADER.unpack(header)
+        count = int(count)
+        yield bbox, struct.unpack(f"<{2 * count}d", f.read(16 * count))
+
+def spill_geometry(dxf_file, spill, flattening):
+    # Flatten every outline into the open binary file spill; returns (count, (xmin, ymin, xmax, ymax))
+    count = 0
+    xmin = ymin = math.inf
+    xmax = ymax = -math.inf
+    for _, points in iter_polylines(dxf_file, flattening):
+        write_record(spill, points)
+        count += 1
+        for x, y in points:
+            xmin, xmax = min(xmin, x), max(xmax, x)
+            ymin, ymax = min(ymin, y), max(ymax, y)
+    if not count:
+        xmin = ymin = xmax = ymax = 0.0
+    return count, (xmin, ymin, xmax, ymax)
+
+# --- SVG ---
+
+def write_preview_svg(dxf_file, output_svg, flattening=0.05):
+    # Streamed DXF -> SVG in mm, written one polyline at a time
+    with tempfile.TemporaryFile() as spill:
+        with profiled(f"spill {dxf_file}"):
+            count, (xmin, ymin, xmax, ymax) = spill_geometry(dxf_file, spill, flattening)
+        spill.seek(0)
+        width, height = max(xmax - xmin, 1e-3), max(ymax - ymin, 1e-3)
+        with profiled(f"write {output_svg}"), open(output_svg, "w", encoding="utf8") as out:
+            out.write(f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.3f}mm" height="{height:.3f}mm" '
+                      f'viewBox="{xmin:.3f} {-ymax:.3f} {width:.3f} {height:.3f}">\n')
+            out.write('<g transform="scale(1,-1)" fill="none" stroke="black" stroke-width="0.2">\n')
+            for _, coords in read_records(spill):
+                points = " ".join(f"{coords[i]:.3f},{coords[i + 1]:.3f}" for i in range(0, len(coords), 2))
+                out.write(f"<polyline points={quoteattr(points)}/>\n")
+            out.write("</g>\n</svg>\n")
+    print(f"Wrote preview SVG: {output_svg} ({count} outlines)")
+    return count
+
+# --- Tile pyramid ---
+
+def tile_path(out_dir, level, col, row):
+    return os.path.join(out_dir, str(level), f"{col}_{row}.png")
+
+def render_band(band_file, band_top, band_rows, cols, tile_size, out_dir, level):
+    # Draw one band of tile rows, COLUMN_GROUP tiles at a time, re-reading its spill file per group
+    band_height = band_rows * tile_size
+    for first_col in range(0, cols, COLUMN_GROUP):
+        group_cols = min(COLUMN_GROUP, cols - first_col)
+        left = first_col * tile_size
+        image = Image.new("L", (group_cols * tile_size, band_height), 255)
+        draw = ImageDraw.Draw(image)
+        band_file.seek(0)
+        for (x0, _, x1, _), coords in read_records(band_file):
+            if x1 < left - 1 or x0 > left + group_cols * tile_size + 1:
+                continue
+            xy = [(coords[i] - left, coords[i + 1] - band_top) for i in range(0, len(coords), 2)]
+            if len(xy) == 1:
+                draw.point(xy, fill=0)
+            else:
+                draw.line(xy, fill=0, width=1)
+        for r in range(band_rows):
+            row = band_top // tile_size + r
+            for c in range(group_cols):
+                tile = image.crop((c * tile_size, r * tile_size, (c + 1) * tile_size, (r + 1) * tile_size))
+                tile.save(tile_path(out_dir, level, first_col + c, row))
+
+def build_parent_level(out_dir, level, cols, rows, tile_size):
+    # Level - 1 from level: each tile is its four children at half resolution
+    parent_cols, parent_rows = math.ceil(cols / 2), math.ceil(rows / 2)
+    os.makedirs(os.path.join(out_dir, str(level - 1)), exist_ok=True)
+    for row in range(parent_rows):
+        for col in range(parent_cols):
+            image = Image.new("L", (2 * tile_size, 2 * tile_size), 255)
+            for dy in (0, 1):
+                for dx in (0, 1):
+                    c, r = 2 * col + dx, 2 * row + dy
+                    if c < cols and r < rows:
+                        with Image.open(tile_path(out_dir, level, c, r)) as child:
+                            image.paste(child, (dx * tile_size, dy * tile_size))
+            # Darkest pixel of each 2 x 2 block, so one-pixel cut lines stay visible when zoomed out
+            pixels = np.asarray(image).reshape(tile_size, 2, tile_size, 2).min(axis=(1, 3))
+            Image.fromarray(pixels).save(tile_path(out_dir, level - 1, col, row))
+    return parent_cols, parent_rows
+
+def write_tile_pyramid(dxf_file, out_dir, px_per_mm=None, tile_size=None, cfg=None):
+    # Tiles go to out_dir/<level>/<col>_<row>.png, level 0 being a single thumbnail tile;
+    # out_dir/preview.json describes the pyramid. Returns that description.
+    cfg = config if cfg is None else cfg
+    px_per_mm = cfg.PREVIEW_PX_PER_MM if px_per_mm is None else px_per_mm
+    tile_size = cfg.PREVIEW_TILE_SIZE if tile_size is None else tile_size
+    margin = 2 # px of white around the drawing
+
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    with tempfile.TemporaryDirectory() as scratch:
+        with open(os.path.join(scratch, "spill.bin"), "w+b") as spill:
+            with profiled(f"spill {dxf_file}"):
+                count, (xmin, ymin, xmax, ymax) = spill_geometry(dxf_file, spill, 0.5 / px_per_mm)
+            width = math.ceil((xmax - xmin) * px_per_mm) + 2 * margin
+            height = math.ceil((ymax - ymin) * px_per_mm) + 2 * margin
+            cols, rows = math.ceil(width / tile_size), math.ceil(height / tile_size)
+            band_rows = math.ceil(rows / MAX_BANDS)
+            bands = math.ceil(rows / band_rows)
+            band_height = band_rows * tile_size
+
+            # Sort the outlines into bands, in pixel coordinates (y down); an outline crossing bands goes into each
+            with profiled("split bands"):
+                band_files = [open(os.path.join(scratch, f"band{b}.bin"), "w+b") for b in range(bands)]
+                try:
+                    spill.seek(0)
+                    for _, coords in read_records(spill):
+                        points = [((coords[i] - xmin) * px_per_mm + margin, (ymax - coords[i + 1]) * px_per_mm + margin)
+                                  for i in range(0, len(coords), 2)]
+                        top = min(y for _, y in points)
+                        bottom = max(y for _, y in points)
+                        for b in range(max(int(top - 1) // band_height, 0), min(int(bottom + 1) // band_height, bands - 1) + 1):
+                            write_record(band_files[b], points)
+
+                    level = max(math.ceil(math.log2(max(cols, rows))), 0)
+                    os.makedirs(os.path.join(out_dir, str(level)), exist_ok=True)
+                    with profiled("render tiles"):
+                        for b, band_file in enumerate(band_files):
+                            render_band(band_file, b * band_height, min(band_rows, rows - b * band_rows),
+                                        cols, tile_size, out_dir, level)
+                finally:
+                    for band_file in band_files:
+                        band_file.close()
+
+    levels = level + 1
+    with profiled("build pyramid"):
+        level_cols, level_rows = cols, rows
+        for z in range(level, 0, -1):
+            level_cols, level_rows = build_parent_level(out_dir, z, level_cols, level_rows, tile_size)
+
+    manifest = {
+        "source": os.path.basename(str(dxf_file)),
+        "outlines": count,
+        "width": width, "height": height,
+        "tile_size": tile_size, "levels": levels,
+        "px_per_mm": px_per_mm,
+        # Drawing coordinates (mm) of the top-left pixel of level levels - 1
+        "origin_mm": [xmin - margin / px_per_mm, ymax + margin / px_per_mm],
+        "tiles": "{level}/{col}_{row}.png",
+    }
+    with open(os.path.join(out_dir, "preview.json"), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"Wrote preview tiles: {out_dir} ({width} x {height} px, {levels} levels, {count} outlines)")
+    return manifest
+
+def default_tile_dir(dxf_file):
+    return os.path.join("renderings", "preview_" + os.path.splitext(os.path.basename(dxf_file))[0])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream large DXF files into tiled PNG previews and SVGs with bounded memory.")
+    parser.add_argument("dxf", nargs="+", help="DXF files, e.g. esp32_lasercut_sheet_*.dxf")
+    parser.add_argument("--px-per-mm", type=float, default=None, help="Full-resolution scale (default: config.PREVIEW_PX_PER_MM)")
+    parser.add_argument("--tile-size", type=int, default=None, help="Tile edge in pixels (default: config.PREVIEW_TILE_SIZE)")
+    parser.add_argument("--svg", action="store_true", help="Also write <name>.svg next to the tiles")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    with profile_command(args, "dxf_preview"):
+        for dxf_file in args.dxf:
+            out_dir = default_tile_dir(dxf_file)
+            write_tile_pyramid(dxf_file, out_dir, args.px_per_mm, args.tile_size)
+            if args.svg:
+                write_preview_svg(dxf_file, out_dir + ".svg")
@@ -0,0 +1,210 @@
+import os
+from collections import namedtuple
+
+# Streaming DXF writer for the entity subset the laser-cut generators use.
+# Building an ezdxf document costs far more than the handful of polylines and
+# circles in a panel, so for bulk output (nested sheets, fleets of variants)
+# entities can instead be written straight to a file or text buffer as R2010
+# DXF: the fixed tables/blocks/objects skeleton is emitted around the
+# ENTITIES section and nothing is kept in memory per entity. Layers must be
+# declared up front because the LAYER table precedes the entities. The output
+# reads back with ezdxf and passes its audit without fixes.
+#
+# The panel drawers only call add_lwpolyline/add_circle, so they draw into an
+# ezdxf modelspace, a ShapeRecorder (plain shapes, e.g. to plan the cut order
+# first) or a DXFStreamWriter alike.
+
+class Polyline(namedtuple("Polyline", ["points", "closed", "layer"])):
+    __slots__ = ()
+
+    def dxftype(self):
+        return "LWPOLYLINE"
+
+class Circle(namedtuple("Circle", ["center", "radius", "layer"])):
+    __slots__ = ()
+
+    def dxftype(self):
+        return "CIRCLE"
+
+# Header value placeholder, patched in close() once the entity count is known
+HANDSEED_WIDTH = 8
+
+# Fixed handles of the skeleton; layers and entities are numbered from FIRST_HANDLE
+H_LAYER_TABLE, H_LTYPE_TABLE, H_APPID_TABLE, H_DIMSTYLE_TABLE = 0x1, 0x2, 0x3, 0x4
+H_STYLE_TABLE, H_UCS_TABLE, H_VIEW_TABLE, H_VPORT_TABLE, H_BLOCK_RECORD_TABLE = 0x5, 0x6, 0x7, 0x8, 0x9
+H_ROOT_DICT, H_GROUP_DICT, H_LAYOUT_DICT = 0xA, 0xB, 0xC
+H_VPORT, H_LTYPE_BYBLOCK, H_LTYPE_BYLAYER, H_LTYPE_CONTINUOUS = 0x10, 0x11, 0x12, 0x13
+H_STYLE, H_APPID, H_DIMSTYLE = 0x14, 0x15, 0x16
+H_MODEL_RECORD, H_MODEL_BLOCK, H_MODEL_ENDBLK, H_MODEL_LAYOUT = 0x17, 0x18, 0x19, 0x1A
+H_PAPER_RECORD, H_PAPER_BLOCK, H_PAPER_ENDBLK, H_PAPER_LAYOUT = 0x1B, 0x1C, 0x1D, 0x1E
+H_LAYER_0 = 0x1F
+FIRST_HANDLE = 0x20
+
+class ShapeRecorder:
+    # Stand-in for an ezdxf modelspace that keeps the drawn entities as plain shapes
+    def __init__(self):
+        self.shapes = []
+
+    def add_lwpolyline(self, points, close=False, dxfattribs=None):
+        self.shapes.append(Polyline([tuple(p[:2]) for p in points], close, (dxfattribs or {}).get("layer", "0")))
+
+    def add_circle(self, center, radius, dxfattribs=None):
+        self.shapes.append(Circle(tuple(center[:2]), radius, (dxfattribs or {}).get("layer", "0")))
+
+def number(value):
+    # Shortest round-trip repr, like ezdxf writes coordinates
+    return repr(float(value))
+
+def tags(*pairs):
+    return "".join(f"{code:>3}\n{value}\n" for code, value in pairs)
+
+def symbol_table(name, handle, entries, count):
+    extra = [(100, "AcDbDimStyleTable")] if name == "DIMSTYLE" else []
+    return tags((0, "TABLE"), (2, name), (5, f"{handle:X}"), (330, "0"), (100, "AcDbSymbolTable"), (70, count), *extra) + \
+        "".join(entries) + tags((0, "ENDTAB"))
+
+def table_record(kind, handle, owner, subclass, *pairs, handle_code=5):
+    return tags((0, kind), (handle_code, f"{handle:X}"), (330, f"{owner:X}"),
+                (100, "AcDbSymbolTableRecord"), (100, subclass), *pairs)
+
+def layout_object(handle, name, block_record, flags, tab_order):
+    return tags(
+        (0, "LAYOUT"), (5, f"{handle:X}"), (330, f"{H_LAYOUT_DICT:X}"), (100, "AcDbPlotSettings"),
+        (1, ""), (4, "A3"), (6, ""), (40, 7.5), (41, 20.0), (42, 7.5), (43, 20.0), (44, 420.0), (45, 297.0),
+        (46, 0.0), (47, 0.0), (48, 0.0), (49, 0.0), (140, 0.0), (141, 0.0), (142, 1.0), (143, 1.0),
+        (70, flags), (72, 1), (73, 0), (74, 5), (7, ""), (75, 16), (76, 0), (77, 2), (78, 300),
+        (147, 1.0), (148, 0.0), (149, 0.0), (100, "AcDbLayout"), (1, name), (70, 1), (71, tab_order),
+        (10, 0.0), (20, 0.0), (11, 420.0), (21, 297.0), (12, 0.0), (22, 0.0), (32, 0.0),
+        (14, 1e20), (24, 1e20), (34, 1e20), (15, -1e20), (25, -1e20), (35, -1e20), (146, 0.0),
+        (13, 0.0), (23, 0.0), (33, 0.0), (16, 1.0), (26, 0.0), (36, 0.0), (17, 0.0), (27, 1.0), (37, 0.0),
+        (76, 1), (330, f"{block_record:X}"),
+    )
+
+def block_pair(record, block, endblk, name):
+    return tags((0, "BLOCK"), (5, f"{block:X}"), (330, f"{record:X}"), (100, "AcDbEntity"), (8, "0"),
+                (100, "AcDbBlockBegin"), (2, name), (70, 0), (10, 0.0), (20, 0.0), (30, 0.0), (3, name), (1, "")) + \
+        tags((0, "ENDBLK"), (5, f"{endblk:X}"), (330, f"{record:X}"), (100, "AcDbEntity"), (8, "0"),
+             (100, "AcDbBlockEnd"))
+
+class DXFStreamWriter:
+    # Writes an R2010 DXF to a text stream as entities are added; call close()
+    # (or use it as a context manager) to finish the file.
+    # layers: (name, ACI color, plot) for every layer other than "0"
+    def __init__(self, stream, layers=()):
+        self.stream = stream
+        self.next_handle = FIRST_HANDLE
+        self.layers = {"0"}
+        self.write_preamble(list(layers))
+
+    def allocate(self):
+        handle = self.next_handle
+        self.next_handle += 1
+        return handle
+
+    def write_preamble(self, layers):
+        write = self.stream.write
+        write(tags((0, "SECTION"), (2, "HEADER"), (9, "$ACADVER"), (1, "AC1024"), (9, "$DWGCODEPAGE"), (3, "ANSI_1252"),
+                   (9, "$INSBASE"), (10, 0.0), (20, 0.0), (30, 0.0), (9, "$INSUNITS"), (70, 6), (9, "$MEASUREMENT"), (70, 1)))
+        write(tags((9, "$HANDSEED")) + f"{5:>3}\n")
+        # Remember where the placeholder goes; only seekable streams get the exact value patched in
+        self.handseed_offset = self.stream.tell() if self.stream.seekable() else None
+        write("F" * HANDSEED_WIDTH + "\n")
+        write(tags((0, "ENDSEC"), (0, "SECTION"), (2, "CLASSES"), (0, "ENDSEC"), (0, "SECTION"), (2, "TABLES")))
+
+        write(symbol_table("VPORT", H_VPORT_TABLE, [table_record(
+            "VPORT", H_VPORT, H_VPORT_TABLE, "AcDbViewportTableRecord", (2, "*Active"), (70, 0),
+            (10, 0.0), (20, 0.0), (11, 1.0), (21, 1.0), (12, 0.0), (22, 0.0), (13, 0.0), (23, 0.0),
+            (14, 0.5), (24, 0.5), (15, 0.5), (25, 0.5), (16, 0.0), (26, 0.0), (36, 1.0), (17, 0.0), (27, 0.0), (37, 0.0),
+            (40, 1000.0), (41, 1.34), (42, 50.0), (43, 0.0), (44, 0.0), (50, 0.0), (51, 0.0),
+            (71, 0), (72, 1000), (73, 1), (74, 3), (75, 0), (76, 0), (77, 0), (78, 0), (281, 0), (65, 0), (146, 0.0))], 1))
+        write(symbol_table("LTYPE", H_LTYPE_TABLE, [
+            table_record("LTYPE", handle, H_LTYPE_TABLE, "AcDbLinetypeTableRecord",
+                         (2, name), (70, 0), (3, ""), (72, 65), (73, 0), (40, 0.0))
+            for handle, name in ((H_LTYPE_BYBLOCK, "ByBlock"), (H_LTYPE_BYLAYER, "ByLayer"), (H_LTYPE_CONTINUOUS, "Continuous"))
+        ], 3))
+        layer_records = [table_record("LAYER", H_LAYER_0, H_LAYER_TABLE, "AcDbLayerTableRecord",
+                                      (2, "0"), (70, 0), (62, 7), (6, "Continuous"), (370, -3))]
+        for name, color, plot in layers:
+            self.layers.add(name)
+            plot_flag = [] if plot else [(290, 0)]
+            layer_records.append(table_record("LAYER", self.allocate(), H_LAYER_TABLE, "AcDbLayerTableRecord",
+                                              (2, name), (70, 0), (62, color), (6, "Continuous"), *plot_flag, (370, -3)))
+        write(symbol_table("LAYER", H_LAYER_TABLE, layer_records, len(layer_records)))
+        write(symbol_table("STYLE", H_STYLE_TABLE, [table_record(
+            "STYLE", H_STYLE, H_STYLE_TABLE, "AcDbTextStyleTableRecord", (2, "Standard"), (70, 0),
+            (40, 0.0), (41, 1.0), (50, 0.0), (71, 0), (42, 2.5), (3, "txt"), (4, ""))], 1))
+        write(symbol_table("VIEW", H_VIEW_TABLE, [], 0))
+        write(symbol_table("UCS", H_UCS_TABLE, [], 0))
+        write(symbol_table("APPID", H_APPID_TABLE, [table_record(
+            "APPID", H_APPID, H_APPID_TABLE, "AcDbRegAppTableRecord", (2, "ACAD"), (70, 0))], 1))
+        write(symbol_table("DIMSTYLE", H_DIMSTYLE_TABLE, [table_record(
+            "DIMSTYLE", H_DIMSTYLE, H_DIMSTYLE_TABLE, "AcDbDimStyleTableRecord", (2, "Standard"), (70, 0),
+            handle_code=105)], 1))
+        write(symbol_table("BLOCK_RECORD", H_BLOCK_RECORD_TABLE, [
+            table_record("BLOCK_RECORD", record, H_BLOCK_RECORD_TABLE, "AcDbBlockTableRecord",
+                         (2, name), (340, f"{layout:X}"), (70, 0), (280, 1), (281, 0))
+            for record, name, layout in ((H_MODEL_RECORD, "*Model_Space", H_MODEL_LAYOUT),
+                                         (H_PAPER_RECORD, "*Paper_Space", H_PAPER_LAYOUT))
+        ], 2))
+        write(tags((0, "ENDSEC"), (0, "SECTION"), (2, "BLOCKS")))
+        write(block_pair(H_MODEL_RECORD, H_MODEL_BLOCK, H_MODEL_ENDBLK, "*Model_Space"))
+        write(block_pair(H_PAPER_RECORD, H_PAPER_BLOCK, H_PAPER_ENDBLK, "*Paper_Space"))
+        write(tags((0, "ENDSEC"), (0, "SECTION"), (2, "ENTITIES")))
+
+    def entity_header(self, kind, layer, subclass):
+        if layer not in self.layers:
+            raise ValueError(f"Layer '{layer}' was not declared when the DXFStreamWriter was created")
+        return tags((0, kind), (5, f"{self.allocate():X}"), (330, f"{H_MODEL_RECORD:X}"), (100, "AcDbEntity"), (8, layer),
+                    (100, subclass))
+
+    def add_lwpolyline(self, points, close=False, dxfattribs=None):
+        points = list(points)
+        layer = (dxfattribs or {}).get("layer", "0")
+        self.stream.write(self.entity_header("LWPOLYLINE", layer, "AcDbPolyline") +
+                          tags((90, len(points)), (70, 1 if close else 0), (43, 0.0)) +
+                          "".join(tags((10, number(p[0])), (20, number(p[1]))) for p in points))
+
+    def add_circle(self, center, radius, dxfattribs=None):
+        layer = (dxfattribs or {}).get("layer", "0")
+        self.stream.write(self.entity_header("CIRCLE", layer, "AcDbCircle") +
+                          tags((10, number(center[0])), (20, number(center[1])), (30, 0.0), (40, number(radius))))
+
+    def add_shape(self, shape):
+        if isinstance(shape, Circle):
+            self.add_circle(shape.center, shape.radius, {"layer": shape.layer})
+        else:
+            self.add_lwpolyline(shape.points, shape.closed, {"layer": shape.layer})
+
+    def close(self):
+        write = self.stream.write
+        write(tags((0, "ENDSEC"), (0, "SECTION"), (2, "OBJECTS")))
+        write(tags((0, "DICTIONARY"), (5, f"{H_ROOT_DICT:X}"), (330, "0"), (100, "AcDbDictionary"), (281, 1),
+                   (3, "ACAD_GROUP"), (350, f"{H_GROUP_DICT:X}"), (3, "ACAD_LAYOUT"), (350, f"{H_LAYOUT_DICT:X}")))
+        write(tags((0, "DICTIONARY"), (5, f"{H_GROUP_DICT:X}"), (330, f"{H_ROOT_DICT:X}"), (100, "AcDbDictionary"), (281, 1)))
+        write(tags((0, "DICTIONARY"), (5, f"{H_LAYOUT_DICT:X}"), (330, f"{H_ROOT_DICT:X}"), (100, "AcDbDictionary"), (281, 1),
+                   (3, "Model"), (350, f"{H_MODEL_LAYOUT:X}"), (3, "Layout1"), (350, f"{H_PAPER_LAYOUT:X}")))
+        write(layout_object(H_MODEL_LAYOUT, "Model", H_MODEL_RECORD, 1024, 0))
+        write(layout_object(H_PAPER_LAYOUT, "Layout1", H_PAPER_RECORD, 0, 1))
+        write(tags((0, "ENDSEC"), (0, "EOF")))
+        if self.handseed_offset is not None:
+            end = self.stream.tell()
+            self.stream.seek(self.handseed_offset)
+            self.stream.write(f"{self.next_handle:0{HANDSEED_WIDTH}X}")
+            self.stream.seek(end)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+
+def write_dxf(target, shapes, layers=()):
+    # Stream shapes (any iterable) to a path or an open text stream
+    if isinstance(target, (str, os.PathLike)):
+        with open(target, "w", encoding="cp1252") as f:
+            write_dxf(f, shapes, layers)
+        return
+    with DXFStreamWriter(target, layers) as writer:
+        for shape in shapes:
+            writer.add_shape(shape)
@@ -0,0 +1,211 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+from profiling import add_profile_arguments, finish_profile, profile_command
+
+# Single command-line entry point for all generators.
+#
+#   ./venv/bin/python esphid.py config-h | case | stl | lasercut | render | preview | bom | pcb | drc | all | fleet | watch
+#
+# Only argparse and the standard library are imported up front; each
+# subcommand imports its generator (and with it solid, ezdxf, numpy, Pillow or
+# graphviz) when it runs, so cheap commands do not pay for the heavy ones.
+# `esphid.py startup` checks the quick commands against STARTUP_BUDGET_MS.
+
+# Wall-time budget per quick command, including interpreter start-up
+STARTUP_BUDGET_MS = {
+    "config-h": 150,
+    "bom --quick": 150,
+}
+
+def cmd_config_h(args):
+    import generate_firmware_config
+    generate_firmware_config.generate_firmware_config_h()
+
+def cmd_case(args):
+    import generate_case
+    paths = generate_case.write_case_scad()
+    if args.stl:
+        import render_cases
+        for path in paths:
+            render_cases.export_openscad_stl(path, path[:-len(".scad")] + ".stl", args.backend)
+
+def cmd_stl(args):
+    import case_mesh
+    case_mesh.write_case_stl(args.output, args.segments, None if args.no_preview else args.preview)
+
+def cmd_lasercut(args):
+    import config
+    import generate_lasercut_case
+    if args.no_write:
+        docs = generate_lasercut_case.build_lasercut_case(config)
+    else:
+        docs = generate_lasercut_case.generate_lasercut_case(config, args.writer)
+    if args.render:
+        # Rendered from the drawings in memory; the streaming writer keeps none, so its DXFs are read back
+        import render_cases
+        for name, doc in docs.items():
+            render_cases.convert_dxf_to_png(doc, os.path.join(render_cases.OUTPUT_DIR, f"esp32_lasercut_case_{name}.png"))
+    if args.sheets:
+        import generate_lasercut_sheets
+        report = generate_lasercut_sheets.generate_lasercut_sheets(config, args.batch, args.writer)
+        print(f"Nested {report['part_count']} panels onto {report['sheet_count']} sheet(s), "
+              f"{report['utilization'] * 100:.1f}% utilized")
+
+def cmd_render(args):
+    import render_cases
+    render_cases.render_all()
+
+def cmd_preview(args):
+    import dxf_preview
+    for dxf_file in args.dxf:
+        out_dir = dxf_preview.default_tile_dir(dxf_file)
+        dxf_preview.write_tile_pyramid(dxf_file, out_dir, args.px_per_mm)
+        if args.svg:
+            dxf_preview.write_preview_svg(dxf_file, out_dir + ".svg")
+
+def cmd_bom(args):
+    import generate_bom_and_estimates
+    generate_bom_and_estimates.print_bom_and_estimates(measure_toolpaths=not args.quick)
+
+def cmd_pcb(args):
+    import generate_button_pcb
+    generate_button_pcb.generate_button_pcb_netlist()
+    generate_button_pcb.generate_conceptual_layout()
+    if not args.no_board:
+        generate_button_pcb.generate_kicad_pcb()
+    if not args.no_diagram:
+        generate_button_pcb.render_circuit_diagram(args.diagram)
+
+def cmd_drc(args):
+    import config
+    import design_rules
+    violations = design_rules.check_design(config, args.batch)
+    if violations:
+        design_rules.print_violations(violations)
+        raise SystemExit(1)
+    print("Design rule check passed.")
+
+def cmd_all(args):
+    import build
+    if not args.no_drc:
+        import design_rules
+        design_rules.require_clean_design()
+    cache_dir = None
+    if not args.no_cache:
+        import artifact_cache
+        cache_dir = artifact_cache.DEFAULT_CACHE_DIR
+    spans = [] if (args.profile or args.chrome_trace) else None
+    timings, cached, failed, total_wall = build.run_stages(build.define_stages(), args.jobs, cache_dir, spans)
+    build.print_report(timings, cached, failed, total_wall)
+    if spans is not None:
+        finish_profile(sorted(spans, key=lambda s: s["start_time"]), args, "all")
+    if failed:
+        raise SystemExit(1)
+
+def cmd_fleet(args):
+    import artifact_cache
+    import fleet
+    variants = fleet.load_manifest(args.manifest)
+    if not args.no_drc:
+        variants = fleet.check_variants(variants)
+    cache_dir = None if args.no_cache else artifact_cache.DEFAULT_CACHE_DIR
+    results, total_wall = fleet.run_fleet(variants, fleet.fleet_stages(args.stages), args.output_dir, args.jobs, cache_dir)
+    fleet.print_fleet_report(results, total_wall)
+    fleet.write_fleet_bom(results, args.output_dir)
+    if any(result["failed"] for result in results.values()):
+        raise SystemExit(1)
+
+def cmd_watch(args):
+    import build
+    import watch
+    os.makedirs(build.RENDERINGS_DIR, exist_ok=True)
+    watch.Watcher(build.select_stages(build.define_stages(), args.stages)).watch(args.interval)
+
+def cmd_startup(args):
+    # Run each quick command in a fresh interpreter and keep the fastest of a few runs
+    script = os.path.abspath(__file__)
+    failures = 0
+    print(f"\n--- Startup Budget (best of {args.repeat}) ---")
+    for command, budget_ms in STARTUP_BUDGET_MS.items():
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, script] + command.split(), check=True, stdout=subprocess.DEVNULL)
+            best = min(best, (time.perf_counter() - start) * 1000)
+        ok = best <= budget_ms
+        failures += not ok
+        print(f"  {command:<16} {best:7.1f} ms  (budget {budget_ms} ms){'' if ok else '  OVER BUDGET'}")
+    if failures:
+        raise SystemExit(1)
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="esphid", description="Generate firmware config, cases, renderings, BOM and PCB files.")
+    subparsers = parser.add_subparsers(dest="command", required=True, metavar="command")
+
+    def add(name, func, help_text):
+        sub = subparsers.add_parser(name, help=help_text, description=help_text)
+        sub.set_defaults(func=func)
+        add_profile_arguments(sub)
+        return sub
+
+    add("config-h", cmd_config_h, "Generate config.h for the firmware")
+    case = add("case", cmd_case, "Generate the 3D printable case base and lid (OpenSCAD)")
+    case.add_argument("--stl", action="store_true", help="Also export each part to STL with OpenSCAD")
+    case.add_argument("--backend", default=None, help="OpenSCAD render backend, e.g. manifold (default: config.OPENSCAD_BACKEND)")
+    stl = add("stl", cmd_stl, "Export the 3D printable case as binary STL without OpenSCAD")
+    stl.add_argument("--output", default="esp32_footswitch_case.stl", help="STL file to write")
+    stl.add_argument("--segments", type=int, default=None, help="Facets per cylinder (default: config.MESH_SEGMENTS)")
+    stl.add_argument("--preview", default=os.path.join("renderings", "esp32_footswitch_case_preview.png"), help="PNG preview to render")
+    stl.add_argument("--no-preview", action="store_true", help="Skip the PNG preview")
+    lasercut = add("lasercut", cmd_lasercut, "Generate the laser-cut panel DXFs")
+    lasercut.add_argument("--render", action="store_true", help="Also render each panel to PNG")
+    lasercut.add_argument("--no-write", action="store_true", help="Do not write the panel DXFs (e.g. with --render)")
+    lasercut.add_argument("--sheets", action="store_true", help="Also nest the panels onto stock sheets")
+    lasercut.add_argument("--batch", type=int, default=1, help="Enclosures to nest together with --sheets")
+    lasercut.add_argument("--writer", choices=["ezdxf", "stream"], default=None, help="DXF back end (default: config.DXF_WRITER)")
+    add("render", cmd_render, "Render the cases to PNG")
+    preview = add("preview", cmd_preview, "Stream DXF sheets into tiled, zoomable PNG previews")
+    preview.add_argument("dxf", nargs="+", help="DXF files, e.g. esp32_lasercut_sheet_*.dxf")
+    preview.add_argument("--px-per-mm", type=float, default=None, help="Full-resolution scale (default: config.PREVIEW_PX_PER_MM)")
+    preview.add_argument("--svg", action="store_true", help="Also write a streamed SVG of each file")
+    bom = add("bom", cmd_bom, "Print the bill of materials and estimates")
+    bom.add_argument("--quick", action="store_true", help="Skip slicing the case and measuring the laser toolpaths (no solid, numpy or ezdxf import)")
+    pcb = add("pcb", cmd_pcb, "Generate the button PCB netlist, layout, routed board and circuit diagram")
+    pcb.add_argument("--no-board", action="store_true", help="Skip placing and routing button_pcb.kicad_pcb")
+    pcb.add_argument("--no-diagram", action="store_true", help="Skip the circuit diagram")
+    pcb.add_argument("--diagram", choices=["grid", "graphviz"], default=None, help="Circuit diagram renderer (default: config.CIRCUIT_DIAGRAM_RENDERER)")
+    drc = add("drc", cmd_drc, "Check holes, cutouts and parts against the design rules")
+    drc.add_argument("--batch", type=int, default=None, help="Also check the stock sheets nested for this many enclosures")
+    everything = add("all", cmd_all, "Build every artifact in parallel (same as build.py)")
+    everything.add_argument("-j", "--jobs", type=int, default=None, help="Number of worker processes")
+    everything.add_argument("--no-cache", action="store_true", help="Bypass the artifact cache")
+    everything.add_argument("--no-drc", action="store_true", help="Build even if the design rule check fails")
+    fleet = add("fleet", cmd_fleet, "Build every variant in a manifest, each into its own directory")
+    fleet.add_argument("manifest", help="JSON manifest of variants (see fleet_manifest.example.json)")
+    fleet.add_argument("stages", nargs="*", help="Stages to build per variant (default: all)")
+    fleet.add_argument("-j", "--jobs", type=int, default=None, help="Number of worker processes")
+    fleet.add_argument("-o", "--output-dir", default="fleet", help="Directory for the per-variant output directories")
+    fleet.add_argument("--no-cache", action="store_true", help="Build every stage of every variant, sharing nothing")
+    fleet.add_argument("--no-drc", action="store_true", help="Build variants even if they fail the design rule check")
+    watch = subparsers.add_parser("watch", help="Regenerate affected artifacts whenever config.py changes")
+    watch.set_defaults(func=cmd_watch)
+    watch.add_argument("stages", nargs="*", help="Stages to keep up to date (default: all)")
+    watch.add_argument("--interval", type=float, default=0.2, help="Polling interval in seconds")
+    startup = subparsers.add_parser("startup", help="Check the quick commands against their start-up budget")
+    startup.set_defaults(func=cmd_startup)
+    startup.add_argument("--repeat", type=int, default=5)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command in ("all", "watch", "startup"):
+        args.func(args) # Profiled per stage by build.py / not profiled
+        return
+    with profile_command(args, args.command):
+        args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+import argparse
+import json
+import os
+import re
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import contextmanager, redirect_stdout
+import config
+from build import RENDERINGS_DIR, define_stages, select_stages, stage_dependencies
+from profiling import add_profile_arguments, profile_command
+
+# Batch ("fleet") builds of many device variants in one run.
+#
+# A JSON manifest lists the variants, each as overrides on top of config.py:
+#
+#   {"defaults": {"CASE_WIDTH": 110},
+#    "variants": [{"name": "studio", "count": 5, "config": {"BLE_KEYBOARD_NAME": "Studio Pedal"}},
+#                 {"name": "live-4", "config": {"NUM_BUTTONS": 4, ...}}]}
+#
+# config.py is executed again for every variant with its overrides pinned, so
+# derived values (BUTTON_ACTIONS from the MACRO_*_OUTPUT strings,
+# NESTING_SPACING from MATERIAL_THICKNESS) follow the overrides. Every
+# (variant, build stage) pair is one task on a shared process pool; a task
+# patches the config module with its variant's values and runs in the
+# variant's own output directory (fleet/<name>/), so variants never overwrite
+# each other. Stages are shared through the artifact cache: a stage runs for
+# the first variant before any other variant starts it, and the others restore
+# its outputs when the config values it read are the same (e.g. the case DXFs
+# of variants that only differ in BLE names or macros).
+
+DEFAULT_OUTPUT_DIR = "fleet"
+LOG_FILE = "build.log"
+VARIANT_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]*$")
+
+# bom only prints; each variant's estimates are collected by variant_estimates() instead
+SKIPPED_STAGES = {"bom"}
+
+Variant = namedtuple("Variant", ["name", "count", "values"])
+
+class PinnedNamespace(dict):
+    # Locals for executing config.py in which the overridden names keep their override
+    def __init__(self, overrides):
+        super().__init__(overrides)
+        self.pinned = set(overrides)
+
+    def __setitem__(self, name, value):
+        if name not in self.pinned:
+            super().__setitem__(name, value)
+
+def config_values(cfg):
+    return {name: getattr(cfg, name) for name in dir(cfg) if name.isupper()}
+
+def from_json(value, nested=False):
+    # JSON arrays inside an array become tuples, like the BUTTON_ACTIONS entries and matrix positions
+    if isinstance(value, list):
+        items = [from_json(item, True) for item in value]
+        return tuple(items) if nested else items
+    if isinstance(value, dict):
+        return {key: from_json(item) for key, item in value.items()}
+    return value
+
+def variant_values(overrides):
+    # Every config value for one variant: config.py re-executed with the overrides pinned
+    unknown = sorted(set(overrides) - set(config_values(config)))
+    if unknown:
+        raise ValueError(f"Unknown config value(s): {', '.join(unknown)}")
+    with open(config.__file__) as f:
+        code = compile(f.read(), config.__file__, "exec")
+    namespace = PinnedNamespace({name: from_json(value) for name, value in overrides.items()})
+    exec(code, {}, namespace)
+    return {name: value for name, value in namespace.items() if name.isupper()}
+
+def load_manifest(path):
+    with open(path) as f:
+        manifest = json.load(f)
+    defaults = manifest.get("defaults", {})
+    variants = []
+    for entry in manifest["variants"]:
+        name = entry["name"]
+        if not VARIANT_NAME.match(name):
+            raise ValueError(f"Variant name '{name}' must be usable as a directory name (letters, digits, '.', '_', '-')")
+        if any(v.name == name for v in variants):
+            raise ValueError(f"Variant '{name}' appears more than once in {path}")
+        try:
+            values = variant_values({**defaults, **entry.get("config", {})})
+        except ValueError as e:
+            raise ValueError(f"Variant '{name}': {e}") from None
+        variants.append(Variant(name, entry.get("count", 1), values))
+    return variants
+
+@contextmanager
+def overlay_config(values):
+    # Temporarily patch the shared config module, which the generators read directly
+    saved = config_values(config)
+    for name, value in values.items():
+        setattr(config, name, value)
+    try:
+        yield config
+    finally:
+        for name in set(values) - set(saved):
+            delattr(config, name)
+        for name, value in saved.items():
+            setattr(config, name, value)
+
+@contextmanager
+def in_variant(variant_dir, values):
+    # Variant config, working directory and log for one task (worker processes run one task at a time)
+    cwd = os.getcwd()
+    with overlay_config(values), open(os.path.join(variant_dir, LOG_FILE), "a") as log, redirect_stdout(log):
+        os.chdir(variant_dir)
+        try:
+            yield
+        finally:
+            os.chdir(cwd)
+
+def fleet_stages(targets=None):
+    # build.py's stages, with the hand-written inputs made absolute so the
+    # artifact cache still hashes the generator sources from a variant directory
+    stages = [s for s in select_stages(define_stages(), targets) if s.name not in SKIPPED_STAGES]
+    produced = {output for stage in stages for output in stage.outputs}
+    root = os.path.dirname(os.path.abspath(config.__file__))
+    return [
+        stage._replace(inputs=[i if i in produced else os.path.join(root, i) for i in stage.inputs])
+        for stage in stages
+    ]
+
+# --- Tasks (module-level so they can be sent to worker processes) ---
+
+def run_variant_stage(variant_dir, values, stage, cache_dir):
+    # Returns (start, end, cache hit), as wall-clock times comparable across workers
+    start = time.time()
+    with in_variant(variant_dir, values):
+        print(f"--- {stage.name} ---")
+        if cache_dir:
+            import artifact_cache
+            hit = artifact_cache.run_cached(stage, artifact_cache.ArtifactCache(cache_dir))
+        else:
+            stage.func(*stage.args)
+            hit = False
+    return start, time.time(), hit
+
+def variant_estimates(variant_dir, values, count):
+    # BOM plus print and laser estimates for one unit, and the stock sheets for
+    # all `count` units nested together; also written to the variant's bom.json
+    import generate_bom_and_estimates
+    import print_slicer
+    from generate_lasercut_case import measure_lasercut_toolpaths
+    from generate_lasercut_sheets import plan_sheets
+    start = time.time()
+    with in_variant(variant_dir, values):
+        estimates = {
+            "bom": generate_bom_and_estimates.generate_bom(),
+            "print": print_slicer.sliced_print_estimates(),
+            "laser": generate_bom_and_estimates.calculate_laser_cut_estimates(
+                toolpath=measure_lasercut_toolpaths(config), nesting=plan_sheets(config)),
+            "sheets": plan_sheets(config, count),
+        }
+        with open("bom.json", "w") as f:
+            json.dump(estimates, f, indent=2)
+            f.write("\n")
+    return start, time.time(), estimates
+
+# --- Scheduling ---
+
+def run_fleet(variants, stages, output_dir, jobs=None, cache_dir=None):
+    # Returns ({variant name: {"elapsed", "stage_time", "run", "cached", "failed", "estimates", "count"}}, wall time)
+    deps = stage_dependencies(stages)
+    output_dir = os.path.abspath(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    cache_dir = os.path.abspath(cache_dir) if cache_dir else None
+    results = {}
+    pending = []
+    for variant in variants:
+        variant_dir = os.path.join(output_dir, variant.name)
+        os.makedirs(os.path.join(variant_dir, RENDERINGS_DIR), exist_ok=True)
+        if os.path.exists(os.path.join(variant_dir, LOG_FILE)):
+            os.remove(os.path.join(variant_dir, LOG_FILE))
+        results[variant.name] = {"start": None, "end": None, "stage_time": 0.0, "run": 0, "cached": 0,
+                                 "failed": {}, "estimates": None}
+        pending += [(variant, stage) for stage in stages]
+    by_name = {variant.name: variant for variant in variants}
+    # With a cache, the first variant to reach a stage runs it alone so the others can reuse it
+    leaders = {}
+    finished = set() # (variant name, stage name)
+
+    def ready(variant, stage):
+        if not all((variant.name, d) in finished for d in deps[stage.name]):
+            return False
+        if cache_dir is None or not stage.outputs:
+            return True
+        leader = leaders.setdefault(stage.name, variant.name)
+        return leader == variant.name or (leader, stage.name) in finished
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        running = {}
+        for variant in variants:
+            variant_dir = os.path.join(output_dir, variant.name)
+            running[pool.submit(variant_estimates, variant_dir, variant.values, variant.count)] = (variant.name, None)
+        while pending or running:
+            for variant, stage in list(pending):
+                failed_deps = [d for d in deps[stage.name] if d in results[variant.name]["failed"]]
+                if failed_deps:
+                    results[variant.name]["failed"][stage.name] = f"skipped, depends on failed stage {failed_deps[0]}"
+                    finished.add((variant.name, stage.name))
+                    pending.remove((variant, stage))
+                elif ready(variant, stage):
+                    variant_dir = os.path.join(output_dir, variant.name)
+                    future = pool.submit(run_variant_stage, variant_dir, variant.values, stage, cache_dir)
+                    running[future] = (variant.name, stage.name)
+                    pending.remove((variant, stage))
+
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, stage_name = running.pop(future)
+                result = results[name]
+                try:
+                    if stage_name is None:
+                        task_start, task_end, result["estimates"] = future.result()
+                    else:
+                        task_start, task_end, hit = future.result()
+                        result["cached" if hit else "run"] += 1
+                    result["start"] = min(result["start"] or task_start, task_start)
+                    result["end"] = max(result["end"] or task_end, task_end)
+                    result["stage_time"] += task_end - task_start
+                except Exception as e:
+                    result["failed"][stage_name or "estimates"] = f"{type(e).__name__}: {e}"
+                if stage_name is not None:
+                    finished.add((name, stage_name))
+    total_wall = time.perf_counter() - start
+
+    for name, result in results.items():
+        result["elapsed"] = (result.pop("end") or 0) - (result.pop("start") or 0)
+        result["count"] = by_name[name].count
+    return results, total_wall
+
+def aggregate_bom(results):
+    # Parts for every unit of every variant; free-text quantities ("~2 meters") are counted per text
+    totals = {}
+    for result in results.values():
+        if result["estimates"] is None:
+            continue
+        for item, details in result["estimates"]["bom"].items():
+            entry = totals.setdefault(item, {"quantity": 0, "per_unit": {}})
+            quantity = details["quantity"]
+            if isinstance(quantity, (int, float)):
+                entry["quantity"] += quantity * result["count"]
+            else:
+                entry["per_unit"][quantity] = entry["per_unit"].get(quantity, 0) + result["count"]
+    return totals
+
+def aggregate_estimates(results):
+    # Per-unit estimates times the unit count; acrylic comes from each variant's
+    # batch nesting instead, since a batch shares its sheets
+    keys = {
+        "print": ["total_weight_g", "total_cost_usd", "estimated_print_time_hours"],
+        "laser": ["total_area_mm2", "estimated_cut_time_minutes"],
+    }
+    totals = {process: dict.fromkeys(names, 0.0) for process, names in keys.items()}
+    totals["laser"].update(sheet_count=0, total_cost_usd=0.0, utilization=0.0)
+    part_area = sheet_area = 0.0
+    for result in results.values():
+        if result["estimates"] is None:
+            continue
+        for process, names in keys.items():
+            for key in names:
+                totals[process][key] += result["estimates"][process][key] * result["count"]
+        sheets = result["estimates"]["sheets"]
+        totals["laser"]["sheet_count"] += sheets["sheet_count"]
+        totals["laser"]["total_cost_usd"] += sheets["material_cost_usd"]
+        part_area += sheets["part_area_mm2"]
+        sheet_area += sheets["sheet_area_mm2"]
+    if sheet_area:
+        totals["laser"]["utilization"] = part_area / sheet_area
+    return totals
+
+def print_fleet_report(results, total_wall):
+    print("\n--- Fleet Report ---")
+    print(f"  {'variant':<20} {'units':>5} {'elapsed':>9} {'stage time':>11} {'run':>4} {'cached':>6} {'failed':>6}")
+    for name, result in results.items():
+        print(f"  {name:<20} {result['count']:>5} {result['elapsed']:8.2f}s {result['stage_time']:10.2f}s "
+              f"{result['run']:>4} {result['cached']:>6} {len(result['failed']):>6}")
+    for name, result in results.items():
+        for stage_name, reason in result["failed"].items():
+            print(f"  {name}/{stage_name}: FAILED ({reason})")
+    stage_time = sum(result["stage_time"] for result in results.values())
+    print(f"  {len(results)} variant(s) in {total_wall:.2f} s wall ({stage_time:.2f} s of stage time), "
+          f"{len(results) / total_wall * 60 if total_wall else 0:.1f} variants/min, "
+          f"{total_wall / max(len(results), 1):.2f} s per variant")
+
+    units = sum(result["count"] for result in results.values())
+    print(f"\n--- Fleet Bill of Materials ({units} unit(s)) ---")
+    for item, entry in aggregate_bom(results).items():
+        if entry["per_unit"]:
+            print(f"- {item}: {', '.join(f'{units} x {text}' for text, units in entry['per_unit'].items())}")
+        else:
+            print(f"- {item}: {entry['quantity']}")
+    totals = aggregate_estimates(results)
+    print(f"  3D printed: {totals['print']['total_weight_g']:.1f} g filament, "
+          f"${totals['print']['total_cost_usd']:.2f}, {totals['print']['estimated_print_time_hours']:.1f} h")
+    print(f"  Laser-cut: {totals['laser']['total_area_mm2'] / 1e6:.3f} m^2 acrylic on {totals['laser']['sheet_count']} sheet(s) "
+          f"({totals['laser']['utilization'] * 100:.1f}% utilized), "
+          f"${totals['laser']['total_cost_usd']:.2f}, {totals['laser']['estimated_cut_time_minutes']:.1f} min")
+
+def write_fleet_bom(results, output_dir):
+    with open(os.path.join(output_dir, "bom.json"), "w") as f:
+        json.dump({"bom": aggregate_bom(results), "estimates": aggregate_estimates(results)}, f, indent=2)
+        f.write("\n")
+
+def check_variants(variants):
+    # Design rule check per variant; returns the variants that pass, and
+    # stops the run when none do rather than reporting an empty fleet
+    import design_rules
+    clean = []
+    for variant in variants:
+        with overlay_config(variant.values) as cfg:
+            violations = design_rules.check_design(cfg)
+        if violations:
+            print(f"Skipping variant {variant.name}: {len(violations)} design rule violation(s)")
+            for v in violations:
+                print(f"  [{v.rule}] {v.surface}: {v.message}")
+        else:
+            clean.append(variant)
+    if variants and not clean:
+        raise SystemExit(f"All {len(variants)} variant(s) failed the design rule check; fix the manifest or pass --no-drc to build anyway.")
+    return clean
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build every variant listed in a manifest, each into its own output directory.")
+    parser.add_argument("manifest", help="JSON manifest of variants (see fleet_manifest.example.json)")
+    parser.add_argument("stages", nargs="*", help="Stages to build per variant (default: all). Dependencies are included.")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Number of worker processes (default: CPU count)")
+    parser.add_argument("-o", "--output-dir", default=DEFAULT_OUTPUT_DIR, help="Directory for the per-variant output directories")
+    parser.add_argument("--cache-dir", default=None, help="Artifact cache directory (default: $ESPHID_CACHE_DIR or .build_cache)")
+    parser.add_argument("--no-cache", action="store_true", help="Build every stage of every variant, sharing nothing")
+    parser.add_argument("--no-drc", action="store_true", help="Build variants even if they fail the design rule check")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    with profile_command(args, "fleet"):
+        variants = load_manifest(args.manifest)
+        if not args.no_drc:
+            variants = check_variants(variants)
+        cache_dir = None
+        if not args.no_cache:
+            import artifact_cache
+            cache_dir = args.cache_dir or artifact_cache.DEFAULT_CACHE_DIR
+        results, total_wall = run_fleet(variants, fleet_stages(args.stages), args.output_dir, args.jobs, cache_dir)
+        print_fleet_report(results, total_wall)
+        write_fleet_bom(results, args.output_dir)
+    if any(result["failed"] for result in results.values()):
+        raise SystemExit(1)
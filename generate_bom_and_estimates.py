@@ -1,12 +1,7 @@
-import os
-from solid import *
-from solid.utils import *
-from solid.solidpython import scad_render
-import ezdxf
-from ezdxf.addons.drawing import RenderContext, Frontend
-from ezdxf.addons.drawing.svg import SVGBackend
-from ezdxf.addons.drawing.layout import Page, Units
+import argparse
+import math
 import config
+from profiling import add_profile_arguments, profile_command, profiled
 
 # --- BOM Generation ---
 def generate_bom():
@@ -19,41 +14,62 @@ def generate_bom():
         "Acrylic Sheet (for laser cut case)": {"quantity": "See material usage", "notes": f"Thickness: {config.MATERIAL_THICKNESS}mm", "price_per_unit": "", "shop_link": ""},
         "PLA/PETG Filament (for 3D printed case)": {"quantity": "See material usage", "notes": "", "price_per_unit": "", "shop_link": ""},
     }
+    if config.BUTTON_WIRING == "matrix":
+        bom["1N4148W Diodes"] = {"quantity": config.NUM_BUTTONS, "notes": "One per switch in the key matrix (SOD-123)", "price_per_unit": "", "shop_link": ""}
     return bom
 
 # --- 3D Printing Estimates ---
 
-def calculate_3d_print_estimates():
-    # Calculate volume of base part
-    base_outer_volume = config.CASE_LENGTH * config.CASE_WIDTH * (config.CASE_HEIGHT / 2) # Outer dimensions of base part
-    base_inner_hollow_volume = (config.CASE_LENGTH - 2 * config.WALL_THICKNESS) * (config.CASE_WIDTH - 2 * config.WALL_THICKNESS) * (config.CASE_HEIGHT / 2 - config.WALL_THICKNESS)
-    usb_cutout_volume = config.USB_C_WIDTH * (config.WALL_THICKNESS + 0.1) * config.USB_C_HEIGHT # Approximate volume of USB cutout
-    
-    # Standoffs volume (approximate as solid cylinders)
-    standoff_volume = 4 * (3.14159 * (config.BOARD_STANDOFF_DIAMETER / 2)**2 * config.BOARD_STANDOFF_HEIGHT)
-    lid_screw_standoff_volume = 4 * (3.14159 * (config.SCREW_HEAD_DIAMETER / 2)**2 * config.LID_SCREW_STANDOFF_HEIGHT)
-
-    # Calculate volume of lid part
-    lid_outer_volume = config.CASE_LENGTH * config.CASE_WIDTH * (config.CASE_HEIGHT / 2) # Outer dimensions of lid part
-    lid_inner_hollow_volume = (config.CASE_LENGTH - 2 * config.WALL_THICKNESS) * (config.CASE_WIDTH - 2 * config.WALL_THICKNESS) * (config.CASE_HEIGHT / 2 - config.WALL_THICKNESS)
-    footswitch_hole_volume = config.NUM_BUTTONS * (3.14159 * (config.FOOTSWITCH_MOUNT_DIAMETER / 2)**2 * (config.WALL_THICKNESS + config.FOOTSWITCH_DEPTH))
-    led_hole_volume = 3.14159 * (config.LED_HOLE_DIAMETER / 2)**2 * (config.WALL_THICKNESS + 0.1)
-    lid_screw_through_hole_volume = 4 * (3.14159 * (config.SCREW_DIAMETER / 2)**2 * (config.WALL_THICKNESS + 0.1))
-
-    # Approximate material volume for base and lid
-    # This is a simplified approach assuming a certain infill for the main body and solid features
-
-    # Volume of the main hollowed out parts
-    base_hollow_volume = base_outer_volume - base_inner_hollow_volume - usb_cutout_volume
-    lid_hollow_volume = lid_outer_volume - lid_inner_hollow_volume - footswitch_hole_volume - led_hole_volume - lid_screw_through_hole_volume
-
-    # Total material volume
-    total_material_volume_mm3 = (base_hollow_volume + lid_hollow_volume) * config.INFILL_PERCENTAGE + standoff_volume + lid_screw_standoff_volume
-
-    # Rough estimates
-    total_weight_g = total_material_volume_mm3 * config.FILAMENT_DENSITY_G_MM3
-    total_cost_usd = (total_weight_g / 1000) * config.FILAMENT_COST_PER_KG
-    estimated_print_time_hours = (total_material_volume_mm3 / config.PRINTING_SPEED_MM3_S) / 3600
+# Closed-form version of print_slicer.py, kept for design_sweep.py and --quick.
+# The base and lid are costed as create_case_base() and create_case_lid() print
+# them: each part's core (PRINT_PERIMETERS lines in from every side and
+# PRINT_TOP_BOTTOM_LAYERS in from open air above and below) is sparse infill
+# at INFILL_PERCENTAGE, the rest is extruded solid.
+
+def positive_part(value):
+    # max(value, 0) for scalars and numpy arrays alike
+    return (value + abs(value)) / 2
+
+def calculate_3d_print_estimates(cfg=None):
+    # cfg may hold scalars or equally-shaped numpy arrays (see design_sweep.py)
+    if cfg is None:
+        cfg = config
+    length, width, height, wall = cfg.CASE_LENGTH, cfg.CASE_WIDTH, cfg.CASE_HEIGHT, cfg.WALL_THICKNESS
+    shell = cfg.PRINT_PERIMETERS * cfg.PRINT_LINE_WIDTH # Perimeter band inside every outline
+    skin = cfg.PRINT_TOP_BOTTOM_LAYERS * cfg.PRINT_LAYER_HEIGHT # Solid skin under/over open air
+    core_footprint = positive_part(length - 2 * shell) * positive_part(width - 2 * shell)
+    plate_core_height = positive_part(wall - 2 * skin)
+
+    # Lid: a plate with the footswitch and LED holes through it
+    footswitch_radius, led_radius = cfg.FOOTSWITCH_MOUNT_DIAMETER / 2, cfg.LED_HOLE_DIAMETER / 2
+    hole_area = cfg.NUM_BUTTONS * math.pi * footswitch_radius**2 + math.pi * led_radius**2
+    lid_volume = (length * width - hole_area) * wall
+    lid_core = positive_part(core_footprint - cfg.NUM_BUTTONS * math.pi * (footswitch_radius + shell)**2
+                             - math.pi * (led_radius + shell)**2) * plate_core_height
+
+    # Base: floor, walls up to CASE_HEIGHT with the USB cutout through the front
+    # one, and the board standoffs around their screw holes
+    wall_area = length * width - (length - 2 * wall) * (width - 2 * wall)
+    usb_area = cfg.USB_C_WIDTH * cfg.USB_C_HEIGHT
+    standoff_area = 4 * math.pi * ((cfg.BOARD_STANDOFF_DIAMETER / 2)**2 - (cfg.BOARD_STANDOFF_SCREW_DIAMETER / 2)**2)
+    base_volume = length * width * wall + wall_area * (height - wall) - usb_area * wall + standoff_area * cfg.BOARD_STANDOFF_HEIGHT
+    # Walls hold a core only where they are wider than both perimeter bands; the
+    # thin standoff rings are all perimeter
+    wall_core_width = positive_part(wall - 2 * shell)
+    wall_core = wall_core_width * (2 * (length + width - 2 * wall) * positive_part(height - wall - skin) - usb_area)
+    base_core = core_footprint * plate_core_height + wall_core
+
+    part_volume = base_volume + lid_volume
+    core_volume = base_core + lid_core
+    total_material_volume_mm3 = part_volume - core_volume * (1 - cfg.INFILL_PERCENTAGE)
+
+    # Print time like print_slicer.py: extrusion path length plus a layer change per layer of both parts
+    path_length = total_material_volume_mm3 / (cfg.PRINT_LAYER_HEIGHT * cfg.PRINT_LINE_WIDTH)
+    layer_count = (height + wall) / cfg.PRINT_LAYER_HEIGHT
+    estimated_print_time_hours = (path_length / cfg.PRINT_SPEED_MM_S + layer_count * cfg.PRINT_LAYER_CHANGE_S) / 3600
+
+    total_weight_g = total_material_volume_mm3 * cfg.FILAMENT_DENSITY_G_MM3
+    total_cost_usd = (total_weight_g / 1000) * cfg.FILAMENT_COST_PER_KG
 
     return {
         "total_volume_mm3": total_material_volume_mm3,
@@ -64,55 +80,120 @@ def calculate_3d_print_estimates():
 
 # --- Laser Cutting Estimates ---
 
-def calculate_laser_cut_estimates():
+def calculate_laser_cut_estimates(cfg=None, toolpath=None, nesting=None):
+    # cfg may hold scalars or equally-shaped numpy arrays (see design_sweep.py)
+    # toolpath: optional measured {"cut_length_mm", "travel_length_mm"} for one
+    # enclosure (see generate_lasercut_case.measure_lasercut_toolpaths)
+    # nesting: optional {"sheet_count", "utilization"} of one enclosure nested
+    # onto stock sheets (see generate_lasercut_sheets.plan_sheets)
+    if cfg is None:
+        cfg = config
     # For laser cutting, we're interested in the area of each panel
-    # and the total cut length (very rough estimate based on perimeter)
+    # and the total cut length (rough estimate based on perimeter unless measured)
 
+    # Front/back and left/right panels are each cut twice
     panels = {
-        "top": {"width": config.CASE_LENGTH, "height": config.CASE_WIDTH},
-        "bottom": {"width": config.CASE_LENGTH, "height": config.CASE_WIDTH},
-        "front_back": {"width": config.CASE_LENGTH, "height": config.CASE_HEIGHT},
-        "left_right": {"width": config.CASE_WIDTH, "height": config.CASE_HEIGHT},
+        "top": {"width": cfg.CASE_LENGTH, "height": cfg.CASE_WIDTH, "quantity": 1},
+        "bottom": {"width": cfg.CASE_LENGTH, "height": cfg.CASE_WIDTH, "quantity": 1},
+        "front_back": {"width": cfg.CASE_LENGTH, "height": cfg.CASE_HEIGHT, "quantity": 2},
+        "left_right": {"width": cfg.CASE_WIDTH, "height": cfg.CASE_HEIGHT, "quantity": 2},
     }
 
     total_area_mm2 = 0
     total_perimeter_mm = 0
 
     for name, dims in panels.items():
-        area = dims["width"] * dims["height"]
-        perimeter = 2 * (dims["width"] + dims["height"])
+        area = dims["quantity"] * dims["width"] * dims["height"]
+        perimeter = dims["quantity"] * 2 * (dims["width"] + dims["height"])
         total_area_mm2 += area
         total_perimeter_mm += perimeter
 
+    # Measured toolpaths include every hole and the head travel between contours
+    total_travel_mm = 0
+    if toolpath is not None:
+        total_perimeter_mm = toolpath["cut_length_mm"]
+        total_travel_mm = toolpath["travel_length_mm"]
+
+    # Acrylic is bought by the stock sheet, so whole sheets are priced. Without a
+    # nesting result the count is the area lower bound (no spacing, perfect packing).
+    sheet_area_mm2 = cfg.STOCK_SHEET_LENGTH * cfg.STOCK_SHEET_WIDTH
+    if nesting is not None:
+        sheet_count = nesting["sheet_count"]
+        utilization = nesting["utilization"]
+    else:
+        sheet_count = -(-total_area_mm2 // sheet_area_mm2)
+        utilization = total_area_mm2 / (sheet_count * sheet_area_mm2)
+
     # Rough estimates for laser cutting
-    total_cost_usd = total_area_mm2 * config.ACRYLIC_COST_PER_MM2
-    estimated_cut_time_minutes = (total_perimeter_mm / config.LASER_CUT_SPEED_MM_S) / 60
+    total_cost_usd = sheet_count * sheet_area_mm2 * cfg.ACRYLIC_COST_PER_MM2
+    estimated_cut_time_minutes = (total_perimeter_mm / cfg.LASER_CUT_SPEED_MM_S + total_travel_mm / cfg.LASER_TRAVEL_SPEED_MM_S) / 60
 
     return {
         "total_area_mm2": total_area_mm2,
         "total_perimeter_mm": total_perimeter_mm,
+        "total_travel_mm": total_travel_mm,
+        "sheet_count": sheet_count,
+        "utilization": utilization,
         "total_cost_usd": total_cost_usd,
         "estimated_cut_time_minutes": estimated_cut_time_minutes
     }
 
-if __name__ == "__main__":
+def print_bom_and_estimates(measure_toolpaths=True, slice_case=None):
+    # slice_case defaults to measure_toolpaths: --quick skips both slow measurements
+    if slice_case is None:
+        slice_case = measure_toolpaths
     print("\n--- Bill of Materials ---")
     bom = generate_bom()
     for item, details in bom.items():
         print(f"- {item}: {details['quantity']} ({details['notes']})")
 
-    print("\n--- 3D Printing Estimates (Rough) ---")
-    print_estimates = calculate_3d_print_estimates()
-    print(f"  Total Volume: {print_estimates['total_volume_mm3']:.2f} mm^3")
-    print(f"  Estimated Filament Weight: {print_estimates['total_weight_g']:.2f} g")
-    print(f"  Estimated Filament Cost: ${print_estimates['total_cost_usd']:.2f}")
-    print(f"  Estimated Print Time: {print_estimates['estimated_print_time_hours']:.2f} hours")
-    print("  (Note: These are very rough estimates. Use a slicer for accuracy.)")
+    if slice_case:
+        # Imported here: slicing builds the case with solid and rasterizes it with numpy
+        from print_slicer import print_sliced_estimates, sliced_print_estimates
+        print("\n--- 3D Printing Estimates (Sliced) ---")
+        with profiled("sliced_print_estimates"):
+            print_estimates = sliced_print_estimates()
+        print_sliced_estimates(print_estimates)
+    else:
+        print("\n--- 3D Printing Estimates (Rough) ---")
+        with profiled("calculate_3d_print_estimates"):
+            print_estimates = calculate_3d_print_estimates()
+        print(f"  Total Volume: {print_estimates['total_volume_mm3']:.2f} mm^3")
+        print(f"  Estimated Filament Weight: {print_estimates['total_weight_g']:.2f} g")
+        print(f"  Estimated Filament Cost: ${print_estimates['total_cost_usd']:.2f}")
+        print(f"  Estimated Print Time: {print_estimates['estimated_print_time_hours']:.2f} hours")
+        print("  (Note: These are very rough estimates. Run without --quick to slice the case.)")
 
     print("\n--- Laser Cutting Estimates (Rough) ---")
-    laser_estimates = calculate_laser_cut_estimates()
+    toolpath = None
+    nesting = None
+    if measure_toolpaths:
+        # Imported here: measuring draws every panel with ezdxf, which is slow to load
+        from generate_lasercut_case import measure_lasercut_toolpaths
+        from generate_lasercut_sheets import plan_sheets
+        with profiled("measure_lasercut_toolpaths"):
+            toolpath = measure_lasercut_toolpaths(config)
+        nesting = plan_sheets(config)
+    with profiled("calculate_laser_cut_estimates"):
+        laser_estimates = calculate_laser_cut_estimates(toolpath=toolpath, nesting=nesting)
     print(f"  Total Material Area: {laser_estimates['total_area_mm2']:.2f} mm^2")
-    print(f"  Total Cut Length (approx): {laser_estimates['total_perimeter_mm']:.2f} mm")
-    print(f"  Estimated Acrylic Cost: ${laser_estimates['total_cost_usd']:.2f}")
+    sheets = "nested" if nesting is not None else "area lower bound"
+    print(f"  Stock Sheets ({config.STOCK_SHEET_LENGTH}x{config.STOCK_SHEET_WIDTH}mm, {sheets}): "
+          f"{laser_estimates['sheet_count']:g}, {laser_estimates['utilization'] * 100:.1f}% utilized")
+    if measure_toolpaths:
+        print(f"  Total Cut Length (measured): {laser_estimates['total_perimeter_mm']:.2f} mm")
+        print(f"  Total Head Travel (optimized): {laser_estimates['total_travel_mm']:.2f} mm")
+    else:
+        print(f"  Total Cut Length (panel outlines only): {laser_estimates['total_perimeter_mm']:.2f} mm")
+    print(f"  Estimated Acrylic Cost (whole sheets): ${laser_estimates['total_cost_usd']:.2f}")
     print(f"  Estimated Cut Time: {laser_estimates['estimated_cut_time_minutes']:.2f} minutes")
     print("  (Note: These are very rough estimates. Use laser cutter software for accuracy.)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print the bill of materials and build estimates.")
+    parser.add_argument("--quick", action="store_true", help="Skip slicing the case and measuring the laser toolpaths (rough formula estimates)")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    with profile_command(args, "generate_bom_and_estimates"):
+        print_bom_and_estimates(measure_toolpaths=not args.quick)
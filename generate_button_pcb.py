@@ -1,6 +1,96 @@
+import argparse
 import os
-import graphviz
+from collections import namedtuple
 import config
+from layout import get_layout
+from profiling import add_profile_arguments, profile_command, profiled
+
+# --- Wiring ---
+def matrix_positions():
+    # (row, column) of each button in BUTTON_WIRING = "matrix"
+    return [key for key, _, _ in config.BUTTON_ACTIONS]
+
+def connector_pin_count():
+    # Direct: one pin per button plus GND. Matrix: one pin per row and column.
+    if config.BUTTON_WIRING == "matrix":
+        return len(config.MATRIX_ROW_PINS) + len(config.MATRIX_COL_PINS)
+    return config.NUM_BUTTONS + 1
+
+def connector_gpios():
+    # Connector pin number -> ESP32 GPIO it is wired to (the last direct-wiring pin is GND)
+    if config.BUTTON_WIRING == "matrix":
+        return dict(enumerate(list(config.MATRIX_ROW_PINS) + list(config.MATRIX_COL_PINS), start=1))
+    return dict(enumerate(config.BUTTON_GPIO_PINS[:config.NUM_BUTTONS], start=1))
+
+def netlist_component(ref, value, footprint, lib, part, description, tstamp):
+    return (f"    (comp (ref {ref})\n"
+            f"      (value {value})\n"
+            f"      (footprint {footprint})\n"
+            f"      (libsource (lib {lib}) (part {part}) (description \"{description}\"))\n"
+            f"      (sheetpath (names /) (tstamps /))\n"
+            f"      (tstamp {tstamp:08d})\n"
+            f"    )\n")
+
+def netlist_net(code, name, nodes):
+    content = f"    (net (code {code})\n"
+    content += f"      (name \"{name}\")\n"
+    for ref, pin in nodes:
+        content += f"      (node (ref {ref}) (pin {pin}))\n"
+    content += "    )\n"
+    return content
+
+# --- Netlist Model ---
+# Components and nets as plain data, shared by the netlist writer, the router
+# (pcb_router.py) and the circuit diagram
+Component = namedtuple("Component", ["ref", "value", "footprint", "lib", "part", "description"])
+Net = namedtuple("Net", ["code", "name", "nodes"])
+
+def netlist_components():
+    pin_count = connector_pin_count()
+
+    # ESP32 Connector (Generic single row pin header)
+    components = [Component(
+        "J1", f"Conn_01x{pin_count:02d}", f"Connector_PinHeader_2.54mm:PinHeader_1x{pin_count:02d}_P2.54mm",
+        "Connector_Generic", f"Conn_01x{pin_count:02d}",
+        f"Generic connector, single row, 01x{pin_count:02d}, script generated")]
+
+    # Buttons
+    for i in range(config.NUM_BUTTONS):
+        components.append(Component(
+            f"SW{i+1}", "SW_Push", "Button_SMD_6x6mm:SW_Push_6mm", "Button", "SW_Push",
+            "Push button switch, generic, script generated"))
+
+    # One diode per matrix switch to stop ghosting when several keys are held
+    if config.BUTTON_WIRING == "matrix":
+        for i in range(config.NUM_BUTTONS):
+            components.append(Component(
+                f"D{i+1}", "1N4148W", "Diode_SMD:D_SOD-123", "Device", "D",
+                "Diode, small signal, script generated"))
+    return components
+
+def netlist_nets():
+    nets = []
+    if config.BUTTON_WIRING == "matrix":
+        # Column (input, pulled up) -> switch -> diode anode, cathode -> row (driven LOW when selected)
+        rows, cols = len(config.MATRIX_ROW_PINS), len(config.MATRIX_COL_PINS)
+        positions = matrix_positions()
+        for r in range(rows):
+            nodes = [("J1", r + 1)] + [(f"D{i+1}", 1) for i, (row, _) in enumerate(positions) if row == r]
+            nets.append(Net(len(nets) + 1, f"ROW{r}", nodes))
+        for c in range(cols):
+            nodes = [("J1", rows + c + 1)] + [(f"SW{i+1}", 1) for i, (_, col) in enumerate(positions) if col == c]
+            nets.append(Net(len(nets) + 1, f"COL{c}", nodes))
+        for i in range(config.NUM_BUTTONS):
+            nets.append(Net(len(nets) + 1, f"Net-(D{i+1}-A)", [(f"SW{i+1}", 2), (f"D{i+1}", 2)]))
+    else:
+        for i in range(config.NUM_BUTTONS):
+            # Button to GPIO
+            nets.append(Net(i + 1, f"Net-(J1-Pad{i+1})", [("J1", i + 1), (f"SW{i+1}", 1)]))
+
+        # Button to GND on the last connector pin
+        nodes = [("J1", connector_pin_count())] + [(f"SW{i+1}", 2) for i in range(config.NUM_BUTTONS)]
+        nets.append(Net(config.NUM_BUTTONS + 1, "GND", nodes))
+    return nets
 
 # --- Netlist Generation ---
 def generate_button_pcb_netlist():
@@ -16,45 +106,15 @@ def generate_button_pcb_netlist():
   (components
 """
 
-    # ESP32 Connector (Generic 1x8 Pin Header)
-    netlist_content += """    (comp (ref J1)
-      (value Conn_01x08)
-      (footprint Connector_PinHeader_2.54mm:PinHeader_1x08_P2.54mm)
-      (libsource (lib Connector_Generic) (part Conn_01x08) (description "Generic connector, single row, 01x08, script generated"))
-      (sheetpath (names /) (tstamps /))
-      (tstamp 00000000)
-    )
-"""
-
-    # Buttons
-    for i in range(config.NUM_BUTTONS):
-        netlist_content += f"    (comp (ref SW{i+1})\n"
-        netlist_content += f"      (value SW_Push)\n"
-        netlist_content += f"      (footprint Button_SMD_6x6mm:SW_Push_6mm)\n"
-        netlist_content += f"      (libsource (lib Button) (part SW_Push) (description \"Push button switch, generic, script generated\"))\n"
-        netlist_content += f"      (sheetpath (names /) (tstamps /))\n"
-        netlist_content += f"      (tstamp 0000000{i+1})\n"
-        netlist_content += f"    )\n"
+    for tstamp, component in enumerate(netlist_components()):
+        netlist_content += netlist_component(*component, tstamp)
 
     netlist_content += "  )\n"
     netlist_content += "  (nets\n"
 
     # Connections
-    for i in range(config.NUM_BUTTONS):
-        # Button to GPIO
-        netlist_content += f"    (net (code {i+1})\n"
-        netlist_content += f"      (name \"Net-(J1-Pad{i+1})\")\n"
-        netlist_content += f"      (node (ref J1) (pin {i+1}))\n"
-        netlist_content += f"      (node (ref SW{i+1}) (pin 1))\n"
-        netlist_content += f"    )\n"
-
-    # Button to GND (assuming J1-Pin8 is GND)
-    netlist_content += f"    (net (code {config.NUM_BUTTONS+1})\n"
-    netlist_content += f"      (name \"GND\")\n"
-    netlist_content += f"      (node (ref J1) (pin 8))\n"
-    for i in range(config.NUM_BUTTONS):
-        netlist_content += f"      (node (ref SW{i+1}) (pin 2))\n"
-    netlist_content += "    )\n"
+    for net in netlist_nets():
+        netlist_content += netlist_net(*net)
 
     netlist_content += "  )\n"
     netlist_content += ")\n"
@@ -66,27 +126,76 @@ def generate_button_pcb_netlist():
 # --- Conceptual Layout Generation ---
 def generate_conceptual_layout():
     layout_fname = "button_pcb_layout.txt"
+    # Switch and diode positions come from the shared layout (layout.py)
+    layout = get_layout()
+    board_length, board_width = layout.pcb_size.tolist()
     with open(layout_fname, "w") as f:
         f.write("--- Conceptual Button PCB Layout ---\n\n")
-        f.write(f"Board Dimensions (approx): {config.NUM_BUTTONS * config.BUTTON_SPACING + config.BUTTON_SPACING}mm x {config.BUTTON_SPACING * 2}mm\n\n")
+        f.write(f"Board Dimensions (approx): {board_length:g}mm x {board_width:g}mm\n\n")
         f.write("Button Placement (X, Y coordinates from bottom-left corner):\n")
-        
-        # Simple linear arrangement
-        for i in range(config.NUM_BUTTONS):
-            x_pos = (i * config.BUTTON_SPACING) + (config.BUTTON_SPACING / 2)
-            y_pos = config.BUTTON_SPACING
-            f.write(f"  Button {i+1}: ({x_pos:.1f}mm, {y_pos:.1f}mm)\n")
-        
-        f.write("\nConnections:\n")
-        for i in range(config.NUM_BUTTONS):
-            f.write(f"  Button {i+1} -> ESP32 GPIO{config.BUTTON_GPIO_PINS[i]} (via connector pin {i+1})\n")
-        f.write(f"  All Buttons -> ESP32 GND (via connector pin 8)\n")
+        x_pos, y_pos = layout.connector[0].tolist()
+        f.write(f"  Connector J1: pin 1 at ({x_pos:.1f}mm, {y_pos:.1f}mm), pins {layout.connector[1, 0] - x_pos:.2f}mm apart along X\n")
+        if config.BUTTON_WIRING == "matrix":
+            rows = len(config.MATRIX_ROW_PINS)
+
+            # Grid arrangement, row 0 at the top, diode next to each switch
+            for i, ((x_pos, y_pos), (diode_x, diode_y)) in enumerate(zip(layout.switches.tolist(), layout.diodes.tolist())):
+                f.write(f"  Button {i+1}: ({x_pos:.1f}mm, {y_pos:.1f}mm), D{i+1} at ({diode_x:.1f}mm, {diode_y:.1f}mm)\n")
+
+            f.write("\nConnections:\n")
+            for r, pin in enumerate(config.MATRIX_ROW_PINS):
+                f.write(f"  Row {r} -> ESP32 GPIO{pin} (via connector pin {r+1})\n")
+            for c, pin in enumerate(config.MATRIX_COL_PINS):
+                f.write(f"  Column {c} -> ESP32 GPIO{pin} (via connector pin {rows + c + 1})\n")
+            for i, (row, col) in enumerate(matrix_positions()):
+                f.write(f"  Button {i+1}: Column {col} -> SW{i+1} -> D{i+1} -> Row {row}\n")
+        else:
+            # Simple linear arrangement at the footswitch pitch
+            for i, (x_pos, y_pos) in enumerate(layout.switches.tolist()):
+                f.write(f"  Button {i+1}: ({x_pos:.1f}mm, {y_pos:.1f}mm)\n")
+
+            f.write("\nConnections:\n")
+            for i in range(config.NUM_BUTTONS):
+                f.write(f"  Button {i+1} -> ESP32 GPIO{config.BUTTON_GPIO_PINS[i]} (via connector pin {i+1})\n")
+            f.write(f"  All Buttons -> ESP32 GND (via connector pin {connector_pin_count()})\n")
 
     print(f"Generated conceptual layout: {layout_fname}")
 
+# --- Routed Board ---
+def generate_kicad_pcb():
+    # Place and route the netlist model on the shared layout (pcb_router.py)
+    import pcb_router
+    board_fname = "button_pcb.kicad_pcb"
+    board = pcb_router.route_board(netlist_components(), netlist_nets())
+    pcb_router.write_kicad_pcb(board_fname, board)
+    pcb_router.print_route_report(board_fname, board)
+    return board
+
 # --- Circuit Diagram Rendering ---
-def render_circuit_diagram():
-    dot = graphviz.Digraph(comment='Button PCB Circuit', format='png')
+GRAPHVIZ_MAX_BUTTONS = 32 # Beyond this dot's layout gets slow and the edges unreadable
+
+def render_circuit_diagram(renderer=None):
+    # renderer defaults to config.CIRCUIT_DIAGRAM_RENDERER
+    renderer = config.CIRCUIT_DIAGRAM_RENDERER if renderer is None else renderer
+    if renderer not in ("grid", "graphviz"):
+        raise ValueError(f"Unknown circuit diagram renderer '{renderer}' (use 'grid' or 'graphviz')")
+    if renderer == "graphviz" and config.NUM_BUTTONS > GRAPHVIZ_MAX_BUTTONS:
+        print(f"Note: {config.NUM_BUTTONS} buttons is too many for graphviz, drawing the grid schematic instead")
+        renderer = "grid"
+    output_path = os.path.join("renderings", "button_circuit_diagram")
+    if renderer == "graphviz":
+        render_graphviz_diagram(output_path)
+        return
+
+    import circuit_schematic
+    with profiled("circuit_schematic"):
+        circuit_schematic.write_schematic(netlist_components(), netlist_nets(), connector_gpios(),
+                                          output_path + ".svg", output_path + ".png")
+    print(f"Generated circuit diagram: {output_path}.svg, {output_path}.png")
+
+def render_graphviz_diagram(output_path):
+    import graphviz
+    dot = graphviz.Digraph(comment='Button PCB Circuit')
     dot.attr(rankdir='LR') # Left to Right layout
 
     # Add ESP32 Connector
@@ -97,17 +206,42 @@ def render_circuit_diagram():
         dot.node(f'SW{i+1}', f'Button {i+1}\n(SW{i+1})', shape='box')
 
     # Add Connections
-    for i in range(config.NUM_BUTTONS):
-        # Button to GPIO
-        dot.edge(f'SW{i+1}', 'J1', label=f'GPIO{config.BUTTON_GPIO_PINS[i]}')
-        # Button to GND
-        dot.edge(f'SW{i+1}', 'J1', label='GND')
-
-    output_path = os.path.join("renderings", "button_circuit_diagram")
-    dot.render(output_path, view=False, cleanup=True)
-    print(f"Generated circuit diagram: {output_path}.png")
+    if config.BUTTON_WIRING == "matrix":
+        # Row and column lines as their own nodes, so the edge count grows with keys, not keys squared
+        for r, pin in enumerate(config.MATRIX_ROW_PINS):
+            dot.node(f'ROW{r}', f'Row {r}', shape='ellipse')
+            dot.edge(f'ROW{r}', 'J1', label=f'GPIO{pin}')
+        for c, pin in enumerate(config.MATRIX_COL_PINS):
+            dot.node(f'COL{c}', f'Column {c}', shape='ellipse')
+            dot.edge(f'COL{c}', 'J1', label=f'GPIO{pin}')
+        for i, (row, col) in enumerate(matrix_positions()):
+            dot.edge(f'COL{col}', f'SW{i+1}')
+            dot.edge(f'SW{i+1}', f'ROW{row}', label=f'D{i+1}')
+    else:
+        for i in range(config.NUM_BUTTONS):
+            # Button to GPIO
+            dot.edge(f'SW{i+1}', 'J1', label=f'GPIO{config.BUTTON_GPIO_PINS[i]}')
+            # Button to GND
+            dot.edge(f'SW{i+1}', 'J1', label='GND')
+
+    # Same outputs as the grid schematic, one dot run each
+    for fmt in ("svg", "png"):
+        with profiled("dot.render", "subprocess"):
+            dot.render(output_path, format=fmt, view=False, cleanup=True)
+    from canonical_output import strip_png_metadata
+    strip_png_metadata(output_path + ".png")
+    print(f"Generated circuit diagram: {output_path}.svg, {output_path}.png")
 
 if __name__ == "__main__":
-    generate_button_pcb_netlist()
-    generate_conceptual_layout()
-    render_circuit_diagram()
+    parser = argparse.ArgumentParser(description="Generate the button PCB netlist, layout notes, routed KiCad board and circuit diagram.")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    with profile_command(args, "generate_button_pcb"):
+        with profiled("generate_button_pcb_netlist"):
+            generate_button_pcb_netlist()
+        with profiled("generate_conceptual_layout"):
+            generate_conceptual_layout()
+        with profiled("generate_kicad_pcb"):
+            generate_kicad_pcb()
+        render_circuit_diagram()
@@ -1,120 +1,218 @@
 from solid import *
 from solid.utils import *
-from solid.solidpython import scad_render
+import argparse
 import config
+from layout import get_layout
+from profiling import add_profile_arguments, profile_command, profiled
 
 # Case parameters
-# All parameters are now imported from config.py
-
-def create_base():
-    # Base of the case
-    base = cube([config.CASE_LENGTH, config.CASE_WIDTH, config.WALL_THICKNESS])
-    return base
-
-def create_walls():
-    # Outer dimensions of the walls
-    outer_walls = cube([config.CASE_LENGTH, config.CASE_WIDTH, config.CASE_HEIGHT])
-    # Inner dimensions of the walls (creates the hollow space)
-    inner_walls = cube([config.CASE_LENGTH - 2 * config.WALL_THICKNESS, config.CASE_WIDTH - 2 * config.WALL_THICKNESS, config.CASE_HEIGHT - config.WALL_THICKNESS])
-    # Subtract inner from outer to get just the walls
-    walls = outer_walls - translate([config.WALL_THICKNESS, config.WALL_THICKNESS, config.WALL_THICKNESS])(inner_walls)
-    return walls
+# All parameters are now imported from config.py; feature positions come from layout.py
+
+# Cutters extend this far past every face they cut through, so no cut leaves a
+# coplanar face behind (those break CGAL and Manifold renders alike)
+CUT_CLEARANCE = 0.1
+
+# Slice pixel size (mm) used by --check to compare the .scad sources with the SolidPython parts
+SCAD_CHECK_RESOLUTION = 0.1
+
+def fn_segments(fn):
+    # Per-feature $fn from config; 0 keeps OpenSCAD's $fa/$fs default (no $fn emitted)
+    return fn or None
+
+def create_shell():
+    # Floor and walls: the outer box minus the open-topped cavity
+    outer = cube([config.CASE_LENGTH, config.CASE_WIDTH, config.CASE_HEIGHT])
+    cavity = cube([config.CASE_LENGTH - 2 * config.WALL_THICKNESS, config.CASE_WIDTH - 2 * config.WALL_THICKNESS,
+                   config.CASE_HEIGHT - config.WALL_THICKNESS + CUT_CLEARANCE])
+    return outer - translate([config.WALL_THICKNESS, config.WALL_THICKNESS, config.WALL_THICKNESS])(cavity)
 
 def create_top_lid():
     # Top lid is a thin plate
     lid = cube([config.CASE_LENGTH, config.CASE_WIDTH, config.WALL_THICKNESS])
     return lid
 
+def through_hole(diameter, depth, fn):
+    # Cylinder cutting all the way through a plate of the given depth
+    return translate([0, 0, -CUT_CLEARANCE])(cylinder(d=diameter, h=depth + 2 * CUT_CLEARANCE, segments=fn_segments(fn)))
+
 def create_footswitch_holes():
-    # Arrange 7 footswitches in a row on the top lid
-    # Calculate total width needed for footswitches
-    total_footswitch_width = config.NUM_BUTTONS * config.FOOTSWITCH_CAP_DIAMETER + (config.NUM_BUTTONS - 1) * config.BUTTON_SPACING
-    
-    # Start position for the first footswitch (centered)
-    start_x = (config.CASE_LENGTH - total_footswitch_width) / 2 + config.FOOTSWITCH_CAP_DIAMETER / 2
-    
     holes = []
-    for i in range(config.NUM_BUTTONS):
-        hole_pos_x = start_x + i * (config.FOOTSWITCH_CAP_DIAMETER + config.BUTTON_SPACING)
-        hole = translate([hole_pos_x, config.CASE_WIDTH / 2, 0])(cylinder(d=config.FOOTSWITCH_MOUNT_DIAMETER, h=config.WALL_THICKNESS + 0.1)) # +0.1 to ensure clean cut
+    for hole_pos_x, hole_pos_y in get_layout().footswitches.tolist():
+        hole = translate([hole_pos_x, hole_pos_y, 0])(through_hole(config.FOOTSWITCH_MOUNT_DIAMETER, config.WALL_THICKNESS, config.FN_FOOTSWITCH_HOLE))
         holes.append(hole)
     return union()(holes)
 
 def create_board_standoffs():
-    # Standoffs for the ESP32-S3 board
-    # Assuming mounting holes are near the corners of the board
-    # Adjust these positions based on actual board mounting holes if known
-    offset_from_edge = 5 # Distance from board edge to mounting hole center
-
-    standoff_positions = [
-        [ (config.CASE_LENGTH / 2) - (config.BOARD_LENGTH / 2) + offset_from_edge,
-          (config.CASE_WIDTH / 2) - (config.BOARD_WIDTH / 2) + offset_from_edge,
-          config.WALL_THICKNESS ],
-        [ (config.CASE_LENGTH / 2) + (config.BOARD_LENGTH / 2) - offset_from_edge,
-          (config.CASE_WIDTH / 2) - (config.BOARD_WIDTH / 2) + offset_from_edge,
-          config.WALL_THICKNESS ],
-        [ (config.CASE_LENGTH / 2) - (config.BOARD_LENGTH / 2) + offset_from_edge,
-          (config.CASE_WIDTH / 2) + (config.BOARD_WIDTH / 2) - offset_from_edge,
-          config.WALL_THICKNESS ],
-        [ (config.CASE_LENGTH / 2) + (config.BOARD_LENGTH / 2) - offset_from_edge,
-          (config.CASE_WIDTH / 2) + (config.BOARD_WIDTH / 2) - offset_from_edge,
-          config.WALL_THICKNESS ]
-    ]
-
+    # Standoffs for the ESP32-S3 board, under its mounting holes
     standoffs = []
-    screw_holes = []
-
-    for pos in standoff_positions:
-        x, y, z = pos[0], pos[1], pos[2]
-        standoffs.append(translate([x, y, z])(cylinder(d=config.BOARD_STANDOFF_DIAMETER, h=config.BOARD_STANDOFF_HEIGHT)))
-        screw_holes.append(translate([x, y, z])(cylinder(d=config.BOARD_STANDOFF_SCREW_DIAMETER, h=config.BOARD_STANDOFF_HEIGHT + 0.1)))
+    for x, y, z in get_layout().standoff_positions().tolist():
+        standoffs.append(translate([x, y, z])(cylinder(d=config.BOARD_STANDOFF_DIAMETER, h=config.BOARD_STANDOFF_HEIGHT,
+                                                       segments=fn_segments(config.FN_STANDOFF))))
+    return union()(standoffs)
 
-    return union()(standoffs) - union()(screw_holes)
+def create_standoff_screw_holes():
+    # Blind holes from the floor up, open above the standoffs
+    screw_holes = []
+    for x, y, z in get_layout().standoff_positions().tolist():
+        screw_holes.append(translate([x, y, z])(cylinder(d=config.BOARD_STANDOFF_SCREW_DIAMETER, h=config.BOARD_STANDOFF_HEIGHT + CUT_CLEARANCE,
+                                                         segments=fn_segments(config.FN_STANDOFF_SCREW_HOLE))))
+    return union()(screw_holes)
 
 def create_usb_cutout():
-    # USB-C port on the side of the case
-    # Assuming it's centered on one of the shorter sides
-    usb_cutout = translate([
-        config.CASE_LENGTH / 2,
-        0, # On the edge
-        config.WALL_THICKNESS + (config.CASE_HEIGHT - config.WALL_THICKNESS - config.USB_C_HEIGHT) / 2 # Centered vertically
-    ])(cube([config.USB_C_WIDTH, config.WALL_THICKNESS + 0.1, config.USB_C_HEIGHT], center=True))
+    usb_cutout = translate(get_layout().usb_cutout_center().tolist())(cube([config.USB_C_WIDTH, config.WALL_THICKNESS + 2 * CUT_CLEARANCE, config.USB_C_HEIGHT], center=True))
     return usb_cutout
 
 def create_led_hole():
-    # LED hole on the top surface, near the USB port
-    led_hole = translate([
-        config.CASE_LENGTH / 2 - config.USB_C_WIDTH / 2 - 5, # Offset from USB port
-        config.WALL_THICKNESS / 2, # On the edge
-        config.CASE_HEIGHT - config.WALL_THICKNESS / 2 # On the top surface
-    ])(cylinder(d=config.LED_HOLE_DIAMETER, h=config.WALL_THICKNESS + 0.1, center=True))
-    return led_hole
+    # In lid coordinates: the layout's led_hole_center() is where it ends up on the assembled case
+    x, y = get_layout().led.tolist()
+    return translate([x, y, 0])(through_hole(config.LED_HOLE_DIAMETER, config.WALL_THICKNESS, config.FN_LED_HOLE))
 
-def assemble_case():
-    base = create_base()
-    walls = create_walls()
-    top_lid = create_top_lid()
-    footswitch_holes = create_footswitch_holes()
-    board_standoffs = create_board_standoffs()
-    usb_cutout = create_usb_cutout()
-    led_hole = create_led_hole()
-
-    # Assemble the main body (base + walls - usb_cutout)
-    main_body = union()(base, walls) - usb_cutout
+# Each part is one difference: the solids are unioned first and every cut is
+# applied to them once, instead of nesting a difference per feature
 
-    # Add standoffs to the main body
-    main_body = main_body + board_standoffs
+def create_case_base():
+    return difference()(union()(create_shell(), create_board_standoffs()), create_standoff_screw_holes(), create_usb_cutout())
 
-    # Assemble the top lid with footswitch holes and LED hole
-    # The lid is placed on top of the walls, so its z-position is CASE_HEIGHT - WALL_THICKNESS
-    assembled_lid = translate([0, 0, config.CASE_HEIGHT - config.WALL_THICKNESS])(top_lid - footswitch_holes - led_hole)
+def create_case_lid():
+    # Modelled lying on the print bed; assemble_case() puts it on top of the walls
+    return difference()(create_top_lid(), create_footswitch_holes(), create_led_hole())
 
-    # Final assembly
-    final_case = union()(main_body, assembled_lid)
-    return final_case
+def assemble_case():
+    return union()(create_case_base(), translate([0, 0, config.CASE_HEIGHT - config.WALL_THICKNESS])(create_case_lid()))
+
+# --- OpenSCAD source ---
+# The .scad files are written by hand rather than through scad_render(): the
+# dimensions become named variables, each feature a module and each row of
+# holes or standoffs a for loop over its positions, so the source stays the
+# same size whatever NUM_BUTTONS is and can still be tweaked in OpenSCAD.
+
+def scad_value(value):
+    # OpenSCAD literal for a number or a (nested) list of numbers
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(scad_value(v) for v in value) + "]"
+    # + 0.0 folds -0.0 into 0, so mirrored offsets print the same on every run and platform
+    return format(round(value, 6) + 0.0, ".10g")
+
+def scad_variables(variables):
+    return "".join(f"{name} = {scad_value(value)};{f' // {comment}' if comment else ''}\n" for name, value, comment in variables)
+
+def scad_header(part):
+    return (f"// {config.PROJECT_NAME} - 3D printed case {part}\n"
+            "// Generated by generate_case.py from config.py; edits here are lost on regeneration.\n"
+            "// $fn values of 0 keep OpenSCAD's default $fa/$fs resolution.\n\n")
+
+def case_base_scad():
+    layout = get_layout()
+    return scad_header("base") + scad_variables([
+        ("case_size", [config.CASE_LENGTH, config.CASE_WIDTH, config.CASE_HEIGHT], None),
+        ("wall", config.WALL_THICKNESS, None),
+        ("clearance", CUT_CLEARANCE, "Cutters overshoot every face they cut through"),
+        ("standoff_d", config.BOARD_STANDOFF_DIAMETER, None),
+        ("standoff_h", config.BOARD_STANDOFF_HEIGHT, None),
+        ("standoff_fn", config.FN_STANDOFF, None),
+        ("screw_hole_d", config.BOARD_STANDOFF_SCREW_DIAMETER, None),
+        ("screw_hole_fn", config.FN_STANDOFF_SCREW_HOLE, None),
+        ("standoff_positions", layout.board_holes.tolist(), None),
+        ("usb_center", layout.usb_cutout_center().tolist(), None),
+        ("usb_size", [config.USB_C_WIDTH, config.USB_C_HEIGHT], "Width, height"),
+    ]) + """
+module shell() {
+    difference() {
+        cube(case_size);
+        translate([wall, wall, wall])
+            cube([case_size[0] - 2 * wall, case_size[1] - 2 * wall, case_size[2] - wall + clearance]);
+    }
+}
+
+module standoff(d = standoff_d, h = standoff_h, fn = standoff_fn) {
+    cylinder(d = d, h = h, $fn = fn);
+}
+
+module screw_hole(d = screw_hole_d, h = standoff_h, fn = screw_hole_fn) {
+    cylinder(d = d, h = h + clearance, $fn = fn);
+}
+
+module usb_cutout(center = usb_center, size = usb_size) {
+    translate(center) cube([size[0], wall + 2 * clearance, size[1]], center = true);
+}
+
+difference() {
+    union() {
+        shell();
+        for (p = standoff_positions) translate([p[0], p[1], wall]) standoff();
+    }
+    for (p = standoff_positions) translate([p[0], p[1], wall]) screw_hole();
+    usb_cutout();
+}
+"""
+
+def case_lid_scad():
+    layout = get_layout()
+    return scad_header("lid") + scad_variables([
+        ("lid_size", [config.CASE_LENGTH, config.CASE_WIDTH, config.WALL_THICKNESS], None),
+        ("clearance", CUT_CLEARANCE, "Cutters overshoot every face they cut through"),
+        ("footswitch_hole_d", config.FOOTSWITCH_MOUNT_DIAMETER, None),
+        ("footswitch_hole_fn", config.FN_FOOTSWITCH_HOLE, None),
+        ("footswitch_positions", layout.footswitches.tolist(), None),
+        ("led_hole_d", config.LED_HOLE_DIAMETER, None),
+        ("led_hole_fn", config.FN_LED_HOLE, None),
+        ("led_position", layout.led.tolist(), None),
+    ]) + """
+module through_hole(d, fn) {
+    translate([0, 0, -clearance]) cylinder(d = d, h = lid_size[2] + 2 * clearance, $fn = fn);
+}
+
+difference() {
+    cube(lid_size);
+    for (p = footswitch_positions) translate(p) through_hole(footswitch_hole_d, footswitch_hole_fn);
+    translate(led_position) through_hole(led_hole_d, led_hole_fn);
+}
+"""
+
+def check_case_scad(resolution=SCAD_CHECK_RESOLUTION):
+    # Evaluate the generated .scad sources and slice them against the SolidPython
+    # parts; returns (part, heights) for every part whose slices differ
+    import print_slicer
+    import scad_eval
+    mismatches = []
+    for part, source, solid_part in (("base", case_base_scad, create_case_base), ("lid", case_lid_scad, create_case_lid)):
+        heights = print_slicer.differing_slices(solid_part(), scad_eval.evaluate_scad(source()), resolution)
+        if heights:
+            mismatches.append((part, heights))
+    return mismatches
+
+def write_case_scad(base_path="esp32_footswitch_case_base.scad", lid_path="esp32_footswitch_case_lid.scad"):
+    # Writing is optional: renderers and case_mesh take the SolidPython tree directly
+    for path, source in ((base_path, case_base_scad), (lid_path, case_lid_scad)):
+        with profiled(f"write {path}"):
+            scad = source()
+            with open(path, "w") as file_out:
+                file_out.write(scad)
+        print(f"Generated {path}")
+    return base_path, lid_path
 
 if __name__ == '__main__':
-    file_out = open("esp32_footswitch_case.scad", "w")
-    file_out.write(scad_render(assemble_case()))
-    file_out.close()
-    print("Generated esp32_footswitch_case.scad")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate the 3D printable case base and lid as OpenSCAD source.")
+    parser.add_argument("--stl", action="store_true", help="Also export each part to STL with OpenSCAD")
+    parser.add_argument("--backend", default=None,
+                        help="OpenSCAD render backend for --stl, e.g. manifold (default: config.OPENSCAD_BACKEND)")
+    parser.add_argument("--check", action="store_true",
+                        help="Check that the .scad sources describe the same parts as the SolidPython tree, then exit")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    if args.check:
+        mismatches = check_case_scad()
+        for part, heights in mismatches:
+            print(f"  {part}: slices differ at z = {', '.join(f'{z:g}' for z in heights)}")
+        if mismatches:
+            raise SystemExit(f"SCAD check failed for {', '.join(part for part, _ in mismatches)}: the .scad source does not match the SolidPython part")
+        print("SCAD check passed: the base and lid sources match the SolidPython parts")
+        raise SystemExit(0)
+
+    with profile_command(args, "generate_case"):
+        paths = write_case_scad()
+        if args.stl:
+            import render_cases
+            for path in paths:
+                render_cases.export_openscad_stl(path, path[:-len(".scad")] + ".stl", args.backend)
@@ -1,7 +1,118 @@
+import argparse
 import os
-from config import *
+import config
+from profiling import add_profile_arguments, profile_command
+
+# ESP32-S3 GPIOs that can be used as button inputs
+VALID_GPIO_PINS = range(0, 49)
+
+TARGETS = {"auto": "TARGET_AUTO", "ble": "TARGET_BLE", "usb": "TARGET_USB"}
+MAX_MATRIX_BUTTONS = 255 # MATRIX_KEYMAP holds 1-based button indices as uint8_t, 0 marks an empty position
+
+def c_string(text):
+    # Quote a Python string as a C string literal
+    escaped = ""
+    for char in text:
+        if char in '"\\':
+            escaped += "\\" + char
+        elif 32 <= ord(char) < 127:
+            escaped += char
+        else:
+            escaped += "".join(f"\\x{b:02x}\"\"" for b in char.encode("utf-8"))
+    return f'"{escaped}"'
+
+def check_gpio_pins(pins, what):
+    duplicates = sorted({pin for pin in pins if pins.count(pin) > 1})
+    if duplicates:
+        raise ValueError(f"GPIO pin(s) {duplicates} are assigned to more than one {what}")
+    for pin in pins:
+        if pin not in VALID_GPIO_PINS:
+            raise ValueError(f"GPIO {pin} is not a valid ESP32-S3 GPIO")
+    if config.PIN_LED in pins:
+        raise ValueError(f"PIN_LED (GPIO {config.PIN_LED}) is also used as a {what} pin")
+
+def validate_button_actions():
+    # The action table, the wiring and NUM_BUTTONS must all describe the same buttons
+    keys = [key for key, _, _ in config.BUTTON_ACTIONS]
+    if config.NUM_BUTTONS != len(keys):
+        raise ValueError(f"NUM_BUTTONS is {config.NUM_BUTTONS} but BUTTON_ACTIONS has {len(keys)} entries")
+    if config.BUTTON_WIRING == "direct":
+        if list(config.BUTTON_GPIO_PINS) != keys:
+            raise ValueError(f"BUTTON_GPIO_PINS {list(config.BUTTON_GPIO_PINS)} does not match the pins in BUTTON_ACTIONS {keys}")
+        check_gpio_pins(keys, "button")
+    elif config.BUTTON_WIRING == "matrix":
+        rows, cols = len(config.MATRIX_ROW_PINS), len(config.MATRIX_COL_PINS)
+        if cols > 32:
+            raise ValueError(f"MATRIX_COL_PINS has {cols} pins, at most 32 columns are supported")
+        if rows * cols > 256:
+            raise ValueError(f"A {rows}x{cols} matrix has more than 256 positions")
+        if len(keys) > MAX_MATRIX_BUTTONS:
+            raise ValueError(f"BUTTON_ACTIONS has {len(keys)} matrix buttons, at most {MAX_MATRIX_BUTTONS} fit the uint8_t MATRIX_KEYMAP")
+        check_gpio_pins(list(config.MATRIX_ROW_PINS) + list(config.MATRIX_COL_PINS), "matrix row/column")
+        for key in keys:
+            if not (isinstance(key, tuple) and len(key) == 2 and 0 <= key[0] < rows and 0 <= key[1] < cols):
+                raise ValueError(f"Matrix position {key} is not a (row, column) inside the {rows}x{cols} matrix")
+        duplicates = sorted({key for key in keys if keys.count(key) > 1})
+        if duplicates:
+            raise ValueError(f"Matrix position(s) {duplicates} are assigned to more than one button")
+    else:
+        raise ValueError(f"Unknown BUTTON_WIRING '{config.BUTTON_WIRING}', expected 'direct' or 'matrix'")
+    for key, _, target in config.BUTTON_ACTIONS:
+        if target not in TARGETS:
+            raise ValueError(f"Unknown target '{target}' for button {key}, expected one of {', '.join(TARGETS)}")
+
+def button_scan_code(key):
+    # GPIO pin for direct wiring, row * MATRIX_COLS + column for the matrix
+    if config.BUTTON_WIRING == "matrix":
+        return key[0] * len(config.MATRIX_COL_PINS) + key[1]
+    return key
+
+def button_action_rows():
+    # One initializer per button: { pin, type, target, key, macro }
+    rows = []
+    for key, action, target in config.BUTTON_ACTIONS:
+        code = button_scan_code(key)
+        if isinstance(action, int) or action.startswith("KEY_"):
+            rows.append(f"{{{code}, ACTION_KEY, {TARGETS[target]}, {action}, \"\"}}")
+        else:
+            rows.append(f"{{{code}, ACTION_MACRO, {TARGETS[target]}, 0, {c_string(action)}}}")
+    return rows
+
+def matrix_defines():
+    # Scan table for BUTTON_WIRING = "matrix": pins plus a dense position -> button map
+    if config.BUTTON_WIRING != "matrix":
+        return "#define BUTTON_MATRIX 0\n"
+    rows, cols = len(config.MATRIX_ROW_PINS), len(config.MATRIX_COL_PINS)
+    keymap = [0] * (rows * cols)
+    for i, (key, _, _) in enumerate(config.BUTTON_ACTIONS):
+        keymap[button_scan_code(key)] = i + 1
+    keymap_rows = " \\\n    ".join(
+        ", ".join(str(index) for index in keymap[r * cols:(r + 1) * cols]) + "," for r in range(rows)
+    )
+    return f"""#define BUTTON_MATRIX 1
+#define MATRIX_ROWS {rows}
+#define MATRIX_COLS {cols}
+#define MATRIX_ROW_PINS {{ {", ".join(str(pin) for pin in config.MATRIX_ROW_PINS)} }}
+#define MATRIX_COL_PINS {{ {", ".join(str(pin) for pin in config.MATRIX_COL_PINS)} }}
+#define MATRIX_SETTLE_US {config.MATRIX_SETTLE_US}
+
+// 1-based button index for each row * MATRIX_COLS + column, 0 if unpopulated
+#define MATRIX_KEYMAP {{ \\
+    {keymap_rows} \\
+}}
+"""
 
 def generate_firmware_config_h():
+    validate_button_actions()
+
+    # Expanded in main.cpp after the HID headers, which define the KEY_* codes
+    action_table = " \\\n    ".join(row + "," for row in button_action_rows())
+    # Direct buttons idle HIGH (pull-up), matrix keys start from an all-released scan
+    idle = "false" if config.BUTTON_WIRING == "matrix" else "true"
+    state_table = ", ".join(
+        f"{{{button_scan_code(key)}, {i + 1}, {idle}, 0, false}}" for i, (key, _, _) in enumerate(config.BUTTON_ACTIONS)
+    )
+
     config_h_content = """
 #ifndef CONFIG_H
 #define CONFIG_H
@@ -9,40 +120,36 @@ def generate_firmware_config_h():
 // Auto-generated from config.py
 
 // Firmware Parameters
-#define PIN_ENTER {}
-#define PIN_ESC {}
-#define PIN_PAGE_UP {}
-#define PIN_PAGE_DOWN {}
-#define PIN_MACRO_1 {}
-#define PIN_MACRO_2 {}
-#define PIN_MACRO_3 {}
 #define PIN_LED {}
 
 #define DEBOUNCE_MS {}
+#define LOOP_DELAY_MS {}
+
+#define BLE_KEYBOARD_NAME {}
+#define BLE_MOUSE_NAME {}
 
-#define BLE_KEYBOARD_NAME "{}"
-#define BLE_MOUSE_NAME "{}"
+// Buttons, dispatched by table index (see BUTTON_ACTIONS in config.py)
+#define NUM_BUTTONS {}
+{}
+// {{ pin (matrix: row * MATRIX_COLS + column), type, target, key, macro }}
+#define BUTTON_ACTION_TABLE {{ \\
+    {} \\
+}}
 
-#define MACRO_1_OUTPUT "{}"
-#define MACRO_2_OUTPUT "{}"
-#define MACRO_3_OUTPUT "{}"
+// Initial debounce state for each button
+#define BUTTON_STATE_TABLE {{ {} }}
 
 #endif // CONFIG_H
 """.format(
-        PIN_ENTER,
-        PIN_ESC,
-        PIN_PAGE_UP,
-        PIN_PAGE_DOWN,
-        PIN_MACRO_1,
-        PIN_MACRO_2,
-        PIN_MACRO_3,
-        PIN_LED,
-        DEBOUNCE_MS,
-        BLE_KEYBOARD_NAME,
-        BLE_MOUSE_NAME,
-        MACRO_1_OUTPUT,
-        MACRO_2_OUTPUT,
-        MACRO_3_OUTPUT
+        config.PIN_LED,
+        config.DEBOUNCE_MS,
+        config.LOOP_DELAY_MS,
+        c_string(config.BLE_KEYBOARD_NAME),
+        c_string(config.BLE_MOUSE_NAME),
+        config.NUM_BUTTONS,
+        matrix_defines(),
+        action_table,
+        state_table
     )
 
     with open("config.h", "w") as f:
@@ -50,4 +157,9 @@ def generate_firmware_config_h():
     print("Generated config.h")
 
 if __name__ == "__main__":
-    generate_firmware_config_h()
+    parser = argparse.ArgumentParser(description="Generate config.h for the firmware from config.py.")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    with profile_command(args, "generate_firmware_config"):
+        generate_firmware_config_h()
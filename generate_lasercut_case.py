@@ -1,8 +1,14 @@
+import argparse
 import ezdxf
 import config
+from canonical_output import save_dxf
+from layout import get_layout
+from dxf_writer import ShapeRecorder, write_dxf
+from laser_toolpath import optimize_cut_order, order_shapes
+from profiling import add_profile_arguments, profile_command, profiled
 
 # Case parameters
-# All parameters are now imported from config.py
+# All parameters are now imported from config.py; feature positions come from layout.py
 
 def create_finger_joints(length, thickness, joint_size, is_male=True):
     joints = []
@@ -52,84 +58,148 @@ def create_panel(doc, name, width, height, top_joints=None, bottom_joints=None,
 
     return msp
 
-def generate_lasercut_case(cfg):
+def draw_top_plate(msp, cfg):
     # Top Plate
-    doc_top = ezdxf.new("R2010")
-    msp_top = doc_top.modelspace()
-    msp_top.add_lwpolyline([(0,0), (cfg.CASE_LENGTH,0), (cfg.CASE_LENGTH,cfg.CASE_WIDTH), (0,cfg.CASE_WIDTH), (0,0)], close=True)
+    msp.add_lwpolyline([(0,0), (cfg.CASE_LENGTH,0), (cfg.CASE_LENGTH,cfg.CASE_WIDTH), (0,cfg.CASE_WIDTH), (0,0)], close=True)
+
+    layout = get_layout(cfg)
 
     # Footswitch holes on top plate
-    total_footswitch_width = cfg.NUM_BUTTONS * cfg.FOOTSWITCH_CAP_DIAMETER + (cfg.NUM_BUTTONS - 1) * cfg.BUTTON_SPACING
-    start_x = (cfg.CASE_LENGTH - total_footswitch_width) / 2 + cfg.FOOTSWITCH_CAP_DIAMETER / 2
-    for i in range(cfg.NUM_BUTTONS):
-        hole_pos_x = start_x + i * (cfg.FOOTSWITCH_CAP_DIAMETER + cfg.BUTTON_SPACING)
-        msp_top.add_circle((hole_pos_x, cfg.CASE_WIDTH / 2), cfg.FOOTSWITCH_MOUNT_DIAMETER / 2)
+    for x, y in layout.footswitches.tolist():
+        msp.add_circle((x, y), cfg.FOOTSWITCH_MOUNT_DIAMETER / 2)
 
     # LED hole on top plate
-    msp_top.add_circle((cfg.CASE_LENGTH - cfg.LED_OFFSET_X, cfg.CASE_WIDTH - cfg.LED_OFFSET_Y), cfg.LED_HOLE_DIAMETER / 2)
+    msp.add_circle(tuple(layout.led.tolist()), cfg.LED_HOLE_DIAMETER / 2)
 
     # Screw holes for lid assembly
-    screw_positions = [
-        (cfg.SCREW_OFFSET, cfg.SCREW_OFFSET),
-        (cfg.CASE_LENGTH - cfg.SCREW_OFFSET, cfg.SCREW_OFFSET),
-        (cfg.SCREW_OFFSET, cfg.CASE_WIDTH - cfg.SCREW_OFFSET),
-        (cfg.CASE_LENGTH - cfg.SCREW_OFFSET, cfg.CASE_WIDTH - cfg.SCREW_OFFSET)
-    ]
-    for x, y in screw_positions:
-        msp_top.add_circle((x, y), cfg.SCREW_DIAMETER / 2)
-
-    doc_top.saveas("esp32_lasercut_case_top.dxf")
-    print("Generated esp32_lasercut_case_top.dxf")
+    for x, y in layout.lid_screws.tolist():
+        msp.add_circle((x, y), cfg.SCREW_DIAMETER / 2)
 
+def draw_bottom_plate(msp, cfg):
     # Bottom Plate
-    doc_bottom = ezdxf.new("R2010")
-    msp_bottom = doc_bottom.modelspace()
-    msp_bottom.add_lwpolyline([(0,0), (cfg.CASE_LENGTH,0), (cfg.CASE_LENGTH,cfg.CASE_WIDTH), (0,cfg.CASE_WIDTH), (0,0)], close=True)
+    msp.add_lwpolyline([(0,0), (cfg.CASE_LENGTH,0), (cfg.CASE_LENGTH,cfg.CASE_WIDTH), (0,cfg.CASE_WIDTH), (0,0)], close=True)
+
+    layout = get_layout(cfg)
 
     # Board mounting holes on bottom plate
-    board_offset_from_edge = 5
-    board_mounting_hole_positions = [
-        ( (cfg.CASE_LENGTH / 2) - (cfg.BOARD_LENGTH / 2) + board_offset_from_edge,
-          (cfg.CASE_WIDTH / 2) - (cfg.BOARD_WIDTH / 2) + board_offset_from_edge ),
-        ( (cfg.CASE_LENGTH / 2) + (cfg.BOARD_LENGTH / 2) - board_offset_from_edge,
-          (cfg.CASE_WIDTH / 2) - (cfg.BOARD_WIDTH / 2) + board_offset_from_edge ),
-        ( (cfg.CASE_LENGTH / 2) - (cfg.BOARD_LENGTH / 2) + board_offset_from_edge,
-          (cfg.CASE_WIDTH / 2) + (cfg.BOARD_WIDTH / 2) - board_offset_from_edge ),
-        ( (cfg.CASE_LENGTH / 2) + (cfg.BOARD_LENGTH / 2) - board_offset_from_edge,
-          (cfg.CASE_WIDTH / 2) + (cfg.BOARD_WIDTH / 2) - board_offset_from_edge )
-    ]
-    for x, y in board_mounting_hole_positions:
-        msp_bottom.add_circle((x, y), cfg.BOARD_STANDOFF_SCREW_DIAMETER / 2)
+    for x, y in layout.board_holes.tolist():
+        msp.add_circle((x, y), cfg.BOARD_STANDOFF_SCREW_DIAMETER / 2)
 
     # Screw holes for lid assembly (matching top plate)
-    for x, y in screw_positions:
-        msp_bottom.add_circle((x, y), cfg.SCREW_DIAMETER / 2)
-
-    doc_bottom.saveas("esp32_lasercut_case_bottom.dxf")
-    print("Generated esp32_lasercut_case_bottom.dxf")
+    for x, y in layout.lid_screws.tolist():
+        msp.add_circle((x, y), cfg.SCREW_DIAMETER / 2)
 
-    # Side Panels (Front/Back, Left/Right)
+def draw_front_back_panel(msp, cfg):
     # Front/Back panels
-    doc_front_back = ezdxf.new("R2010")
-    msp_front_back = doc_front_back.modelspace()
-    msp_front_back.add_lwpolyline([(0,0), (cfg.CASE_LENGTH,0), (cfg.CASE_LENGTH,cfg.CASE_HEIGHT), (0,cfg.CASE_HEIGHT), (0,0)], close=True)
+    msp.add_lwpolyline([(0,0), (cfg.CASE_LENGTH,0), (cfg.CASE_LENGTH,cfg.CASE_HEIGHT), (0,cfg.CASE_HEIGHT), (0,0)], close=True)
     # USB-C cutout on one of the front/back panels (e.g., front)
-    msp_front_back.add_lwpolyline([
-        (cfg.CASE_LENGTH / 2 - cfg.USB_C_WIDTH / 2, cfg.USB_C_OFFSET_FROM_BOTTOM),
-        (cfg.CASE_LENGTH / 2 + cfg.USB_C_WIDTH / 2, cfg.USB_C_OFFSET_FROM_BOTTOM),
-        (cfg.CASE_LENGTH / 2 + cfg.USB_C_WIDTH / 2, cfg.USB_C_OFFSET_FROM_BOTTOM + cfg.USB_C_HEIGHT),
-        (cfg.CASE_LENGTH / 2 - cfg.USB_C_WIDTH / 2, cfg.USB_C_OFFSET_FROM_BOTTOM + cfg.USB_C_HEIGHT),
-        (cfg.CASE_LENGTH / 2 - cfg.USB_C_WIDTH / 2, cfg.USB_C_OFFSET_FROM_BOTTOM)
-    ], close=True)
-    doc_front_back.saveas("esp32_lasercut_case_front_back.dxf")
-    print("Generated esp32_lasercut_case_front_back.dxf")
+    x0, y0, x1, y1 = get_layout(cfg).usb_cutout.tolist()
+    msp.add_lwpolyline([(x0, y0), (x1, y0), (x1, y1), (x0, y1), (x0, y0)], close=True)
 
+def draw_left_right_panel(msp, cfg):
     # Left/Right panels
-    doc_left_right = ezdxf.new("R2010")
-    msp_left_right = doc_left_right.modelspace()
-    msp_left_right.add_lwpolyline([(0,0), (cfg.CASE_WIDTH,0), (cfg.CASE_WIDTH,cfg.CASE_HEIGHT), (0,cfg.CASE_HEIGHT), (0,0)], close=True)
-    doc_left_right.saveas("esp32_lasercut_case_left_right.dxf")
-    print("Generated esp32_lasercut_case_left_right.dxf")
+    msp.add_lwpolyline([(0,0), (cfg.CASE_WIDTH,0), (cfg.CASE_WIDTH,cfg.CASE_HEIGHT), (0,cfg.CASE_HEIGHT), (0,0)], close=True)
+
+# Panel name -> drawing function, so each DXF can be produced (and rendered) on
+# its own and the same geometry can be placed on nested stock sheets
+PANEL_DRAWERS = {
+    "top": draw_top_plate,
+    "bottom": draw_bottom_plate,
+    "front_back": draw_front_back_panel,
+    "left_right": draw_left_right_panel,
+}
+
+# How many copies of each panel one enclosure needs
+PANEL_QUANTITIES = {
+    "top": 1,
+    "bottom": 1,
+    "front_back": 2,
+    "left_right": 2,
+}
+
+def panel_size(name, cfg):
+    # (width, height) of a panel's outline
+    if name in ("top", "bottom"):
+        return cfg.CASE_LENGTH, cfg.CASE_WIDTH
+    if name == "front_back":
+        return cfg.CASE_LENGTH, cfg.CASE_HEIGHT
+    return cfg.CASE_WIDTH, cfg.CASE_HEIGHT
+
+def panel_filename(name):
+    return f"esp32_lasercut_case_{name}.dxf"
+
+# DXF back ends selectable with config.DXF_WRITER or writer=: "ezdxf" builds a
+# full document, "stream" writes the same entities with dxf_writer.py
+DXF_WRITERS = ("ezdxf", "stream")
+
+def resolve_writer(writer, cfg):
+    writer = writer or cfg.DXF_WRITER
+    if writer not in DXF_WRITERS:
+        raise ValueError(f"Unknown DXF writer '{writer}', expected one of {', '.join(DXF_WRITERS)}")
+    return writer
+
+def panel_shapes(name, cfg):
+    # The panel as plain dxf_writer shapes, in drawing order
+    recorder = ShapeRecorder()
+    PANEL_DRAWERS[name](recorder, cfg)
+    return recorder.shapes
+
+def build_panel(name, cfg):
+    # The panel as an in-memory ezdxf Drawing; renderers accept it directly
+    doc = ezdxf.new("R2010")
+    with profiled(f"draw {name}"):
+        PANEL_DRAWERS[name](doc.modelspace(), cfg)
+    with profiled(f"optimize_cut_order {name}"):
+        optimize_cut_order(doc.modelspace(), cfg=cfg) # Holes before outlines, short head travel
+    return doc
+
+def save_panel(doc, name, cfg=None):
+    filename = panel_filename(name)
+    with profiled(f"saveas {filename}"):
+        save_dxf(doc, filename, cfg)
+    print(f"Generated {filename}")
+
+def stream_panel(name, cfg):
+    filename = panel_filename(name)
+    with profiled(f"draw {name}"):
+        shapes = panel_shapes(name, cfg)
+    with profiled(f"optimize_cut_order {name}"):
+        shapes, _ = order_shapes(shapes, cfg=cfg)
+    with profiled(f"write_dxf {filename}"):
+        write_dxf(filename, shapes)
+    print(f"Generated {filename}")
+    return filename
+
+def generate_panel(name, cfg, writer=None):
+    # Returns something the renderers accept: the ezdxf Drawing, or the
+    # written file name for the streaming writer
+    if resolve_writer(writer, cfg) == "stream":
+        return stream_panel(name, cfg)
+    doc = build_panel(name, cfg)
+    save_panel(doc, name, cfg)
+    return doc
+
+def measure_lasercut_toolpaths(cfg):
+    # Cut and travel length for one enclosure, from the optimized panel toolpaths
+    totals = {"cut_length_mm": 0.0, "travel_length_mm": 0.0}
+    for name in PANEL_DRAWERS:
+        _, report = order_shapes(panel_shapes(name, cfg), cfg=cfg)
+        for key in totals:
+            totals[key] += PANEL_QUANTITIES[name] * report[key]
+    return totals
+
+def build_lasercut_case(cfg):
+    # Panel name -> Drawing, without writing anything
+    return {name: build_panel(name, cfg) for name in PANEL_DRAWERS}
+
+def generate_lasercut_case(cfg, writer=None):
+    return {name: generate_panel(name, cfg, writer) for name in PANEL_DRAWERS}
 
 if __name__ == '__main__':
-    generate_lasercut_case(config)
+    parser = argparse.ArgumentParser(description="Generate the laser-cut case panels as DXF files.")
+    parser.add_argument("--writer", choices=DXF_WRITERS, default=None, help="DXF back end (default: config.DXF_WRITER)")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    with profile_command(args, "generate_lasercut_case"):
+        generate_lasercut_case(config, args.writer)
@@ -0,0 +1,204 @@
+import argparse
+import ezdxf
+import config
+from canonical_output import save_dxf
+from dxf_writer import Circle, Polyline, write_dxf
+from generate_lasercut_case import DXF_WRITERS, PANEL_DRAWERS, PANEL_QUANTITIES, panel_shapes, panel_size, resolve_writer
+from laser_toolpath import optimize_cut_order, order_shapes
+from profiling import add_profile_arguments, profile_command, profiled
+
+# Sheet nesting for the laser-cut case.
+# Every panel instance needed for a batch of enclosures is packed onto stock
+# sheets with a MaxRects (best short side fit) packer, parts may be rotated by
+# 90 degrees, and each sheet is written to its own DXF.
+
+def required_panels(cfg, batch=1):
+    # (panel name, width, height) for every panel instance in the batch
+    parts = []
+    for name, quantity in PANEL_QUANTITIES.items():
+        width, height = panel_size(name, cfg)
+        parts += [(name, width, height)] * (quantity * batch)
+    return parts
+
+class MaxRectsSheet:
+    # Free space of one stock sheet, tracked as a list of maximal free rectangles
+    def __init__(self, width, height):
+        self.free = [(0.0, 0.0, width, height)]
+        self.placements = []
+
+    def find_position(self, width, height):
+        # Best (short side leftover, long side leftover, x, y, rotated), or None
+        best = None
+        for fx, fy, fw, fh in self.free:
+            for w, h, rotated in ((width, height, False), (height, width, True)):
+                if w <= fw and h <= fh:
+                    leftover_x, leftover_y = fw - w, fh - h
+                    score = (min(leftover_x, leftover_y), max(leftover_x, leftover_y), fx, fy, rotated)
+                    if best is None or score < best:
+                        best = score
+        return best
+
+    def place(self, x, y, width, height):
+        new_free = []
+        for fx, fy, fw, fh in self.free:
+            if x >= fx + fw or x + width <= fx or y >= fy + fh or y + height <= fy:
+                new_free.append((fx, fy, fw, fh))
+                continue
+            # Split the intersected free rectangle into up to four maximal pieces
+            if x > fx:
+                new_free.append((fx, fy, x - fx, fh))
+            if x + width < fx + fw:
+                new_free.append((x + width, fy, fx + fw - x - width, fh))
+            if y > fy:
+                new_free.append((fx, fy, fw, y - fy))
+            if y + height < fy + fh:
+                new_free.append((fx, y + height, fw, fy + fh - y - height))
+        # Drop free rectangles contained in another one
+        self.free = [
+            r for i, r in enumerate(new_free)
+            if not any(
+                j != i and o[0] <= r[0] and o[1] <= r[1] and o[0] + o[2] >= r[0] + r[2] and o[1] + o[3] >= r[1] + r[3]
+                and (o != r or j < i)
+                for j, o in enumerate(new_free)
+            )
+        ]
+
+def nest_panels(parts, sheet_length, sheet_width, spacing):
+    # Pack parts onto as few sheets as possible. Returns one list per sheet of
+    # (panel name, x, y, width, height, rotated) with x/y of the lower-left corner.
+    # Each part is inflated by `spacing` and the usable sheet shrunk by the same
+    # amount, which leaves `spacing` between parts and along the sheet edges.
+    sheets = []
+    order = sorted(parts, key=lambda p: (p[1] * p[2], max(p[1], p[2])), reverse=True)
+    for name, width, height in order:
+        if min(width, height) + 2 * spacing > min(sheet_length, sheet_width) or \
+                max(width, height) + 2 * spacing > max(sheet_length, sheet_width):
+            raise ValueError(f"Panel {name} ({width}x{height}mm) does not fit on a {sheet_length}x{sheet_width}mm sheet")
+        best = None
+        for sheet in sheets:
+            position = sheet.find_position(width + spacing, height + spacing)
+            if position is not None and (best is None or position < best[0]):
+                best = (position, sheet)
+        if best is None:
+            sheet = MaxRectsSheet(sheet_length - spacing, sheet_width - spacing)
+            sheets.append(sheet)
+            best = (sheet.find_position(width + spacing, height + spacing), sheet)
+        (_, _, x, y, rotated), sheet = best
+        placed_w, placed_h = (height, width) if rotated else (width, height)
+        sheet.place(x, y, placed_w + spacing, placed_h + spacing)
+        sheet.placements.append((name, x + spacing, y + spacing, placed_w, placed_h, rotated))
+    return [sheet.placements for sheet in sheets]
+
+def write_sheet_dxf(placements, cfg, filename, sheet_length, sheet_width):
+    doc = ezdxf.new("R2010")
+    msp = doc.modelspace()
+
+    # Sheet outline for reference only, on a non-plotting layer
+    stock_layer = doc.layers.add("STOCK", color=8)
+    stock_layer.dxf.plot = 0
+    msp.add_lwpolyline([(0, 0), (sheet_length, 0), (sheet_length, sheet_width), (0, sheet_width)],
+                       close=True, dxfattribs={"layer": "STOCK"})
+
+    with profiled(f"draw {filename}"):
+        # Block definitions in first-placement order; a set would follow the per-process string hash
+        for name in dict.fromkeys(p[0] for p in placements):
+            PANEL_DRAWERS[name](doc.blocks.new(name=f"PANEL_{name.upper()}"), cfg)
+        for name, x, y, width, height, rotated in placements:
+            if rotated:
+                # Rotating by 90 degrees about the insert point puts the panel left of it
+                ref = msp.add_blockref(f"PANEL_{name.upper()}", (x + width, y), dxfattribs={"rotation": 90})
+            else:
+                ref = msp.add_blockref(f"PANEL_{name.upper()}", (x, y))
+            ref.explode()
+
+    with profiled(f"optimize_cut_order {filename}"):
+        report = optimize_cut_order(msp, cfg=cfg)
+    with profiled(f"saveas {filename}"):
+        save_dxf(doc, filename, cfg)
+    print(f"Generated {filename}")
+    return report
+
+def place_shape(shape, x, y, width, rotated):
+    # Move a panel shape to its sheet position; rotated panels turn 90 degrees about (x + width, y)
+    if rotated:
+        move = lambda px, py: (x + width - py, y + px)
+    else:
+        move = lambda px, py: (x + px, y + py)
+    if isinstance(shape, Circle):
+        return shape._replace(center=move(*shape.center))
+    return shape._replace(points=[move(px, py) for px, py in shape.points])
+
+def stream_sheet_dxf(placements, cfg, filename, sheet_length, sheet_width):
+    # Same entities as write_sheet_dxf, streamed with dxf_writer instead of an ezdxf document
+    shapes = [Polyline([(0, 0), (sheet_length, 0), (sheet_length, sheet_width), (0, sheet_width)], True, "STOCK")]
+    with profiled(f"draw {filename}"):
+        drawn = {name: panel_shapes(name, cfg) for name in {p[0] for p in placements}}
+        for name, x, y, width, height, rotated in placements:
+            shapes += [place_shape(shape, x, y, width, rotated) for shape in drawn[name]]
+    with profiled(f"optimize_cut_order {filename}"):
+        shapes, report = order_shapes(shapes, skip_layers={"STOCK"}, cfg=cfg)
+    with profiled(f"write_dxf {filename}"):
+        write_dxf(filename, shapes, layers=[("STOCK", 8, False)])
+    print(f"Generated {filename}")
+    return report
+
+def sheet_usage(parts, sheets, cfg):
+    # Sheet count, utilization and whole-sheet acrylic cost of a nesting result
+    sheet_area = cfg.STOCK_SHEET_LENGTH * cfg.STOCK_SHEET_WIDTH
+    part_area = sum(width * height for _, width, height in parts)
+    return {
+        "sheet_count": len(sheets),
+        "part_count": len(parts),
+        "part_area_mm2": part_area,
+        "sheet_area_mm2": sheet_area * len(sheets),
+        "utilization": part_area / (sheet_area * len(sheets)) if sheets else 0.0,
+        "sheet_utilization": [sum(p[3] * p[4] for p in placements) / sheet_area for placements in sheets],
+        "material_cost_usd": sheet_area * len(sheets) * cfg.ACRYLIC_COST_PER_MM2,
+    }
+
+def plan_sheets(cfg, batch=1):
+    # Nest a batch without drawing or writing anything, for the BOM and fleet estimates
+    parts = required_panels(cfg, batch)
+    with profiled("nest_panels"):
+        sheets = nest_panels(parts, cfg.STOCK_SHEET_LENGTH, cfg.STOCK_SHEET_WIDTH, cfg.NESTING_SPACING)
+    return sheet_usage(parts, sheets, cfg)
+
+def sheet_filenames(count):
+    return [f"esp32_lasercut_sheet_{i + 1}.dxf" for i in range(count)]
+
+def generate_lasercut_sheets(cfg, batch=1, writer=None):
+    write_sheet = stream_sheet_dxf if resolve_writer(writer, cfg) == "stream" else write_sheet_dxf
+    sheet_length, sheet_width = cfg.STOCK_SHEET_LENGTH, cfg.STOCK_SHEET_WIDTH
+    parts = required_panels(cfg, batch)
+    with profiled("nest_panels"):
+        sheets = nest_panels(parts, sheet_length, sheet_width, cfg.NESTING_SPACING)
+    toolpaths = [
+        write_sheet(placements, cfg, filename, sheet_length, sheet_width)
+        for placements, filename in zip(sheets, sheet_filenames(len(sheets)))
+    ]
+
+    return {
+        **sheet_usage(parts, sheets, cfg),
+        "cut_length_mm": sum(t["cut_length_mm"] for t in toolpaths),
+        "travel_length_mm": sum(t["travel_length_mm"] for t in toolpaths),
+        "machine_time_minutes": sum(t["cut_time_minutes"] + t["travel_time_minutes"] for t in toolpaths),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Nest laser-cut panels onto stock sheets.")
+    parser.add_argument("--batch", type=int, default=1, help="Number of enclosures to nest together")
+    parser.add_argument("--writer", choices=DXF_WRITERS, default=None, help="DXF back end (default: config.DXF_WRITER)")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    with profile_command(args, "generate_lasercut_sheets"):
+        report = generate_lasercut_sheets(config, args.batch, args.writer)
+    print(f"\n--- Sheet Nesting ({args.batch} enclosure(s), {config.STOCK_SHEET_LENGTH}x{config.STOCK_SHEET_WIDTH}mm stock) ---")
+    print(f"  Panels: {report['part_count']}")
+    print(f"  Sheets Used: {report['sheet_count']}")
+    for i, utilization in enumerate(report["sheet_utilization"], 1):
+        print(f"    Sheet {i}: {utilization * 100:.1f}% utilized")
+    print(f"  Overall Utilization: {report['utilization'] * 100:.1f}%")
+    print(f"  Acrylic Cost (whole sheets): ${report['material_cost_usd']:.2f}")
+    print(f"  Cut Length: {report['cut_length_mm']:.1f} mm, Head Travel: {report['travel_length_mm']:.1f} mm")
+    print(f"  Estimated Machine Time: {report['machine_time_minutes']:.2f} minutes")
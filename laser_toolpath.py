@@ -0,0 +1,181 @@
+import argparse
+import math
+import numpy as np
+import ezdxf
+from ezdxf import path as ezpath
+import config
+from canonical_output import save_dxf
+from dxf_writer import Circle, Polyline
+from profiling import add_profile_arguments, profile_command, profiled
+
+# Cut-order and travel-path optimization for laser-cut DXFs.
+# Contours are arranged in a containment tree so every hole is cut before the
+# outline around it (otherwise the part can drop out of the sheet first), and
+# each group of sibling contours is visited with a nearest-neighbour tour
+# improved by 2-opt to keep rapid head travel short. Modelspace entities are
+# reordered in place, so handles and layers are preserved. Plain dxf_writer
+# shapes are ordered the same way before they are streamed to a file.
+
+CUT_ENTITY_TYPES = ("LWPOLYLINE", "CIRCLE")
+
+class Contour:
+    # entity is an ezdxf LWPOLYLINE/CIRCLE or a dxf_writer Polyline/Circle
+    def __init__(self, entity, flattening_distance=0.05):
+        self.entity = entity
+        if entity.dxftype() == "CIRCLE":
+            if isinstance(entity, Circle):
+                (cx, cy), radius = entity.center, entity.radius
+            else:
+                cx, cy, radius = entity.dxf.center.x, entity.dxf.center.y, entity.dxf.radius
+            angles = np.linspace(0, 2 * math.pi, 73)
+            self.points = np.column_stack([cx + radius * np.cos(angles), cy + radius * np.sin(angles)])
+            self.length = 2 * math.pi * radius
+        else:
+            if isinstance(entity, Polyline):
+                # Straight segments only, so no flattening needed
+                self.points, closed = np.array(entity.points, dtype=float), entity.closed
+            else:
+                vertices = list(ezpath.make_path(entity).flattening(flattening_distance))
+                self.points, closed = np.array([(v.x, v.y) for v in vertices], dtype=float), entity.closed
+            self.length = float(np.hypot(*np.diff(self.points, axis=0).T).sum())
+            if closed and len(self.points) > 1:
+                self.length += float(np.hypot(*(self.points[0] - self.points[-1])))
+        # The head enters and (for closed contours) leaves at the first point
+        self.start = self.points[0]
+        self.bbox_min = self.points.min(axis=0)
+        self.bbox_max = self.points.max(axis=0)
+        x, y = self.points[:, 0], self.points[:, 1]
+        self.area = abs(float(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))) / 2
+        self.children = []
+
+    def contains(self, other):
+        # Bounding-box prefilter, then even-odd ray casting for other's start point
+        if np.any(other.bbox_min < self.bbox_min) or np.any(other.bbox_max > self.bbox_max) or other.area >= self.area:
+            return False
+        px, py = other.start
+        x1, y1 = self.points[:, 0], self.points[:, 1]
+        x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+        crosses = (y1 > py) != (y2 > py)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_at_py = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+        return bool(np.count_nonzero(crosses & (px < x_at_py)) % 2)
+
+def is_cut_entity(entity, doc):
+    if entity.dxftype() not in CUT_ENTITY_TYPES:
+        return False
+    layer_name = entity.dxf.layer
+    if doc is not None and doc.layers.has_entry(layer_name):
+        return bool(doc.layers.get(layer_name).dxf.plot)
+    return True
+
+def build_contour_tree(contours):
+    # Attach each contour to the smallest contour that contains it; returns the roots
+    roots = []
+    by_area = sorted(contours, key=lambda c: c.area)
+    for i, contour in enumerate(by_area):
+        parent = next((outer for outer in by_area[i + 1:] if outer.contains(contour)), None)
+        (parent.children if parent else roots).append(contour)
+    return roots
+
+def tour_length(points, order, origin):
+    route = np.vstack([origin, points[order], origin])
+    return float(np.hypot(*np.diff(route, axis=0).T).sum())
+
+def plan_tour(points, origin):
+    # Visit all points starting and ending at origin: nearest neighbour, then 2-opt
+    n = len(points)
+    if n <= 1:
+        return list(range(n))
+    remaining = np.ones(n, dtype=bool)
+    order = []
+    head = np.asarray(origin, dtype=float)
+    for _ in range(n):
+        distances = np.hypot(*(points - head).T)
+        distances[~remaining] = np.inf
+        nearest = int(np.argmin(distances))
+        order.append(nearest)
+        remaining[nearest] = False
+        head = points[nearest]
+
+    # 2-opt on the closed route origin -> order -> origin (origin stays fixed at index 0)
+    route = np.vstack([origin, points[order]])
+    index = np.array([-1] + order)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, n):
+            a, b = route[i - 1], route[i]
+            j = np.arange(i + 1, n + 1)
+            c, d = route[j], route[(j + 1) % (n + 1)]
+            delta = (np.hypot(*(c - a).T) + np.hypot(*(d - b).T)
+                     - np.hypot(*(b - a)) - np.hypot(*(d - c).T))
+            k = int(np.argmin(delta))
+            if delta[k] < -1e-9:
+                route[i:j[k] + 1] = route[i:j[k] + 1][::-1].copy()
+                index[i:j[k] + 1] = index[i:j[k] + 1][::-1].copy()
+                improved = True
+    return [int(i) for i in index[1:]]
+
+def order_contours(siblings, head):
+    # Cut order for a group of siblings: each contour's children first, then itself
+    ordered = []
+    tour = plan_tour(np.array([c.start for c in siblings]), head)
+    for contour in (siblings[i] for i in tour):
+        if contour.children:
+            ordered += order_contours(contour.children, ordered[-1].start if ordered else head)
+        ordered.append(contour)
+    return ordered
+
+def optimize_cut_order(msp, origin=(0.0, 0.0), cfg=None):
+    # Reorder cut entities in msp; returns cut/travel lengths and estimated times
+    doc = msp.doc
+    contours = [Contour(e) for e in msp if is_cut_entity(e, doc)]
+    ordered = order_contours(build_contour_tree(contours), np.asarray(origin, dtype=float)) if contours else []
+
+    for contour in ordered:
+        msp.unlink_entity(contour.entity)
+        msp.add_entity(contour.entity)
+
+    return toolpath_report(ordered, origin, cfg)
+
+def order_shapes(shapes, origin=(0.0, 0.0), skip_layers=(), cfg=None):
+    # Cut order for plain dxf_writer shapes; returns (shapes, report). Shapes on
+    # skip_layers (e.g. a non-plotting stock outline) are not cut and stay in front.
+    kept = [shape for shape in shapes if shape.layer in skip_layers]
+    contours = [Contour(shape) for shape in shapes if shape.layer not in skip_layers]
+    ordered = order_contours(build_contour_tree(contours), np.asarray(origin, dtype=float)) if contours else []
+    return kept + [contour.entity for contour in ordered], toolpath_report(ordered, origin, cfg)
+
+def toolpath_report(ordered, origin=(0.0, 0.0), cfg=None):
+    cfg = config if cfg is None else cfg
+    cut_length = sum(c.length for c in ordered)
+    travel_length = tour_length(np.array([c.start for c in ordered]).reshape(-1, 2), list(range(len(ordered))), origin)
+    return {
+        "contours": len(ordered),
+        "cut_length_mm": cut_length,
+        "travel_length_mm": travel_length,
+        "cut_time_minutes": cut_length / cfg.LASER_CUT_SPEED_MM_S / 60,
+        "travel_time_minutes": travel_length / cfg.LASER_TRAVEL_SPEED_MM_S / 60,
+    }
+
+def optimize_dxf_file(dxf_file, output_file=None):
+    with profiled(f"readfile {dxf_file}"):
+        doc = ezdxf.readfile(dxf_file)
+    with profiled(f"optimize_cut_order {dxf_file}"):
+        report = optimize_cut_order(doc.modelspace())
+    with profiled(f"saveas {output_file or dxf_file}"):
+        save_dxf(doc, output_file or dxf_file)
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reorder laser-cut DXF entities for cut safety and minimal head travel.")
+    parser.add_argument("dxf_files", nargs="+", help="DXF files to optimize in place")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    with profile_command(args, "laser_toolpath"):
+        for dxf_file in args.dxf_files:
+            report = optimize_dxf_file(dxf_file)
+            print(f"{dxf_file}: {report['contours']} contours, "
+                  f"cut {report['cut_length_mm']:.1f} mm ({report['cut_time_minutes']:.2f} min), "
+                  f"travel {report['travel_length_mm']:.1f} mm ({report['travel_time_minutes']:.2f} min)")
@@ -0,0 +1,172 @@
+from functools import lru_cache
+import numpy as np
+import config
+from config_trace import is_traced, untraced
+
+# Shared feature layout of the enclosure and the button board.
+# The 3D printed case, the laser-cut panels, the design rule check and the
+# button PCB all place their features from one Layout instead of each working
+# out positions on its own. get_layout() builds it from the config values in
+# LAYOUT_SETTINGS and caches it by those values, so the stages of a batch,
+# fleet or sweep run that share a design compute its geometry once. Every
+# coordinate is a read-only NumPy array in mm:
+#   case features - plan view from the case's bottom-left corner (x along
+#                   CASE_LENGTH, y along CASE_WIDTH); the lid and bottom plate
+#                   of both case styles share these positions
+#   board         - (x0, y0, x1, y1) outline of the ESP32 board
+#   usb_cutout    - (x0, z0, x1, z1) on the front wall/panel, z from the bottom
+#   switches, diodes, connector pins - from the button board's bottom-left corner
+
+# Config values each layout field is computed from. get_layout() computes the
+# geometry from the untraced config; reading a field then reads only that
+# field's settings from the config it was given. The build cache and watch
+# mode therefore record per-feature dependencies, e.g. a stage drawing just the
+# LED hole depends on LED_OFFSET_X/Y and the case size, not on the footswitch
+# row or the button board, whether or not the layout came from the cache.
+ROW_SETTINGS = ("NUM_BUTTONS", "FOOTSWITCH_CAP_DIAMETER", "BUTTON_SPACING")
+BOARD_SETTINGS = ("CASE_LENGTH", "BOARD_LENGTH", "BOARD_WIDTH", "BOARD_OFFSET_Y")
+BUTTON_BOARD_SETTINGS = ROW_SETTINGS + ("BUTTON_WIRING",)
+MATRIX_SETTINGS = ("BUTTON_ACTIONS", "MATRIX_ROW_PINS", "MATRIX_COL_PINS") # Button board fields in matrix wiring only
+FIELD_SETTINGS = {
+    "case_size": ("CASE_LENGTH", "CASE_WIDTH", "CASE_HEIGHT"),
+    "wall": ("WALL_THICKNESS",),
+    "footswitches": ("CASE_LENGTH", "CASE_WIDTH") + ROW_SETTINGS,
+    "pitch": ("FOOTSWITCH_CAP_DIAMETER", "BUTTON_SPACING"),
+    "board": BOARD_SETTINGS,
+    "board_holes": BOARD_SETTINGS,
+    "lid_screws": ("CASE_LENGTH", "CASE_WIDTH", "SCREW_OFFSET"),
+    "led": ("CASE_LENGTH", "CASE_WIDTH", "LED_OFFSET_X", "LED_OFFSET_Y"),
+    "usb_cutout": ("CASE_LENGTH", "USB_C_WIDTH", "USB_C_HEIGHT", "USB_C_OFFSET_FROM_BOTTOM"),
+    "pcb_size": BUTTON_BOARD_SETTINGS,
+    "switches": BUTTON_BOARD_SETTINGS,
+    "diodes": BUTTON_BOARD_SETTINGS,
+    "connector": BUTTON_BOARD_SETTINGS,
+}
+LAYOUT_SETTINGS = tuple(dict.fromkeys(name for settings in FIELD_SETTINGS.values() for name in settings))
+UNTRACED_READS = dict.fromkeys(FIELD_SETTINGS, ()) # Nothing records reads of a plain config
+
+BOARD_HOLE_INSET = 5 # Distance from the board edge to its mounting hole centres
+HEADER_PITCH = 2.54  # Pin pitch of the button board's connector
+CONNECTOR_STRIP = 8  # Height of the strip along the button board's bottom edge that holds the connector
+
+def frozen(values):
+    array = np.array(values, dtype=float)
+    array.setflags(write=False)
+    return array
+
+def layout_fields(settings):
+    # name -> geometry for every FIELD_SETTINGS field, from a dict of setting values
+    s = settings
+    length, width = s["CASE_LENGTH"], s["CASE_WIDTH"]
+    fields = {"case_size": (length, width, s["CASE_HEIGHT"]), "wall": s["WALL_THICKNESS"]}
+
+    # Footswitches: one row, centred on the lid, one cap plus BUTTON_SPACING apart
+    count = s["NUM_BUTTONS"]
+    pitch = s["FOOTSWITCH_CAP_DIAMETER"] + s["BUTTON_SPACING"]
+    row_width = count * s["FOOTSWITCH_CAP_DIAMETER"] + (count - 1) * s["BUTTON_SPACING"]
+    start_x = (length - row_width) / 2 + s["FOOTSWITCH_CAP_DIAMETER"] / 2
+    fields["footswitches"] = np.column_stack([start_x + np.arange(count) * pitch, np.full(count, width / 2)])
+    fields["pitch"] = pitch
+
+    # ESP32 board centred along the case, BOARD_OFFSET_Y in from the front
+    # wall so it clears the footswitch row, mounted at its four corner holes
+    board_center = np.array([length / 2, s["BOARD_OFFSET_Y"]])
+    half = np.array([s["BOARD_LENGTH"], s["BOARD_WIDTH"]]) / 2
+    fields["board"] = np.concatenate([board_center - half, board_center + half])
+    corners = np.array([(-1, -1), (1, -1), (-1, 1), (1, 1)])
+    fields["board_holes"] = board_center + corners * (half - BOARD_HOLE_INSET)
+
+    # Lid assembly screws, SCREW_OFFSET in from each corner
+    offset = s["SCREW_OFFSET"]
+    fields["lid_screws"] = np.array([length / 2, width / 2]) + corners * (np.array([length / 2, width / 2]) - offset)
+
+    fields["led"] = (length - s["LED_OFFSET_X"], width - s["LED_OFFSET_Y"])
+    fields["usb_cutout"] = (length / 2 - s["USB_C_WIDTH"] / 2, s["USB_C_OFFSET_FROM_BOTTOM"],
+                            length / 2 + s["USB_C_WIDTH"] / 2, s["USB_C_OFFSET_FROM_BOTTOM"] + s["USB_C_HEIGHT"])
+
+    # Button board: switches at the footswitch pitch, so a direct-wired
+    # board lines up under the lid holes; a matrix board is a rows x columns
+    # grid, row 0 at the top, with each diode just past its switch's cap.
+    # The connector runs along a strip at the bottom, centred.
+    if s["BUTTON_WIRING"] == "matrix":
+        rows, cols = s["MATRIX_ROWS"], s["MATRIX_COLS"]
+        cells = np.array(s["MATRIX_POSITIONS"], dtype=float).reshape(-1, 2)
+        board_length, board_width = cols * pitch, rows * pitch
+        fields["switches"] = np.column_stack([(cells[:, 1] + 0.5) * pitch, CONNECTOR_STRIP + (rows - cells[:, 0] - 0.5) * pitch])
+        fields["diodes"] = fields["switches"] - [0, s["FOOTSWITCH_CAP_DIAMETER"] / 2]
+        pins = rows + cols
+    else:
+        board_length, board_width = count * pitch, pitch
+        fields["switches"] = np.column_stack([(np.arange(count) + 0.5) * pitch, np.full(count, CONNECTOR_STRIP + pitch / 2)])
+        fields["diodes"] = np.empty((0, 2))
+        pins = count + 1
+    fields["pcb_size"] = (board_length, CONNECTOR_STRIP + board_width)
+    first_pin = board_length / 2 - (pins - 1) * HEADER_PITCH / 2
+    fields["connector"] = np.column_stack([first_pin + np.arange(pins) * HEADER_PITCH, np.full(pins, CONNECTOR_STRIP / 2)])
+    return {name: float(value) if np.isscalar(value) else frozen(value) for name, value in fields.items()}
+
+class Layout:
+    # One design's geometry (shared between calls through the cache) seen
+    # through the config it was requested with; every field read is also a
+    # read of that field's FIELD_SETTINGS on cfg
+    __slots__ = ("_fields", "_reads", "_cfg")
+
+    def __init__(self, fields, reads, cfg):
+        object.__setattr__(self, "_fields", fields)
+        object.__setattr__(self, "_reads", reads)
+        object.__setattr__(self, "_cfg", cfg)
+
+    def __getattr__(self, name):
+        if name not in FIELD_SETTINGS:
+            raise AttributeError(f"'Layout' object has no attribute '{name}'")
+        for setting in self._reads[name]:
+            getattr(self._cfg, setting)
+        return self._fields[name]
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Layout is immutable; build a new one with get_layout()")
+
+    # 3D printed case positions, derived from the shared plan view
+
+    def standoff_positions(self):
+        # (x, y, z) of each board standoff's base, on the floor
+        return np.column_stack([self.board_holes, np.full(len(self.board_holes), self.wall)])
+
+    def usb_cutout_center(self):
+        # Centre of the USB-C cutout, through the middle of the front wall
+        x0, z0, x1, z1 = self.usb_cutout
+        return np.array([(x0 + x1) / 2, self.wall / 2, (z0 + z1) / 2])
+
+    def led_hole_center(self):
+        # Centre of the LED hole, in the middle of the lid on the assembled case
+        return np.array([self.led[0], self.led[1], self.case_size[2] - self.wall / 2])
+
+def hashable(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(hashable(v) for v in value)
+    return value
+
+def layout_settings(cfg):
+    settings = [(name, hashable(getattr(cfg, name))) for name in LAYOUT_SETTINGS]
+    if cfg.BUTTON_WIRING == "matrix":
+        settings += [("MATRIX_POSITIONS", tuple(hashable(key) for key, _, _ in cfg.BUTTON_ACTIONS)),
+                     ("MATRIX_ROWS", len(cfg.MATRIX_ROW_PINS)), ("MATRIX_COLS", len(cfg.MATRIX_COL_PINS))]
+    return tuple(settings)
+
+def field_reads(wiring):
+    # FIELD_SETTINGS plus the matrix settings the button board fields read in matrix wiring
+    if wiring != "matrix":
+        return FIELD_SETTINGS
+    return {name: settings + MATRIX_SETTINGS if settings is BUTTON_BOARD_SETTINGS else settings
+            for name, settings in FIELD_SETTINGS.items()}
+
+@lru_cache(maxsize=64)
+def cached_fields(settings):
+    return layout_fields(dict(settings))
+
+def get_layout(cfg=None):
+    # cfg defaults to the config module as it is at call time (fleet.py and benchmarks.py patch it)
+    cfg = config if cfg is None else cfg
+    values = untraced(cfg)
+    reads = field_reads(values.BUTTON_WIRING) if is_traced(cfg) else UNTRACED_READS
+    return Layout(cached_fields(layout_settings(values)), reads, cfg)
@@ -0,0 +1,443 @@
+import argparse
+import heapq
+import math
+from array import array
+from collections import Counter, namedtuple
+import numpy as np
+import config
+from layout import HEADER_PITCH, get_layout
+from profiling import add_profile_arguments, profile_command, profiled
+
+# Placement, maze routing and KiCad board output for the button PCB.
+# Footprints go where the shared layout (layout.py) puts the switches, diodes
+# and connector. Every net of generate_button_pcb's netlist model is then
+# routed on a two-layer occupancy grid with PCB_GRID cells: an A* maze search
+# (Lee's algorithm guided by the distance to the target) grows each net as a
+# tree, one pad at a time, preferring horizontal runs on F.Cu and vertical
+# runs on B.Cu with vias in between. Cells too close to another net's copper
+# are blocked, so the routed board keeps PCB_CLEARANCE by construction. When a
+# net cannot be routed, the nets that blocked its search are ripped up, the
+# cells they used get more expensive, and the failed net is tried first on the
+# next pass, for up to PCB_ROUTE_PASSES passes. The searches run on flat
+# integer arrays and stay inside a window around each connection, so a
+# 120-key matrix routes in a few seconds. The board is written as a KiCad 6
+# .kicad_pcb with its outline, footprints, tracks and vias.
+
+# Pad relative to its footprint's origin, in board orientation (x right, y up)
+Pad = namedtuple("Pad", ["number", "x", "y", "width", "height", "shape", "kind"])
+# A component placed on the board; angle is the KiCad footprint rotation
+Placement = namedtuple("Placement", ["component", "x", "y", "angle", "pads"])
+# segments: (layer, x0, y0, x1, y1, net index); vias: (x, y, net index); board coordinates in mm
+Board = namedtuple("Board", ["width", "height", "placements", "nets", "segments", "vias", "unrouted"])
+
+# Pads of the footprints the netlist uses (the pin header is generated per pin count)
+FOOTPRINT_PADS = {
+    "Button_SMD_6x6mm:SW_Push_6mm": [
+        Pad("1", -3.1, 1.85, 1.8, 1.1, "rect", "smd"), Pad("1", 3.1, 1.85, 1.8, 1.1, "rect", "smd"),
+        Pad("2", -3.1, -1.85, 1.8, 1.1, "rect", "smd"), Pad("2", 3.1, -1.85, 1.8, 1.1, "rect", "smd"),
+    ],
+    "Diode_SMD:D_SOD-123": [
+        Pad("1", -1.65, 0, 0.9, 1.2, "rect", "smd"), Pad("2", 1.65, 0, 0.9, 1.2, "rect", "smd"),
+    ],
+}
+HEADER_FOOTPRINT = "Connector_PinHeader_2.54mm:"
+
+LAYERS = ("F.Cu", "B.Cu") # Grid layer 0 and 1
+BOARD_ORIGIN = (20, 20)   # Top-left corner of the board on the KiCad sheet (mm)
+FREE = -1                 # Occupancy of an unused cell; cells of net k hold k
+BLOCKED = -2              # Board edge, or pads of different nets too close together
+WRONG_WAY_COST = 2        # Step cost against a layer's preferred direction (a step along it costs 1)
+VIA_COST = 8              # A via costs as much as this many grid steps
+HISTORY_COST = 4          # Added to every cell of a net that is ripped up
+SEARCH_MARGIN = 40        # Cells searched beyond the bounding box of a connection's ends
+
+# --- Placement ---
+
+def header_pads(count):
+    # Single-row pin header along +x, square pin 1
+    return [Pad(str(i + 1), i * HEADER_PITCH, 0, 1.7, 1.7, "rect" if i == 0 else "circle", "thru_hole")
+            for i in range(count)]
+
+def place_components(components, layout):
+    positions = {"J1": layout.connector[0].tolist()}
+    positions.update((f"SW{i+1}", p) for i, p in enumerate(layout.switches.tolist()))
+    positions.update((f"D{i+1}", p) for i, p in enumerate(layout.diodes.tolist()))
+    placements = []
+    for component in components:
+        x, y = positions[component.ref]
+        if component.footprint.startswith(HEADER_FOOTPRINT):
+            # KiCad's headers run down the footprint's y axis; turned 90 degrees they run along x
+            placements.append(Placement(component, x, y, 90, header_pads(len(layout.connector))))
+        else:
+            placements.append(Placement(component, x, y, 0, FOOTPRINT_PADS[component.footprint]))
+    return placements
+
+# --- Grid router ---
+
+class Router:
+    def __init__(self, width, height, cfg):
+        self.pitch = cfg.PCB_GRID
+        if self.pitch < cfg.PCB_TRACK_WIDTH + cfg.PCB_CLEARANCE - 1e-9:
+            raise ValueError(f"PCB_GRID ({self.pitch} mm) must be at least PCB_TRACK_WIDTH + PCB_CLEARANCE")
+        self.nx = int(width / self.pitch + 1e-9) + 1
+        self.ny = int(height / self.pitch + 1e-9) + 1
+        self.plane = self.nx * self.ny
+
+        # Pads and the board edge keep this much from a track or via centre
+        self.keepout = cfg.PCB_CLEARANCE + max(cfg.PCB_TRACK_WIDTH, cfg.PCB_VIA_DIAMETER) / 2
+        # Cells a via takes from other nets' tracks, and cells that must be clear of other nets to place one
+        self.via_halo = self.offsets(cfg.PCB_VIA_DIAMETER / 2 + cfg.PCB_CLEARANCE + cfg.PCB_TRACK_WIDTH / 2)
+        self.via_check = self.offsets(cfg.PCB_VIA_DIAMETER + cfg.PCB_CLEARANCE)
+
+        occupancy = np.full((2, self.ny, self.nx), FREE, dtype=np.int32)
+        edge = int(math.ceil(self.keepout / self.pitch - 1e-9))
+        occupancy[:, :edge, :] = occupancy[:, -edge:, :] = BLOCKED
+        occupancy[:, :, :edge] = occupancy[:, :, -edge:] = BLOCKED
+        self.occupancy = occupancy
+        self.terminals = []
+
+    def offsets(self, distance):
+        # Grid offsets (dx, dy) closer than distance to a cell, the cell itself excluded
+        reach = int(math.ceil(distance / self.pitch))
+        return [(dx, dy) for dy in range(-reach, reach + 1) for dx in range(-reach, reach + 1)
+                if (dx or dy) and math.hypot(dx, dy) * self.pitch < distance - 1e-9]
+
+    def cell(self, layer, ix, iy):
+        return layer * self.plane + iy * self.nx + ix
+
+    def decode(self, cell):
+        layer, rem = divmod(cell, self.plane)
+        iy, ix = divmod(rem, self.nx)
+        return layer, ix, iy
+
+    def grid_range(self, lo, hi, size):
+        # Indices of the grid points strictly inside lo..hi
+        first = max(int(math.floor(lo / self.pitch)) + 1, 0)
+        last = min(int(math.ceil(hi / self.pitch)) - 1, size - 1)
+        return first, last
+
+    def add_pads(self, placements, nets):
+        # Mark pad copper and keepouts; every pad becomes a terminal of its net
+        net_of = {(ref, str(pin)): k for k, net in enumerate(nets) for ref, pin in net.nodes}
+        self.terminals = [[] for _ in nets]
+        occupancy = self.occupancy
+        for placement in placements:
+            for pad in placement.pads:
+                net = net_of.get((placement.component.ref, pad.number), BLOCKED)
+                x, y = placement.x + pad.x, placement.y + pad.y
+                layers = [0] if pad.kind == "smd" else [0, 1]
+                x0, x1 = self.grid_range(x - pad.width / 2 - self.keepout, x + pad.width / 2 + self.keepout, self.nx)
+                y0, y1 = self.grid_range(y - pad.height / 2 - self.keepout, y + pad.height / 2 + self.keepout, self.ny)
+                for layer in layers:
+                    region = occupancy[layer, y0:y1 + 1, x0:x1 + 1]
+                    region[(region >= 0) & (region != net)] = BLOCKED
+                    region[region == FREE] = net
+                # Copper: grid points inside the pad, or the nearest one for pads smaller than a cell
+                cx0, cx1 = self.grid_range(x - pad.width / 2, x + pad.width / 2, self.nx)
+                cy0, cy1 = self.grid_range(y - pad.height / 2, y + pad.height / 2, self.ny)
+                if cx0 > cx1 or cy0 > cy1:
+                    cx0 = cx1 = int(round(x / self.pitch))
+                    cy0 = cy1 = int(round(y / self.pitch))
+                copper = [self.cell(layer, ix, iy) for layer in layers
+                          for iy in range(cy0, cy1 + 1) for ix in range(cx0, cx1 + 1)]
+                for c in copper:
+                    layer, ix, iy = self.decode(c)
+                    occupancy[layer, iy, ix] = net
+                if net >= 0:
+                    self.terminals[net].append(copper)
+
+        # Searches read single cells, which is much faster on flat arrays than through NumPy
+        self.base = array("i", occupancy.ravel().tobytes())
+        self.owner = array("i", self.base)
+        self.history = {}
+        self.paths = [[] for _ in nets]
+        self.marked = [[] for _ in nets]
+
+    def via_allowed(self, net, ix, iy):
+        owner, nx, ny, plane = self.owner, self.nx, self.ny, self.plane
+        for dx, dy in self.via_check:
+            x, y = ix + dx, iy + dy
+            if not (0 <= x < nx and 0 <= y < ny):
+                return False
+            c = y * nx + x
+            if owner[c] not in (FREE, net) or owner[c + plane] not in (FREE, net):
+                return False
+        return True
+
+    def search(self, net, sources, targets, blockers):
+        # A* from any source cell to any target cell; returns the path as a cell list, or None
+        nx, plane = self.nx, self.plane
+        owner, base, history = self.owner, self.base, self.history
+        target_xy = [self.decode(c)[1:] for c in targets]
+        tx0, tx1 = min(x for x, _ in target_xy), max(x for x, _ in target_xy)
+        ty0, ty1 = min(y for _, y in target_xy), max(y for _, y in target_xy)
+        source_xy = [self.decode(c)[1:] for c in sources]
+        wx0 = max(min(tx0, min(x for x, _ in source_xy)) - SEARCH_MARGIN, 0)
+        wx1 = min(max(tx1, max(x for x, _ in source_xy)) + SEARCH_MARGIN, nx - 1)
+        wy0 = max(min(ty0, min(y for _, y in source_xy)) - SEARCH_MARGIN, 0)
+        wy1 = min(max(ty1, max(y for _, y in source_xy)) + SEARCH_MARGIN, self.ny - 1)
+
+        best = {}
+        came = {}
+        heap = []
+        for c, (x, y) in zip(sources, source_xy):
+            best[c] = 0
+            dx = tx0 - x if x < tx0 else x - tx1 if x > tx1 else 0
+            dy = ty0 - y if y < ty0 else y - ty1 if y > ty1 else 0
+            heap.append((dx + dy, 0, c))
+        heapq.heapify(heap)
+
+        while heap:
+            _, neg_g, cell = heapq.heappop(heap)
+            g = -neg_g
+            if cell in targets:
+                path = [cell]
+                while cell in came:
+                    cell = came[cell]
+                    path.append(cell)
+                return path[::-1]
+            if g > best[cell]:
+                continue
+            layer = 1 if cell >= plane else 0
+            iy, ix = divmod(cell - layer * plane, nx)
+            across, along = (1, WRONG_WAY_COST) if layer == 0 else (WRONG_WAY_COST, 1)
+            steps = []
+            if ix > wx0:
+                steps.append((cell - 1, across, ix - 1, iy))
+            if ix < wx1:
+                steps.append((cell + 1, across, ix + 1, iy))
+            if iy > wy0:
+                steps.append((cell - nx, along, ix, iy - 1))
+            if iy < wy1:
+                steps.append((cell + nx, along, ix, iy + 1))
+            other = cell + plane if layer == 0 else cell - plane
+            steps.append((other, VIA_COST, ix, iy))
+            for n, cost, x, y in steps:
+                o = owner[n]
+                if o != FREE and o != net:
+                    if o >= 0 and base[n] == FREE:
+                        blockers[o] += 1
+                    continue
+                new_g = g + cost + history.get(n, 0)
+                if new_g >= best.get(n, new_g + 1):
+                    continue
+                if n == other and not self.via_allowed(net, ix, iy):
+                    continue
+                best[n] = new_g
+                came[n] = cell
+                dx = tx0 - x if x < tx0 else x - tx1 if x > tx1 else 0
+                dy = ty0 - y if y < ty0 else y - ty1 if y > ty1 else 0
+                heapq.heappush(heap, (new_g + dx + dy, -new_g, n))
+        return None
+
+    def commit(self, net, path):
+        owner, marked = self.owner, self.marked[net]
+        for i, c in enumerate(path):
+            if owner[c] == FREE:
+                owner[c] = net
+                marked.append(c)
+            if i and abs(c - path[i - 1]) == self.plane:
+                # Via: keep other nets' tracks clear of it on both layers
+                _, ix, iy = self.decode(c)
+                for dx, dy in self.via_halo:
+                    for layer in (0, 1):
+                        h = self.cell(layer, ix + dx, iy + dy)
+                        if owner[h] == FREE:
+                            owner[h] = net
+                            marked.append(h)
+        self.paths[net].append(path)
+
+    def rip_up(self, net, penalize=False):
+        owner, history = self.owner, self.history
+        for c in self.marked[net]:
+            owner[c] = FREE
+            if penalize:
+                history[c] = history.get(c, 0) + HISTORY_COST
+        self.marked[net] = []
+        self.paths[net] = []
+
+    def route_net(self, net, blockers):
+        # Grow the net from its first pad, always connecting the pad nearest to those already joined
+        terminals = self.terminals[net]
+        if len(terminals) < 2:
+            return True
+        centres = [np.mean([self.decode(c)[1:] for c in t], axis=0) for t in terminals]
+        tree = set(terminals[0])
+        joined = [centres[0]]
+        remaining = list(range(1, len(terminals)))
+        distance = {i: np.abs(centres[i] - centres[0]).sum() for i in remaining}
+        while remaining:
+            i = min(remaining, key=distance.__getitem__)
+            remaining.remove(i)
+            path = self.search(net, list(tree), set(terminals[i]), blockers)
+            if path is None:
+                self.rip_up(net)
+                return False
+            self.commit(net, path)
+            tree.update(path)
+            tree.update(terminals[i])
+            joined.append(centres[i])
+            for j in remaining:
+                distance[j] = min(distance[j], np.abs(centres[j] - centres[i]).sum())
+        return True
+
+    def route(self, passes):
+        # Short nets first; returns the indices of the nets left unrouted
+        def span(net):
+            xy = [self.decode(c)[1:] for t in self.terminals[net] for c in t[:1]]
+            return (max(x for x, _ in xy) - min(x for x, _ in xy) + max(y for _, y in xy) - min(y for _, y in xy)) if xy else 0
+        order = sorted(range(len(self.terminals)), key=span)
+        routed = set()
+        for _ in range(passes):
+            failed = []
+            blockers = Counter()
+            for net in order:
+                if net not in routed:
+                    if self.route_net(net, blockers):
+                        routed.add(net)
+                    else:
+                        failed.append(net)
+            if not failed:
+                break
+            # Rip up the routed nets that were in the way most often and retry the failed nets first
+            for net, _ in blockers.most_common(2 * len(failed)):
+                if net in routed:
+                    self.rip_up(net, penalize=True)
+                    routed.discard(net)
+            order = failed + [net for net in order if net not in failed]
+        return [net for net in order if net not in routed]
+
+    def geometry(self):
+        # Tracks as straight segments and vias, in mm
+        segments, vias = [], []
+        p = self.pitch
+        for net, paths in enumerate(self.paths):
+            for path in paths:
+                points = [self.decode(c) for c in path]
+                start = prev = points[0]
+                direction = None
+                for point in points[1:]:
+                    if point[0] != prev[0]:
+                        if prev != start:
+                            segments.append((prev[0], start[1] * p, start[2] * p, prev[1] * p, prev[2] * p, net))
+                        vias.append((point[1] * p, point[2] * p, net))
+                        start, direction = point, None
+                    else:
+                        step = (point[1] - prev[1], point[2] - prev[2])
+                        if direction is not None and step != direction:
+                            segments.append((prev[0], start[1] * p, start[2] * p, prev[1] * p, prev[2] * p, net))
+                            start = prev
+                        direction = step
+                    prev = point
+                if prev != start:
+                    segments.append((prev[0], start[1] * p, start[2] * p, prev[1] * p, prev[2] * p, net))
+        return segments, vias
+
+def route_board(components, nets, cfg=None):
+    # Place the footprints and route every net; cfg defaults to the config module at call time
+    cfg = config if cfg is None else cfg
+    layout = get_layout(cfg)
+    width, height = layout.pcb_size.tolist()
+    placements = place_components(components, layout)
+    router = Router(width, height, cfg)
+    with profiled("place_pads"):
+        router.add_pads(placements, nets)
+    with profiled("route_nets"):
+        unrouted = router.route(cfg.PCB_ROUTE_PASSES)
+    segments, vias = router.geometry()
+    return Board(width, height, placements, nets, segments, vias, [nets[i].name for i in unrouted])
+
+# --- KiCad output ---
+
+def fmt(value):
+    text = f"{value:.4f}".rstrip("0").rstrip(".")
+    return "0" if text in ("", "-0") else text
+
+def kicad_xy(board, x, y):
+    # KiCad's y axis points down the sheet
+    return f"{fmt(BOARD_ORIGIN[0] + x)} {fmt(BOARD_ORIGIN[1] + board.height - y)}"
+
+def footprint_text(board, placement, net_names):
+    component = placement.component
+    angle = f" {placement.angle}" if placement.angle else ""
+    lines = [f'  (footprint "{component.footprint}" (layer "F.Cu")',
+             f"    (at {kicad_xy(board, placement.x, placement.y)}{angle})",
+             f'    (fp_text reference "{component.ref}" (at 0 -5{angle}) (layer "F.SilkS")',
+             "      (effects (font (size 1 1) (thickness 0.15))))",
+             f'    (fp_text value "{component.value}" (at 0 5{angle}) (layer "F.Fab")',
+             "      (effects (font (size 1 1) (thickness 0.15))))"]
+    theta = math.radians(placement.angle)
+    for pad in placement.pads:
+        # Pad offsets are in board orientation; KiCad wants them before the footprint's rotation
+        bx, by = pad.x, -pad.y
+        px = bx * math.cos(theta) - by * math.sin(theta)
+        py = bx * math.sin(theta) + by * math.cos(theta)
+        net = net_names.get((component.ref, pad.number))
+        net_text = f' (net {net[0]} "{net[1]}")' if net else ""
+        if pad.kind == "smd":
+            kind, layers = "smd", '"F.Cu" "F.Paste" "F.Mask"'
+            drill = ""
+        else:
+            kind, layers = "thru_hole", '"*.Cu" "*.Mask"'
+            drill = " (drill 1)"
+        lines.append(f'    (pad "{pad.number}" {kind} {pad.shape} (at {fmt(px)} {fmt(py)}{angle}) '
+                     f"(size {fmt(pad.width)} {fmt(pad.height)}){drill} (layers {layers}){net_text})")
+    lines.append("  )")
+    return lines
+
+def kicad_pcb_text(board, cfg=None):
+    cfg = config if cfg is None else cfg
+    net_names = {(ref, str(pin)): (net.code, net.name) for net in board.nets for ref, pin in net.nodes}
+    lines = [
+        "(kicad_pcb (version 20211014) (generator esphid)",
+        "  (general (thickness 1.6))",
+        f'  (paper "User" {fmt(board.width + 2 * BOARD_ORIGIN[0])} {fmt(board.height + 2 * BOARD_ORIGIN[1])})',
+        "  (layers",
+        '    (0 "F.Cu" signal)', '    (31 "B.Cu" signal)',
+        '    (34 "B.Paste" user)', '    (35 "F.Paste" user)',
+        '    (36 "B.SilkS" user "B.Silkscreen")', '    (37 "F.SilkS" user "F.Silkscreen")',
+        '    (38 "B.Mask" user)', '    (39 "F.Mask" user)',
+        '    (44 "Edge.Cuts" user)',
+        '    (46 "B.CrtYd" user "B.Courtyard")', '    (47 "F.CrtYd" user "F.Courtyard")',
+        '    (48 "B.Fab" user)', '    (49 "F.Fab" user)',
+        "  )",
+        "  (setup (pad_to_mask_clearance 0))",
+        '  (net 0 "")',
+    ]
+    lines += [f'  (net {net.code} "{net.name}")' for net in board.nets]
+    for placement in board.placements:
+        lines += footprint_text(board, placement, net_names)
+    corners = [(0, 0), (board.width, 0), (board.width, board.height), (0, board.height), (0, 0)]
+    for (x0, y0), (x1, y1) in zip(corners, corners[1:]):
+        lines.append(f'  (gr_line (start {kicad_xy(board, x0, y0)}) (end {kicad_xy(board, x1, y1)}) (layer "Edge.Cuts") (width 0.1))')
+    for layer, x0, y0, x1, y1, net in board.segments:
+        lines.append(f"  (segment (start {kicad_xy(board, x0, y0)}) (end {kicad_xy(board, x1, y1)}) "
+                     f'(width {fmt(cfg.PCB_TRACK_WIDTH)}) (layer "{LAYERS[layer]}") (net {board.nets[net].code}))')
+    for x, y, net in board.vias:
+        lines.append(f"  (via (at {kicad_xy(board, x, y)}) (size {fmt(cfg.PCB_VIA_DIAMETER)}) (drill {fmt(cfg.PCB_VIA_DRILL)}) "
+                     f'(layers "F.Cu" "B.Cu") (net {board.nets[net].code}))')
+    lines.append(")")
+    return "\n".join(lines) + "\n"
+
+def write_kicad_pcb(path, board, cfg=None):
+    with open(path, "w") as f:
+        f.write(kicad_pcb_text(board, cfg))
+
+def print_route_report(path, board):
+    routed = len(board.nets) - len(board.unrouted)
+    print(f"Generated KiCad board: {path} ({board.width:g} x {board.height:g} mm, "
+          f"{routed}/{len(board.nets)} nets routed, {len(board.segments)} track segments, {len(board.vias)} vias)")
+    if board.unrouted:
+        print(f"Warning: could not route {len(board.unrouted)} net(s): {', '.join(board.unrouted)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Place and route the button PCB and write it as a KiCad board.")
+    parser.add_argument("--output", default="button_pcb.kicad_pcb", help="KiCad board file to write")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    from generate_button_pcb import netlist_components, netlist_nets
+    with profile_command(args, "pcb_router"):
+        board = route_board(netlist_components(), netlist_nets())
+        write_kicad_pcb(args.output, board)
+    print_route_report(args.output, board)
@@ -0,0 +1,233 @@
+import argparse
+import math
+import numpy as np
+import config
+from case_mesh import circle_fragments, cylinder_radii
+from profiling import add_profile_arguments, profile_command, profiled
+
+# Layer-sliced 3D print estimates.
+# The SolidPython tree from generate_case.assemble_case() is sliced at the
+# middle of every print layer and each slice is rasterized straight from the
+# primitives (boxes, and cylinders tessellated like OpenSCAD) into a NumPy
+# bitmap with PRINT_RESOLUTION pixels. Like a slicer, every layer is split into
+# PRINT_PERIMETERS outlines, solid top/bottom skin (anything within
+# PRINT_TOP_BOTTOM_LAYERS of open air above or below) and sparse infill at
+# INFILL_PERCENTAGE. Extruded volume, filament and path length follow from the
+# pixel counts; print time from path length at PRINT_SPEED_MM_S plus a fixed
+# PRINT_LAYER_CHANGE_S per layer. Slices only change where a primitive starts
+# or ends, so each distinct slice (and skin neighbourhood) is computed once.
+
+class Grid:
+    # Pixel centres of the slicing raster covering lo..hi in x/y
+    def __init__(self, lo, hi, resolution):
+        self.resolution = resolution
+        self.x = np.arange(lo[0] + resolution / 2, hi[0], resolution)
+        self.y = np.arange(lo[1] + resolution / 2, hi[1], resolution)
+
+    def empty(self):
+        return np.zeros((len(self.y), len(self.x)), dtype=bool)
+
+    def window(self, x0, y0, x1, y1):
+        # Row and column slices of the pixels whose centres lie in [x0, x1) x [y0, y1)
+        return (slice(np.searchsorted(self.y, y0), np.searchsorted(self.y, y1)),
+                slice(np.searchsorted(self.x, x0), np.searchsorted(self.x, x1)))
+
+def primitive_extent(node, offset):
+    # ((x0, y0, z0), (x1, y1, z1)) of a cube or cylinder placed at offset
+    if node.name == "cube":
+        size = node.params["size"]
+        size = np.array([size] * 3 if np.isscalar(size) else size, dtype=float)
+        lo = offset - size / 2 if node.params.get("center") else offset.copy()
+        return lo, lo + size
+    r = max(cylinder_radii(node.params))
+    h = node.params["h"] if node.params.get("h") is not None else 1
+    z0 = offset[2] - h / 2 if node.params.get("center") else offset[2]
+    return np.array([offset[0] - r, offset[1] - r, z0]), np.array([offset[0] + r, offset[1] + r, z0 + h])
+
+def primitives(node, offset=None):
+    # (node, offset) for every cube and cylinder in the tree
+    offset = np.zeros(3) if offset is None else offset
+    if node.name in ("cube", "cylinder"):
+        yield node, offset
+    elif node.name == "translate":
+        for child in node.children:
+            yield from primitives(child, offset + np.array(node.params["v"], dtype=float))
+    elif node.name in ("union", "difference", "intersection"):
+        for child in node.children:
+            yield from primitives(child, offset)
+    else:
+        raise ValueError(f"print_slicer does not support the OpenSCAD '{node.name}' module")
+
+def slice_mask(node, z, grid, segments=None, offset=None):
+    # Bitmap of the solid at height z
+    offset = np.zeros(3) if offset is None else offset
+    if node.name in ("difference", "intersection") and node.children:
+        mask = slice_mask(node.children[0], z, grid, segments, offset)
+        for child in node.children[1:]:
+            if node.name == "difference":
+                paint(child, z, grid, mask, False, segments, offset)
+            else:
+                mask &= slice_mask(child, z, grid, segments, offset)
+        return mask
+    mask = grid.empty()
+    paint(node, z, grid, mask, True, segments, offset)
+    return mask
+
+def paint(node, z, grid, mask, value, segments, offset):
+    # Set the pixels of node's slice to value (True to add, False to cut away).
+    # Primitives only touch their bounding window, so big unions of small holes stay cheap.
+    if node.name == "translate":
+        offset = offset + np.array(node.params["v"], dtype=float)
+        for child in node.children:
+            paint(child, z, grid, mask, value, segments, offset)
+        return
+    if node.name == "union":
+        for child in node.children:
+            paint(child, z, grid, mask, value, segments, offset)
+        return
+    if node.name in ("difference", "intersection"):
+        mask[slice_mask(node, z, grid, segments, offset)] = value
+        return
+
+    lo, hi = primitive_extent(node, offset)
+    if not lo[2] <= z < hi[2]:
+        return
+    rows, cols = grid.window(lo[0], lo[1], hi[0], hi[1])
+    if node.name == "cube":
+        mask[rows, cols] = value
+        return
+    # Cylinder: inside the OpenSCAD polygon (first vertex at angle 0) of the radius at this height
+    r1, r2 = cylinder_radii(node.params)
+    radius = r1 + (r2 - r1) * (z - lo[2]) / (hi[2] - lo[2])
+    count = circle_fragments(max(r1, r2), node.params.get("segments") or segments)
+    dx = grid.x[cols][None, :] - offset[0]
+    dy = grid.y[rows][:, None] - offset[1]
+    sector = np.mod(np.arctan2(dy, dx), 2 * np.pi / count)
+    inside = np.hypot(dx, dy) * np.cos(sector - math.pi / count) <= radius * math.cos(math.pi / count)
+    mask[rows, cols][inside] = value
+
+def differing_slices(a, b, resolution):
+    # Heights at which solids a and b slice differently, one per distinct slice.
+    # Slices only change where a primitive of either solid starts or ends.
+    extents = [primitive_extent(node, offset) for node, offset in list(primitives(a)) + list(primitives(b))]
+    grid = Grid(np.min([e[0] for e in extents], axis=0), np.max([e[1] for e in extents], axis=0), resolution)
+    breaks = np.unique(np.concatenate([[e[0][2], e[1][2]] for e in extents]))
+    return [z for z in ((breaks[:-1] + breaks[1:]) / 2).tolist()
+            if not np.array_equal(slice_mask(a, z, grid), slice_mask(b, z, grid))]
+
+def erode(mask, steps):
+    # Shrink by `steps` pixels, alternating 4- and 8-neighbourhoods for a rounder result
+    for step in range(steps):
+        padded = np.pad(mask, 1)
+        mask = mask & padded[:-2, 1:-1] & padded[2:, 1:-1] & padded[1:-1, :-2] & padded[1:-1, 2:]
+        if step % 2:
+            mask = mask & padded[:-2, :-2] & padded[:-2, 2:] & padded[2:, :-2] & padded[2:, 2:]
+    return mask
+
+def slice_case(case=None, cfg=None):
+    # Per-layer pixel counts: (layer count, [(perimeter_px, solid_px, infill_px)], pixel area)
+    cfg = config if cfg is None else cfg
+    if case is None:
+        import generate_case
+        case = generate_case.assemble_case()
+    parts = list(primitives(case))
+    extents = [primitive_extent(node, offset) for node, offset in parts]
+    lo = np.min([e[0] for e in extents], axis=0)
+    hi = np.max([e[1] for e in extents], axis=0)
+    grid = Grid(lo, hi, cfg.PRINT_RESOLUTION)
+
+    layer_height = cfg.PRINT_LAYER_HEIGHT
+    layer_count = int(math.ceil((hi[2] - lo[2]) / layer_height - 1e-9))
+    heights = lo[2] + (np.arange(layer_count) + 0.5) * layer_height
+
+    # Layers between the same pair of primitive start/end heights are identical
+    # (unless a cone changes radius along the way)
+    breaks = np.unique(np.concatenate([[e[0][2], e[1][2]] for e in extents]))
+    cones = any(node.name == "cylinder" and len(set(cylinder_radii(node.params))) > 1 for node, _ in parts)
+    buckets = np.arange(layer_count) if cones else np.searchsorted(breaks, heights, side="right")
+
+    with profiled("rasterize_slices"):
+        masks = {}
+        for bucket, z in zip(buckets.tolist(), heights.tolist()):
+            if bucket not in masks:
+                masks[bucket] = slice_mask(case, z, grid)
+        # Cutters may reach past the part (e.g. holes poking above the lid); print only solid layers
+        solid_layers = np.flatnonzero([masks[bucket].any() for bucket in buckets.tolist()])
+        buckets = buckets[solid_layers[0]:solid_layers[-1] + 1] if len(solid_layers) else buckets[:0]
+        layer_count = len(buckets)
+
+    shell = int(round(cfg.PRINT_PERIMETERS * cfg.PRINT_LINE_WIDTH / cfg.PRINT_RESOLUTION))
+    skin = cfg.PRINT_TOP_BOTTOM_LAYERS
+    with profiled("classify_layers"):
+        interiors = {bucket: erode(mask, shell) for bucket, mask in masks.items()}
+        counts = []
+        cache = {}
+        for i, bucket in enumerate(buckets.tolist()):
+            # Skin wherever the interior is not covered by solid on every one of the
+            # next/previous `skin` layers; outside the part counts as open air
+            above = tuple(buckets[i + 1:i + 1 + skin].tolist())
+            below = tuple(buckets[max(i - skin, 0):i].tolist())
+            key = (bucket, above, below, len(above) < skin, len(below) < skin)
+            if key not in cache:
+                mask, interior = masks[bucket], interiors[bucket]
+                if key[3] or key[4]:
+                    covered = np.zeros_like(mask)
+                else:
+                    covered = interior.copy()
+                    for other in set(above + below):
+                        covered &= masks[other]
+                solid = interior & ~covered
+                cache[key] = (int(mask.sum() - interior.sum()), int(solid.sum()), int((interior & covered).sum()))
+            counts.append(cache[key])
+    return layer_count, counts, cfg.PRINT_RESOLUTION ** 2
+
+def sliced_print_estimates(case=None, cfg=None):
+    # Same keys as generate_bom_and_estimates.calculate_3d_print_estimates, plus a breakdown
+    cfg = config if cfg is None else cfg
+    with profiled("slice_case"):
+        layer_count, counts, pixel_area = slice_case(case, cfg)
+    perimeter_px, solid_px, infill_px = (sum(c[i] for c in counts) for i in range(3))
+    layer_height, line_width = cfg.PRINT_LAYER_HEIGHT, cfg.PRINT_LINE_WIDTH
+
+    # Extruded area per layer -> volume; divided by line width -> path length
+    perimeter_volume = perimeter_px * pixel_area * layer_height
+    solid_volume = solid_px * pixel_area * layer_height
+    infill_volume = infill_px * pixel_area * layer_height * cfg.INFILL_PERCENTAGE
+    total_volume = perimeter_volume + solid_volume + infill_volume
+    path_length = total_volume / (layer_height * line_width)
+    print_seconds = path_length / cfg.PRINT_SPEED_MM_S + layer_count * cfg.PRINT_LAYER_CHANGE_S
+
+    total_weight_g = total_volume * cfg.FILAMENT_DENSITY_G_MM3
+    return {
+        "total_volume_mm3": total_volume,
+        "total_weight_g": total_weight_g,
+        "total_cost_usd": (total_weight_g / 1000) * cfg.FILAMENT_COST_PER_KG,
+        "estimated_print_time_hours": print_seconds / 3600,
+        "layer_count": layer_count,
+        "part_volume_mm3": (perimeter_px + solid_px + infill_px) * pixel_area * layer_height,
+        "perimeter_volume_mm3": perimeter_volume,
+        "solid_volume_mm3": solid_volume,
+        "infill_volume_mm3": infill_volume,
+        "path_length_mm": path_length,
+    }
+
+def print_sliced_estimates(estimates):
+    print(f"  Layers: {estimates['layer_count']} x {config.PRINT_LAYER_HEIGHT} mm")
+    print(f"  Part Volume: {estimates['part_volume_mm3']:.2f} mm^3")
+    print(f"  Extruded Volume: {estimates['total_volume_mm3']:.2f} mm^3 "
+          f"(perimeters {estimates['perimeter_volume_mm3']:.0f}, solid {estimates['solid_volume_mm3']:.0f}, "
+          f"infill {estimates['infill_volume_mm3']:.0f})")
+    print(f"  Path Length: {estimates['path_length_mm'] / 1000:.1f} m")
+    print(f"  Estimated Filament Weight: {estimates['total_weight_g']:.2f} g")
+    print(f"  Estimated Filament Cost: ${estimates['total_cost_usd']:.2f}")
+    print(f"  Estimated Print Time: {estimates['estimated_print_time_hours']:.2f} hours")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Estimate filament and print time by slicing the 3D printed case into layers.")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    with profile_command(args, "print_slicer"):
+        estimates = sliced_print_estimates()
+    print("\n--- 3D Printing Estimates (Sliced) ---")
+    print_sliced_estimates(estimates)
@@ -0,0 +1,165 @@
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import resource # Not available on Windows
+except ImportError:
+    resource = None
+
+# Shared instrumentation for the generators and build.py.
+# Generators mark their expensive steps with `with profiled("name"):`, which is
+# a no-op unless an entry point was started with --profile. While profiling,
+# every span records wall time, CPU time of this process, CPU time of the
+# subprocesses it waited for (openscad, convert, dot), the peak Python heap
+# growth seen by tracemalloc and the process max RSS. Results are written as a
+# JSON trace and, optionally, as a Chrome trace (chrome://tracing, Perfetto).
+
+DEFAULT_PROFILE_PATH = "profile.json"
+
+_profiler = None
+
+def children_cpu_time():
+    # CPU time of finished child processes (always 0 on Windows)
+    times = os.times()
+    return times.children_user + times.children_system
+
+def max_rss_kb():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss # Kilobytes on Linux
+
+class Profiler:
+    def __init__(self):
+        self.spans = []
+        self.open_peaks = [] # Highest heap peak seen inside each open span, for nesting
+        self.origin = time.time()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def span(self, name, category="step"):
+        # tracemalloc has one global peak, so it is reset on every span entry and
+        # the peak reached so far is handed up to the enclosing spans
+        current, peak = tracemalloc.get_traced_memory()
+        if self.open_peaks:
+            self.open_peaks[-1] = max(self.open_peaks[-1], peak)
+        tracemalloc.reset_peak()
+        self.open_peaks.append(current)
+
+        start_time = time.time()
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        start_children = children_cpu_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - start_wall
+            cpu = time.process_time() - start_cpu
+            children = children_cpu_time() - start_children
+            peak = max(self.open_peaks.pop(), tracemalloc.get_traced_memory()[1])
+            if self.open_peaks:
+                self.open_peaks[-1] = max(self.open_peaks[-1], peak)
+            self.spans.append({
+                "name": name,
+                "category": category,
+                "pid": os.getpid(),
+                "depth": len(self.open_peaks),
+                "start_s": start_time - self.origin,
+                "start_time": start_time,
+                "wall_s": wall,
+                "cpu_s": cpu,
+                "subprocess_cpu_s": children,
+                "peak_memory_kb": (peak - current) / 1024,
+                "max_rss_kb": max_rss_kb(),
+            })
+
+    def stop(self):
+        tracemalloc.stop()
+        return sorted(self.spans, key=lambda s: s["start_time"])
+
+def start_profiling():
+    global _profiler
+    _profiler = Profiler()
+    return _profiler
+
+def stop_profiling():
+    # Returns the recorded spans, or [] if profiling was not running
+    global _profiler
+    if _profiler is None:
+        return []
+    spans = _profiler.stop()
+    _profiler = None
+    return spans
+
+@contextmanager
+def profiled(name, category="step"):
+    if _profiler is None:
+        yield
+        return
+    with _profiler.span(name, category):
+        yield
+
+def write_json_trace(spans, path, command):
+    trace = {
+        "command": command,
+        "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "spans": spans,
+    }
+    with open(path, "w") as f:
+        json.dump(trace, f, indent=2)
+    print(f"Wrote profile: {path}")
+
+def write_chrome_trace(spans, path):
+    # Complete ("X") events; nesting is reconstructed by the viewer from pid/ts/dur
+    origin = min((s["start_time"] for s in spans), default=0.0)
+    events = [{
+        "name": s["name"],
+        "cat": s["category"],
+        "ph": "X",
+        "ts": (s["start_time"] - origin) * 1e6,
+        "dur": s["wall_s"] * 1e6,
+        "pid": s["pid"],
+        "tid": s["pid"],
+        "args": {key: s[key] for key in ("cpu_s", "subprocess_cpu_s", "peak_memory_kb", "max_rss_kb")},
+    } for s in spans]
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    print(f"Wrote Chrome trace: {path}")
+
+def print_profile(spans):
+    labels = ["  " * s["depth"] + s["name"] for s in spans]
+    width = max([len(label) for label in labels] + [20])
+    print("\n--- Profile ---")
+    print(f"  {'span':<{width}} {'wall':>9} {'cpu':>9} {'subproc':>9} {'peak heap':>11}")
+    for s, label in zip(spans, labels):
+        print(f"  {label:<{width}} {s['wall_s']:8.3f}s {s['cpu_s']:8.3f}s {s['subprocess_cpu_s']:8.3f}s "
+              f"{s['peak_memory_kb'] / 1024:8.1f} MB")
+
+def add_profile_arguments(parser):
+    parser.add_argument("--profile", nargs="?", const=DEFAULT_PROFILE_PATH, default=None, metavar="JSON",
+                        help=f"Record per-stage wall/CPU/subprocess time and peak memory to a JSON trace (default: {DEFAULT_PROFILE_PATH})")
+    parser.add_argument("--chrome-trace", default=None, metavar="JSON",
+                        help="Also write the profile as a Chrome trace (implies --profile)")
+
+@contextmanager
+def profile_command(args, name):
+    # Wrap an entry point: profiles everything inside as one top-level span
+    if not (args.profile or args.chrome_trace):
+        yield
+        return
+    start_profiling()
+    try:
+        with profiled(name, "command"):
+            yield
+    finally:
+        finish_profile(stop_profiling(), args, name)
+
+def finish_profile(spans, args, command):
+    print_profile(spans)
+    write_json_trace(spans, args.profile or DEFAULT_PROFILE_PATH, command)
+    if args.chrome_trace:
+        write_chrome_trace(spans, args.chrome_trace)
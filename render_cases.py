@@ -1,91 +1,240 @@
+import argparse
 import subprocess
 import os
+import tempfile
+import numpy as np
+from PIL import Image, ImageDraw
 import ezdxf
 from ezdxf.addons.drawing import RenderContext, Frontend
+from ezdxf.addons.drawing.backend import Backend
+from ezdxf.addons.drawing.config import Configuration, BackgroundPolicy
 from ezdxf.addons.drawing.svg import SVGBackend
 from ezdxf.addons.drawing.layout import Page, Units
 import config
+from canonical_output import strip_png_metadata
+from generate_lasercut_case import build_lasercut_case
+from profiling import add_profile_arguments, profile_command, profiled
 
 # Define paths
 OUTPUT_DIR = "./renderings"
 
-# Ensure output directory exists
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+def ensure_output_dir(output_file):
+    # Created on first write rather than at import, so importing this module has no side effects
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
 
-def render_openscad_model(scad_file, output_png, camera_params=None):
+def openscad_command(scad_file, output, backend=None):
+    # With a backend (e.g. "manifold") PNGs are fully rendered by it instead of the OpenCSG preview
+    backend = config.OPENSCAD_BACKEND if backend is None else backend
+    command = ["openscad", "-o", output, scad_file]
+    if backend:
+        command += ["--render", f"--backend={backend}"]
+    return command
+
+def render_openscad_model(scad, output_png, camera_params=None, backend=None):
+    # scad is a .scad path or a SolidPython object; OpenSCAD only reads files,
+    # so an object is passed through a temporary .scad that is removed afterwards
+    if not isinstance(scad, (str, os.PathLike)):
+        from solid.solidpython import scad_render
+        with tempfile.TemporaryDirectory() as scratch:
+            scad_file = os.path.join(scratch, "model.scad")
+            with open(scad_file, "w") as f:
+                f.write(scad_render(scad))
+            render_openscad_model(scad_file, output_png, camera_params, backend)
+        return
+    scad_file = scad
     print(f"Rendering {scad_file} to {output_png}...")
-    command = ["openscad", "-o", output_png, scad_file]
+    ensure_output_dir(output_png)
+    command = openscad_command(scad_file, output_png, backend)
     if camera_params:
         # Example camera_params: ["--camera=0,0,0,50,0,0,100"] (translate, rotate, distance)
         command.append(f"--camera={camera_params}")
-    
+    run_openscad(command, scad_file, output_png)
+
+def export_openscad_stl(scad_file, stl_file, backend=None):
+    print(f"Exporting {scad_file} to {stl_file}...")
+    run_openscad(openscad_command(scad_file, stl_file, backend), scad_file, stl_file)
+
+def run_openscad(command, scad_file, output):
     try:
-        subprocess.run(command, check=True, capture_output=True, text=True)
-        print(f"Successfully rendered {output_png}")
+        with profiled(f"openscad {scad_file}", "subprocess"):
+            subprocess.run(command, check=True, capture_output=True, text=True)
+        if output.endswith(".png"):
+            strip_png_metadata(output)
+        print(f"Successfully rendered {output}")
     except FileNotFoundError:
         print("Error: OpenSCAD command not found. Please ensure OpenSCAD is installed and in your system's PATH.")
         print("Download from: https://openscad.org/downloads.html")
     except subprocess.CalledProcessError as e:
         print(f"Error rendering {scad_file}: {e.stderr}")
 
-def convert_dxf_to_svg(dxf_file, output_svg):
-    print(f"Converting {dxf_file} to {output_svg}...")
+def load_drawing(dxf):
+    # The DXF renderers take either a file path or an in-memory ezdxf Drawing
+    # (e.g. from generate_lasercut_case.build_panel), which skips the disk round-trip
+    if isinstance(dxf, (str, os.PathLike)):
+        with profiled(f"readfile {dxf}"):
+            return ezdxf.readfile(dxf)
+    return dxf
+
+def drawing_label(dxf):
+    return dxf if isinstance(dxf, (str, os.PathLike)) else "in-memory drawing"
+
+def dxf_to_svg_string(dxf):
+    doc = load_drawing(dxf)
+    ctx = RenderContext(doc)
+    backend = SVGBackend()
+    with profiled(f"draw_layout {drawing_label(dxf)}"):
+        Frontend(ctx, backend).draw_layout(doc.modelspace())
+    page = Page(1000, 1000, units=Units.mm) # Example page size, adjust as needed
+    return backend.get_string(page)
+
+def convert_dxf_to_svg(dxf, output_svg):
+    print(f"Converting {drawing_label(dxf)} to {output_svg}...")
+    ensure_output_dir(output_svg)
     try:
-        doc = ezdxf.readfile(dxf_file)
-        msp = doc.modelspace()
-        
-        # Create a render context and frontend
-        ctx = RenderContext(doc)
-        
-        # Create SVG backend
-        backend = SVGBackend()
-        Frontend(ctx, backend).draw_layout(msp)
-        
-        # Create a default Page object with units
-        page = Page(1000, 1000, units=Units.mm) # Example page size, adjust as needed
-
-        with open(output_svg, "w", encoding="utf8") as fp:
-            fp.write(backend.get_string(page))
+        svg = dxf_to_svg_string(dxf)
+        with profiled(f"write {output_svg}"):
+            with open(output_svg, "w", encoding="utf8") as fp:
+                fp.write(svg)
 
         print(f"Successfully converted {output_svg}")
     except ezdxf.DXFStructureError:
-        print(f"Error: Invalid DXF file: {dxf_file}")
+        print(f"Error: Invalid DXF file: {drawing_label(dxf)}")
     except Exception as e:
-        print(f"Error converting {dxf_file} to SVG: {e}")
+        print(f"Error converting {drawing_label(dxf)} to SVG: {e}")
+
+class RasterBackend(Backend):
+    # Minimal ezdxf drawing backend that collects flattened geometry so it can be
+    # rasterized straight into a Pillow image, without an SVG intermediate.
+    def __init__(self, flattening_distance=0.01):
+        super().__init__()
+        self.flattening_distance = flattening_distance
+        self.background = "#ffffff"
+        self.polylines = [] # (Nx2 array, color, filled)
+
+    def set_background(self, color):
+        self.background = color[:7]
+
+    def _add(self, points, properties, filled=False):
+        points = np.array([(p.x, p.y) for p in points], dtype=float)
+        if len(points):
+            self.polylines.append((points, properties.color[:7], filled))
+
+    def draw_point(self, pos, properties):
+        self._add([pos], properties)
+
+    def draw_line(self, start, end, properties):
+        self._add([start, end], properties)
+
+    def draw_solid_lines(self, lines, properties):
+        for start, end in lines:
+            self._add([start, end], properties)
+
+    def draw_path(self, path, properties):
+        for sub_path in path.sub_paths():
+            self._add(sub_path.flattening(self.flattening_distance), properties)
+
+    def draw_filled_paths(self, paths, properties):
+        for path in paths:
+            for sub_path in path.sub_paths():
+                self._add(sub_path.flattening(self.flattening_distance), properties, filled=True)
+
+    def draw_filled_polygon(self, points, properties):
+        self._add(points.vertices(), properties, filled=True)
+
+    def draw_image(self, image_data, properties):
+        pass # Raster images are not used in the case drawings
+
+    def clear(self):
+        self.polylines = []
+
+    def finalize(self):
+        pass
+
+    def render(self, width, height, margin=10, line_width=2):
+        # Fit the drawing extents into the image, keeping the aspect ratio
+        image = Image.new("RGB", (width, height), self.background)
+        if not self.polylines:
+            return image
+        all_points = np.concatenate([points for points, _, _ in self.polylines])
+        min_xy = all_points.min(axis=0)
+        extent = np.maximum(all_points.max(axis=0) - min_xy, 1e-9)
+        scale = min((width - 2 * margin) / extent[0], (height - 2 * margin) / extent[1])
+        offset = (np.array([width, height]) - extent * scale) / 2
+
+        draw = ImageDraw.Draw(image)
+        for points, color, filled in self.polylines:
+            pixels = (points - min_xy) * scale + offset
+            pixels[:, 1] = height - pixels[:, 1] # DXF y-axis points up
+            xy = [tuple(p) for p in pixels]
+            if filled and len(xy) > 2:
+                draw.polygon(xy, fill=color)
+            elif len(xy) == 1:
+                draw.point(xy, fill=color)
+            else:
+                draw.line(xy, fill=color, width=line_width, joint="curve")
+        return image
+
+def rasterize_dxf(dxf, width=config.RENDERING_IMAGE_WIDTH, height=config.RENDERING_IMAGE_HEIGHT):
+    # DXF path or Drawing -> Pillow image fitted to the drawing extents
+    doc = load_drawing(dxf)
+    ctx = RenderContext(doc)
+    backend = RasterBackend()
+    with profiled(f"draw_layout {drawing_label(dxf)}"):
+        Frontend(ctx, backend, config=Configuration(background_policy=BackgroundPolicy.WHITE)).draw_layout(doc.modelspace())
+    with profiled("rasterize"):
+        return backend.render(width, height)
+
+def convert_dxf_to_png(dxf, output_png, width=config.RENDERING_IMAGE_WIDTH, height=config.RENDERING_IMAGE_HEIGHT):
+    # Rasterize a DXF in-process, fitted to the panel bounds
+    print(f"Converting {drawing_label(dxf)} to {output_png}...")
+    ensure_output_dir(output_png)
+    try:
+        image = rasterize_dxf(dxf, width, height)
+        with profiled(f"write {output_png}"):
+            image.save(output_png)
+        print(f"Successfully converted {output_png}")
+    except ezdxf.DXFStructureError:
+        print(f"Error: Invalid DXF file: {drawing_label(dxf)}")
+    except Exception as e:
+        print(f"Error converting {drawing_label(dxf)} to PNG: {e}")
 
 def convert_svg_to_png(svg_file, output_png, width=config.RENDERING_IMAGE_WIDTH, height=config.RENDERING_IMAGE_HEIGHT):
     print(f"Converting {svg_file} to {output_png}...")
+    ensure_output_dir(output_png)
     command = ["convert", svg_file, "-resize", f"{width}x{height}", output_png]
     try:
-        subprocess.run(command, check=True, capture_output=True, text=True)
+        with profiled(f"convert {svg_file}", "subprocess"):
+            subprocess.run(command, check=True, capture_output=True, text=True)
+        strip_png_metadata(output_png) # ImageMagick stamps date:create/date:modify
         print(f"Successfully converted {output_png}")
     except FileNotFoundError:
         print("Error: ImageMagick's convert command not found. Please ensure ImageMagick is installed and in your system's PATH.")
     except subprocess.CalledProcessError as e:
         print(f"Error converting {svg_file}: {e.stderr}")
 
-if __name__ == "__main__":
+def render_all():
     # Render 3D printable case (OpenSCAD)
     render_openscad_model(
         "esp32_footswitch_case_base.scad", 
-        os.path.join(config.OUTPUT_DIR, "esp32_footswitch_case_base.png"),
+        os.path.join(OUTPUT_DIR, "esp32_footswitch_case_base.png"),
         camera_params=config.RENDERING_CAMERA_PARAMS_3D
     )
     render_openscad_model(
         "esp32_footswitch_case_lid.scad", 
-        os.path.join(config.OUTPUT_DIR, "esp32_footswitch_case_lid.png"),
+        os.path.join(OUTPUT_DIR, "esp32_footswitch_case_lid.png"),
         camera_params=config.RENDERING_CAMERA_PARAMS_3D
     )
 
-    # Convert laser-cut case (DXF) to SVG and then to PNG
-    svg_files = []
-    svg_files.append(("esp32_lasercut_case_top.dxf", os.path.join(config.OUTPUT_DIR, "esp32_lasercut_case_top.svg")))
-    svg_files.append(("esp32_lasercut_case_bottom.dxf", os.path.join(config.OUTPUT_DIR, "esp32_lasercut_case_bottom.svg")))
-    svg_files.append(("esp32_lasercut_case_front_back.dxf", os.path.join(config.OUTPUT_DIR, "esp32_lasercut_case_front_back.svg")))
-    svg_files.append(("esp32_lasercut_case_left_right.dxf", os.path.join(config.OUTPUT_DIR, "esp32_lasercut_case_left_right.svg")))
+    # Rasterize the laser-cut panels straight from the generator's drawings
+    for name, doc in build_lasercut_case(config).items():
+        convert_dxf_to_png(doc, os.path.join(OUTPUT_DIR, f"esp32_lasercut_case_{name}.png"))
+
+    print("\nRendering script finished. Check the 'renderings/' directory.")
 
-    for dxf_file, svg_file in svg_files:
-        convert_dxf_to_svg(dxf_file, svg_file)
-        convert_svg_to_png(svg_file, svg_file.replace(".svg", ".png"))
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render the 3D printable and laser-cut cases to PNG.")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
 
-    print("\nRendering script finished. Check the 'renderings/' directory.")
\ No newline at end of file
+    with profile_command(args, "render_cases"):
+        render_all()
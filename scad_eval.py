@@ -0,0 +1,269 @@
+import re
+from solid import cube, cylinder, difference, intersection, translate, union
+
+# Evaluator for the OpenSCAD subset generate_case.py writes, so the .scad
+# sources can be checked against the SolidPython tree without OpenSCAD.
+# Supported: number/list variables, arithmetic and indexing, module
+# definitions with default arguments, for loops over lists, and the cube,
+# cylinder, translate, union, difference and intersection builtins. The result
+# is a SolidPython object that case_mesh.py and print_slicer.py understand.
+# Anything else raises ValueError rather than being silently skipped.
+
+TOKEN = re.compile(r"\s+|//[^\n]*|/\*.*?\*/"
+                   r"|(?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)"
+                   r"|(?P<name>\$?[A-Za-z_]\w*)"
+                   r"|(?P<op>[-+*/\[\](){};,=])", re.S)
+
+CONSTANTS = {"true": True, "false": False, "undef": None}
+
+# Positional parameter order of the builtin modules, as in OpenSCAD
+BUILTIN_PARAMS = {
+    "cube": ["size", "center"],
+    "cylinder": ["h", "r1", "r2", "center"],
+    "translate": ["v"],
+    "union": [],
+    "difference": [],
+    "intersection": [],
+}
+BOOLEAN_OPERATIONS = {"union": union, "difference": difference, "intersection": intersection}
+
+def tokenize(source):
+    tokens = []
+    pos = 0
+    while pos < len(source):
+        match = TOKEN.match(source, pos)
+        if not match:
+            raise ValueError(f"Unsupported OpenSCAD syntax at offset {pos}: {source[pos:pos + 20]!r}")
+        if match.lastgroup:
+            tokens.append((match.lastgroup, match.group(match.lastgroup)))
+        pos = match.end()
+    return tokens
+
+class Parser:
+    # Recursive descent over the token list. Statements become tuples:
+    # ("assign", name, expr), ("module", name, params, body),
+    # ("call", name, args, children) and ("for", name, expr, children)
+    def __init__(self, source):
+        self.tokens = tokenize(source)
+        self.pos = 0
+
+    def peek(self, value=None):
+        if self.pos >= len(self.tokens):
+            return None
+        token = self.tokens[self.pos]
+        return token if value is None or token[1] == value else None
+
+    def take(self, value=None):
+        token = self.peek()
+        if token is None or (value is not None and token[1] != value):
+            found = token[1] if token else "end of file"
+            raise ValueError(f"Expected {value or 'a token'} in OpenSCAD source, found {found!r}")
+        self.pos += 1
+        return token
+
+    def statements(self):
+        stmts = []
+        while self.peek() and not self.peek("}"):
+            stmts.append(self.statement())
+        return stmts
+
+    def block(self):
+        # A braced block or a single statement
+        if self.peek("{"):
+            self.take("{")
+            stmts = self.statements()
+            self.take("}")
+            return stmts
+        return [self.statement()]
+
+    def statement(self):
+        kind, value = self.take()
+        if kind != "name":
+            raise ValueError(f"Unexpected {value!r} at the start of an OpenSCAD statement")
+        if value == "module":
+            name = self.take()[1]
+            return ("module", name, self.arguments(definition=True), self.block())
+        if value == "for":
+            self.take("(")
+            name = self.take()[1]
+            self.take("=")
+            expr = self.expression()
+            self.take(")")
+            return ("for", name, expr, self.block())
+        if self.peek("="):
+            self.take("=")
+            expr = self.expression()
+            self.take(";")
+            return ("assign", value, expr)
+        args = self.arguments()
+        if self.peek(";"):
+            self.take(";")
+            return ("call", value, args, [])
+        return ("call", value, args, self.block())
+
+    def arguments(self, definition=False):
+        # "(a, name = b, ...)" as [(name or None, expr)]. In a module definition
+        # every entry is named and a bare name is a parameter without default (expr None).
+        self.take("(")
+        args = []
+        while not self.peek(")"):
+            named = self.pos + 1 < len(self.tokens) and self.tokens[self.pos + 1][1] == "="
+            if named or definition:
+                name = self.take()[1]
+                default = None
+                if named:
+                    self.take("=")
+                    default = self.expression()
+                args.append((name, default))
+            else:
+                args.append((None, self.expression()))
+            if not self.peek(")"):
+                self.take(",")
+        self.take(")")
+        return args
+
+    def expression(self):
+        expr = self.term()
+        while self.peek("+") or self.peek("-"):
+            expr = ("binop", self.take()[1], expr, self.term())
+        return expr
+
+    def term(self):
+        expr = self.unary()
+        while self.peek("*") or self.peek("/"):
+            expr = ("binop", self.take()[1], expr, self.unary())
+        return expr
+
+    def unary(self):
+        if self.peek("-"):
+            self.take("-")
+            return ("neg", self.unary())
+        if self.peek("+"):
+            self.take("+")
+        return self.postfix()
+
+    def postfix(self):
+        expr = self.primary()
+        while self.peek("["):
+            self.take("[")
+            expr = ("index", expr, self.expression())
+            self.take("]")
+        return expr
+
+    def primary(self):
+        kind, value = self.take()
+        if kind == "number":
+            return ("value", float(value))
+        if kind == "name":
+            return ("value", CONSTANTS[value]) if value in CONSTANTS else ("var", value)
+        if value == "(":
+            expr = self.expression()
+            self.take(")")
+            return expr
+        if value == "[":
+            items = []
+            while not self.peek("]"):
+                items.append(self.expression())
+                if not self.peek("]"):
+                    self.take(",")
+            self.take("]")
+            return ("list", items)
+        raise ValueError(f"Unexpected {value!r} in an OpenSCAD expression")
+
+def arithmetic(op, a, b):
+    # Scalars, element-wise vectors and scalar * vector, like OpenSCAD
+    if isinstance(a, list) and isinstance(b, list) and op in "+-":
+        return [arithmetic(op, x, y) for x, y in zip(a, b)]
+    if isinstance(a, list) and op in "*/":
+        return [arithmetic(op, x, b) for x in a]
+    if isinstance(b, list) and op == "*":
+        return [arithmetic(op, a, y) for y in b]
+    if isinstance(a, list) or isinstance(b, list):
+        raise ValueError(f"Unsupported OpenSCAD vector operation {op}")
+    if op == "+":
+        return a + b
+    if op == "-":
+        return a - b
+    return a * b if op == "*" else a / b
+
+def value(expr, variables):
+    kind = expr[0]
+    if kind == "value":
+        return expr[1]
+    if kind == "var":
+        if expr[1] not in variables:
+            raise ValueError(f"Undefined OpenSCAD variable '{expr[1]}'")
+        return variables[expr[1]]
+    if kind == "list":
+        return [value(item, variables) for item in expr[1]]
+    if kind == "index":
+        return value(expr[1], variables)[int(value(expr[2], variables))]
+    if kind == "neg":
+        return arithmetic("*", value(expr[1], variables), -1)
+    return arithmetic(expr[1], value(expr[2], variables), value(expr[3], variables))
+
+def group(objects):
+    return objects[0] if len(objects) == 1 else union()(*objects)
+
+class Evaluator:
+    def __init__(self):
+        self.globals = {}
+        self.modules = {}
+
+    def run(self, stmts, variables):
+        # SolidPython objects made by a list of statements; modules are hoisted like in OpenSCAD
+        for stmt in stmts:
+            if stmt[0] == "module":
+                self.modules[stmt[1]] = stmt
+        objects = []
+        for stmt in stmts:
+            if stmt[0] == "assign":
+                variables[stmt[1]] = value(stmt[2], variables)
+            elif stmt[0] == "for":
+                iterations = []
+                for item in value(stmt[2], variables):
+                    iterations += self.run(stmt[3], {**variables, stmt[1]: item})
+                objects.append(union()(*iterations))
+            elif stmt[0] == "call":
+                objects.append(self.call(stmt[1], stmt[2], stmt[3], variables))
+        return objects
+
+    def call(self, name, args, children, variables):
+        if name in BUILTIN_PARAMS:
+            params = self.bind(BUILTIN_PARAMS[name], {}, args, variables, name)
+            return self.builtin(name, params, self.run(children, dict(variables)))
+        if name not in self.modules:
+            raise ValueError(f"Unsupported OpenSCAD module '{name}'")
+        if children:
+            raise ValueError(f"Module '{name}' is called with children, which the evaluator does not support")
+        _, _, definition, body = self.modules[name]
+        # Default arguments are evaluated where the module is defined (the global scope here)
+        defaults = {param: value(default, self.globals) for param, default in definition if default is not None}
+        params = self.bind([param for param, _ in definition], defaults, args, variables, name)
+        return group(self.run(body, {**self.globals, **params}))
+
+    def bind(self, names, defaults, args, variables, module):
+        params = dict(defaults)
+        positional = [expr for arg, expr in args if arg is None]
+        if len(positional) > len(names):
+            raise ValueError(f"Too many arguments for OpenSCAD module '{module}'")
+        params.update(zip(names, (value(expr, variables) for expr in positional)))
+        params.update((arg, value(expr, variables)) for arg, expr in args if arg is not None)
+        return params
+
+    def builtin(self, name, params, children):
+        if name == "cube":
+            return cube(size=params.get("size", 1), center=params.get("center"))
+        if name == "cylinder":
+            # $fn = 0 keeps OpenSCAD's $fa/$fs rule, which SolidPython spells segments=None
+            return cylinder(**{key: params.get(key) for key in ("h", "r", "r1", "r2", "d", "d1", "d2", "center")},
+                            segments=int(params["$fn"]) if params.get("$fn") else None)
+        if name == "translate":
+            v = list(params.get("v", [0, 0, 0]))
+            return translate(v + [0] * (3 - len(v)))(*children)
+        return BOOLEAN_OPERATIONS[name]()(*children)
+
+def evaluate_scad(source):
+    # SolidPython object for a whole .scad source; top-level objects are unioned
+    evaluator = Evaluator()
+    return group(evaluator.run(Parser(source).statements(), evaluator.globals))
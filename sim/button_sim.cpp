@@ -0,0 +1,109 @@
+// Host-side simulator for the firmware button loop (see simulate_buttons.py).
+//
+// Builds the same polling/debounce code as the firmware (src/buttons.h) against
+// a mocked Arduino layer: pins are driven from a trace read on stdin, millis()
+// comes from a simulated clock and every dispatched press is reported on stdout
+// instead of being sent over BLE/USB HID.
+//
+// Input:  <num_buttons> <debounce_ms> <loop_delay_us> <read_cost_us> <duration_us>
+//         <matrix_rows> <settle_us>
+//         followed by "<time_us> <button> <pressed>" lines sorted by time.
+//         matrix_rows 0 simulates direct wiring; otherwise button i sits at
+//         row i / cols, column i % cols of a matrix with ceil(num_buttons / rows)
+//         columns, scanned with scan_matrix().
+// Output: one "<time_us> <button>" line per dispatched press.
+
+#include <cstdio>
+#include <vector>
+#include "buttons.h"
+
+static unsigned long long sim_time_us = 0;
+static std::vector<bool> pin_pressed;
+
+// Mocked Arduino API
+static unsigned long millis() { return (unsigned long)(sim_time_us / 1000); }
+static bool read_pressed(uint8_t pin) { return pin_pressed[pin]; }
+
+struct TraceEvent {
+    unsigned long long time_us;
+    int button;
+    int pressed;
+};
+
+int main() {
+    int num_buttons;
+    unsigned long debounce_ms;
+    unsigned long long loop_delay_us, read_cost_us, duration_us, settle_us;
+    int matrix_rows;
+    if (scanf("%d %lu %llu %llu %llu %d %llu", &num_buttons, &debounce_ms, &loop_delay_us, &read_cost_us, &duration_us,
+              &matrix_rows, &settle_us) != 7) {
+        fprintf(stderr, "invalid header\n");
+        return 1;
+    }
+
+    std::vector<TraceEvent> trace;
+    TraceEvent event;
+    while (scanf("%llu %d %d", &event.time_us, &event.button, &event.pressed) == 3) {
+        trace.push_back(event);
+    }
+
+    // Button i is wired to "pin" i of the mocked GPIO bank, or to matrix position i
+    int matrix_cols = matrix_rows > 0 ? (num_buttons + matrix_rows - 1) / matrix_rows : 0;
+    if (matrix_cols > 32) {
+        fprintf(stderr, "matrix needs %d columns, at most 32 are supported\n", matrix_cols);
+        return 1;
+    }
+    if (matrix_rows == 0 && num_buttons > 256) {
+        // Button pins are uint8_t, so button 256 would read pin 0 again
+        fprintf(stderr, "direct wiring has %d buttons, at most 256 are supported\n", num_buttons);
+        return 1;
+    }
+    if (matrix_rows > 0 && num_buttons > 255) {
+        // keymap holds 1-based button indices as uint8_t, like MATRIX_KEYMAP
+        fprintf(stderr, "matrix has %d buttons, at most 255 are supported\n", num_buttons);
+        return 1;
+    }
+    std::vector<Button> buttons;
+    std::vector<uint8_t> keymap(matrix_rows * matrix_cols, 0);
+    for (int i = 0; i < num_buttons; i++) {
+        buttons.push_back(Button{(uint8_t)i, (uint32_t)(i + 1), matrix_rows == 0, 0, false});
+        if (matrix_rows > 0) {
+            keymap[i] = (uint8_t)(i + 1);
+        }
+    }
+    std::vector<MatrixRow> rows(matrix_rows, MatrixRow{0, 0});
+    pin_pressed.assign(num_buttons, false);
+    size_t selected_row = 0;
+    auto select_row = [&](size_t row, bool selected) { if (selected) selected_row = row; };
+    auto read_columns = [&]() {
+        uint32_t bits = 0;
+        for (int col = 0; col < matrix_cols; col++) {
+            size_t button = selected_row * matrix_cols + col;
+            if (button < pin_pressed.size() && pin_pressed[button]) {
+                bits |= 1UL << col;
+            }
+        }
+        return bits;
+    };
+    auto report = [](const Button& btn) { printf("%llu %u\n", sim_time_us, btn.number - 1); };
+
+    size_t next_event = 0;
+    while (sim_time_us < duration_us) {
+        while (next_event < trace.size() && trace[next_event].time_us <= sim_time_us) {
+            pin_pressed[trace[next_event].button] = trace[next_event].pressed != 0;
+            next_event++;
+        }
+
+        if (matrix_rows > 0) {
+            scan_matrix(buttons.data(), keymap.data(), rows.data(), matrix_rows, matrix_cols, millis(), debounce_ms,
+                        select_row, read_columns, report);
+            // One loop pass: settle and one register read per row, then delay(LOOP_DELAY_MS)
+            sim_time_us += (settle_us + read_cost_us) * matrix_rows + loop_delay_us;
+        } else {
+            scan_buttons(buttons.data(), buttons.size(), millis(), debounce_ms, read_pressed, report);
+            // One loop pass: a digitalRead per button, then delay(LOOP_DELAY_MS)
+            sim_time_us += read_cost_us * num_buttons + loop_delay_us;
+        }
+    }
+    return 0;
+}
@@ -0,0 +1,156 @@
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+import numpy as np
+import config
+from generate_firmware_config import MAX_MATRIX_BUTTONS
+from profiling import add_profile_arguments, profile_command, profiled
+
+# Press-to-report latency and bounce rejection benchmark for the firmware
+# button loop. Synthetic bouncy press traces are fed to a host build of
+# src/buttons.h (sim/button_sim.cpp) and the reported presses are matched
+# against the ground truth.
+
+SIM_SOURCE = os.path.join("sim", "button_sim.cpp")
+FIRMWARE_SRC_DIR = "src"
+MAX_DIRECT_BUTTONS = 256 # Button pins are uint8_t; more would wrap around to pin 0
+
+def check_button_count(num_buttons, matrix_rows):
+    # The limits sim/button_sim.cpp enforces, checked before anything is built
+    if matrix_rows == 0 and num_buttons > MAX_DIRECT_BUTTONS:
+        raise ValueError(f"Direct wiring supports at most {MAX_DIRECT_BUTTONS} buttons, got {num_buttons}")
+    if matrix_rows > 0 and num_buttons > MAX_MATRIX_BUTTONS:
+        raise ValueError(f"A key matrix supports at most {MAX_MATRIX_BUTTONS} buttons, got {num_buttons}")
+
+def compile_simulator(build_dir, compiler="g++"):
+    if shutil.which(compiler) is None:
+        raise RuntimeError(f"{compiler} not found. A host C++ compiler is needed to build the simulator.")
+    binary = os.path.join(build_dir, "button_sim")
+    command = [compiler, "-O2", "-std=c++17", "-I", FIRMWARE_SRC_DIR, SIM_SOURCE, "-o", binary]
+    subprocess.run(command, check=True, capture_output=True, text=True)
+    return binary
+
+def bounce_edges(rng, time_us, pressed, max_bounces, bounce_us):
+    # The contact chatters a few times before settling in its new state
+    count = rng.integers(0, max_bounces + 1)
+    offsets = np.sort(rng.uniform(0, bounce_us, 2 * count)).astype(np.int64)
+    edges = [(time_us, pressed)]
+    for i, offset in enumerate(offsets):
+        edges.append((time_us + int(offset), pressed if i % 2 else not pressed))
+    return edges
+
+def generate_trace(num_buttons, duration_ms, press_rate_hz, hold_ms, bounce_ms, max_bounces, seed=0):
+    # Returns (pin events, presses). Events are (time_us, button, pressed);
+    # presses are (button, press_time_us) of every real press.
+    rng = np.random.default_rng(seed)
+    duration_us = int(duration_ms * 1000)
+    bounce_us = int(bounce_ms * 1000)
+    events = []
+    presses = []
+    for button in range(num_buttons):
+        t = int(rng.exponential(1e6 / press_rate_hz))
+        while True:
+            hold = int(rng.uniform(*hold_ms) * 1000)
+            if t + hold + bounce_us >= duration_us:
+                break
+            presses.append((button, t))
+            events += [(e_t, button, e_p) for e_t, e_p in bounce_edges(rng, t, True, max_bounces, bounce_us)]
+            events += [(e_t, button, e_p) for e_t, e_p in bounce_edges(rng, t + hold, False, max_bounces, bounce_us)]
+            # Next press no sooner than the release bounce has died down
+            t += hold + bounce_us + int(rng.exponential(1e6 / press_rate_hz))
+    events.sort()
+    return events, presses
+
+def run_simulation(binary, events, num_buttons, debounce_ms, loop_delay_ms, read_cost_us, duration_ms,
+                   matrix_rows=0, settle_us=0):
+    # matrix_rows 0 simulates direct wiring, otherwise a key matrix with that many rows
+    lines = [f"{num_buttons} {debounce_ms} {int(loop_delay_ms * 1000)} {read_cost_us} {duration_ms * 1000} "
+             f"{matrix_rows} {settle_us}"]
+    lines += [f"{t} {b} {int(p)}" for t, b, p in events]
+    result = subprocess.run([binary], input="\n".join(lines) + "\n", check=True, capture_output=True, text=True)
+    return [tuple(int(v) for v in line.split()) for line in result.stdout.splitlines()]
+
+def evaluate(presses, reports, num_buttons):
+    # Match each report to the press it falls after; first report per press is
+    # the real one, further reports are duplicates, presses without one are missed
+    latencies = []
+    missed = 0
+    duplicates = 0
+    for button in range(num_buttons):
+        press_times = np.array(sorted(t for b, t in presses if b == button), dtype=np.int64)
+        report_times = np.array(sorted(t for t, b in reports if b == button), dtype=np.int64)
+        owner = np.searchsorted(press_times, report_times, side="right") - 1
+        valid = owner >= 0
+        duplicates += int(np.count_nonzero(~valid)) # Reports before any press
+        owner, report_times = owner[valid], report_times[valid]
+        counts = np.bincount(owner, minlength=len(press_times))
+        missed += int(np.count_nonzero(counts == 0))
+        duplicates += int(np.sum(np.maximum(counts - 1, 0)))
+        reported, first = np.unique(owner, return_index=True)
+        latencies.append((report_times[first] - press_times[reported]) / 1000)
+    return {
+        "presses": len(presses),
+        "missed": missed,
+        "duplicates": duplicates,
+        "latency_ms": np.concatenate(latencies) if latencies else np.array([]),
+    }
+
+def parse_values(text, cast=float):
+    return [cast(v) for v in text.split(",")]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate the firmware button loop against synthetic bounce traces.")
+    parser.add_argument("--debounce", default=str(config.DEBOUNCE_MS), help="DEBOUNCE_MS values, comma separated")
+    parser.add_argument("--loop-delay", default=str(config.LOOP_DELAY_MS), help="LOOP_DELAY_MS values, comma separated")
+    parser.add_argument("--buttons", default=str(config.NUM_BUTTONS), help="Button counts, comma separated")
+    parser.add_argument("--matrix-rows",
+                        default=str(len(config.MATRIX_ROW_PINS) if config.BUTTON_WIRING == "matrix" else 0),
+                        help="Key matrix row counts, comma separated (0 = direct wiring)")
+    parser.add_argument("--settle-us", type=int, default=config.MATRIX_SETTLE_US, help="Matrix row settle time in us")
+    parser.add_argument("--target-ms", type=float, default=config.LATENCY_TARGET_MS, help="p99 latency budget in ms")
+    parser.add_argument("--duration", type=float, default=60, help="Simulated seconds per run")
+    parser.add_argument("--rate", type=float, default=2.0, help="Average presses per second per button")
+    parser.add_argument("--hold", default="40,150", help="Min,max press hold time in ms")
+    parser.add_argument("--bounce", type=float, default=5.0, help="Contact bounce window in ms")
+    parser.add_argument("--max-bounces", type=int, default=4, help="Maximum chatter cycles per edge")
+    parser.add_argument("--read-cost-us", type=int, default=1, help="Simulated cost of one digitalRead in us")
+    parser.add_argument("--seed", type=int, default=0)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    hold_ms = tuple(parse_values(args.hold))
+    duration_ms = int(args.duration * 1000)
+    for num_buttons in parse_values(args.buttons, int):
+        for matrix_rows in parse_values(args.matrix_rows, int):
+            try:
+                check_button_count(num_buttons, matrix_rows)
+            except ValueError as error:
+                parser.error(str(error))
+
+    with profile_command(args, "simulate_buttons"), tempfile.TemporaryDirectory() as build_dir:
+        with profiled("compile_simulator", "subprocess"):
+            binary = compile_simulator(build_dir)
+        print(f"\n--- Button Loop Simulation ({args.duration:g} s, {args.rate:g} presses/s/button, "
+              f"hold {hold_ms[0]:g}-{hold_ms[1]:g} ms, bounce {args.bounce:g} ms, p99 target {args.target_ms:g} ms) ---")
+        print(f"  {'buttons':>7} {'wiring':>7} {'debounce':>8} {'loop':>6} {'presses':>8} {'p50':>7} {'p90':>7} "
+              f"{'p99':>7} {'max':>7} {'missed':>7} {'dup':>5} {'target':>6}")
+        for num_buttons in parse_values(args.buttons, int):
+            events, presses = generate_trace(num_buttons, duration_ms, args.rate, hold_ms,
+                                             args.bounce, args.max_bounces, args.seed)
+            for matrix_rows in parse_values(args.matrix_rows, int):
+                wiring = f"{matrix_rows}x{-(-num_buttons // matrix_rows)}" if matrix_rows else "direct"
+                for debounce_ms in parse_values(args.debounce, int):
+                    for loop_delay_ms in parse_values(args.loop_delay):
+                        with profiled(f"simulate {num_buttons} buttons", "subprocess"):
+                            reports = run_simulation(binary, events, num_buttons, debounce_ms, loop_delay_ms,
+                                                     args.read_cost_us, duration_ms, matrix_rows, args.settle_us)
+                        result = evaluate(presses, reports, num_buttons)
+                        latency = result["latency_ms"]
+                        p50, p90, p99 = np.percentile(latency, [50, 90, 99]) if latency.size else (float("nan"),) * 3
+                        worst = latency.max() if latency.size else float("nan")
+                        verdict = "ok" if p99 <= args.target_ms else "SLOW"
+                        print(f"  {num_buttons:>7} {wiring:>7} {debounce_ms:>6}ms {loop_delay_ms:>4g}ms {result['presses']:>8} "
+                              f"{p50:>5.1f}ms {p90:>5.1f}ms {p99:>5.1f}ms {worst:>5.1f}ms "
+                              f"{result['missed']:>7} {result['duplicates']:>5} {verdict:>6}")
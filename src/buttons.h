@@ -0,0 +1,119 @@
+#ifndef BUTTONS_H
+#define BUTTONS_H
+
+#include <stddef.h>
+#include <stdint.h>
+
+// Button polling and debouncing, shared by the firmware (main.cpp) and the
+// host-side simulator (sim/button_sim.cpp). Nothing in here touches Arduino or
+// HID APIs directly: pin reads and press handling are passed in, so the same
+// code can run against mocked hardware.
+
+// Button state and debounce
+struct Button {
+    const uint8_t PIN;
+    uint32_t number;
+    bool last_stable_state; // Last raw reading (true for pressed)
+    unsigned long last_debounce_time; // Last time the raw state changed
+    bool pressed; // True if button is currently considered pressed (debounced)
+};
+
+// What a button sends, one entry per button (BUTTON_ACTION_TABLE in config.h)
+enum ButtonActionType : uint8_t { ACTION_KEY, ACTION_MACRO };
+enum ButtonTarget : uint8_t { TARGET_AUTO, TARGET_BLE, TARGET_USB };
+
+struct ButtonAction {
+    uint8_t pin;
+    ButtonActionType type;
+    ButtonTarget target; // TARGET_AUTO: BLE when connected, otherwise USB
+    uint8_t key; // Key code for ACTION_KEY
+    const char* macro; // Text typed for ACTION_MACRO
+};
+
+// Send one action through any keyboard with write(uint8_t) and print(const char*)
+template <typename KeyboardType>
+void send_action(KeyboardType& keyboard, const ButtonAction& action) {
+    if (action.type == ACTION_KEY) {
+        keyboard.write(action.key);
+    } else {
+        keyboard.print(action.macro);
+    }
+}
+
+// Feed one raw reading into a button; returns true when it becomes pressed
+inline bool update_button(Button& btn, bool reading, unsigned long now, unsigned long debounce_ms) {
+    bool new_press = false;
+
+    if (reading != btn.last_stable_state) {
+        btn.last_debounce_time = now;
+    }
+
+    if ((now - btn.last_debounce_time) > debounce_ms) {
+        if (reading != btn.pressed) {
+            btn.pressed = reading;
+            new_press = btn.pressed;
+        }
+    }
+    btn.last_stable_state = reading;
+    return new_press;
+}
+
+// Poll every button once. read_pressed(pin) returns true while a pin reads as
+// pressed; on_press(btn) is called for each debounced press.
+template <typename ReadPressed, typename OnPress>
+void scan_buttons(Button* buttons, size_t count, unsigned long now, unsigned long debounce_ms,
+                  ReadPressed read_pressed, OnPress on_press) {
+    for (size_t i = 0; i < count; i++) {
+        Button& btn = buttons[i];
+        if (update_button(btn, read_pressed(btn.PIN), now, debounce_ms)) {
+            on_press(btn);
+        }
+    }
+}
+
+// Row/column key matrix (BUTTON_MATRIX in config.h). Each switch sits in
+// series with a diode between a column and a row; rows are selected one at a
+// time and all columns of the selected row are read in one go.
+struct MatrixRow {
+    uint32_t last_reading; // Raw column bits from the previous scan (1 = pressed)
+    uint32_t pressed; // Debounced column bits
+};
+
+// Poll the whole matrix once. select_row(row, selected) drives a row line,
+// read_columns() returns the pressed column bits of the selected row and
+// keymap[row * num_cols + col] is the 1-based index into buttons, 0 for an
+// unpopulated position. Only keys whose reading moved or that are still
+// settling run through the debounce logic, so an idle scan costs one compare
+// per row however many keys there are.
+template <typename SelectRow, typename ReadColumns, typename OnPress>
+void scan_matrix(Button* buttons, const uint8_t* keymap, MatrixRow* rows, size_t num_rows, size_t num_cols,
+                 unsigned long now, unsigned long debounce_ms,
+                 SelectRow select_row, ReadColumns read_columns, OnPress on_press) {
+    for (size_t r = 0; r < num_rows; r++) {
+        select_row(r, true);
+        uint32_t reading = read_columns();
+        select_row(r, false);
+
+        MatrixRow& row = rows[r];
+        uint32_t active = (reading ^ row.last_reading) | (reading ^ row.pressed);
+        row.last_reading = reading;
+        while (active) {
+            size_t col = __builtin_ctz(active);
+            uint32_t bit = 1UL << col;
+            active &= active - 1;
+
+            uint8_t index = keymap[r * num_cols + col];
+            if (index == 0) {
+                row.pressed = (row.pressed & ~bit) | (reading & bit); // Nothing to debounce
+                continue;
+            }
+            Button& btn = buttons[index - 1];
+            if (update_button(btn, (reading & bit) != 0, now, debounce_ms)) {
+                on_press(btn);
+            }
+            row.pressed = btn.pressed ? (row.pressed | bit) : (row.pressed & ~bit);
+        }
+    }
+}
+
+#endif // BUTTONS_H
@@ -7,28 +7,24 @@
 #include "USBHIDMouse.h"
 #include <BleKeyboard.h>
 #include <BleMouse.h>
+#include "buttons.h"
 
 // Pin definitions for buttons
 // All PIN definitions are now in config.h
 
-// Button state and debounce
-struct Button {
-    const uint8_t PIN;
-    uint32_t number;
-    bool last_stable_state; // Last confirmed stable state (true for released, false for pressed)
-    unsigned long last_debounce_time; // Last time the raw state changed
-    bool pressed; // True if button is currently considered pressed (debounced)
-};
-
-Button buttons[] = {
-    {PIN_ENTER, 1, true, 0, false},
-    {PIN_ESC, 2, true, 0, false},
-    {PIN_PAGE_UP, 3, true, 0, false},
-    {PIN_PAGE_DOWN, 4, true, 0, false},
-    {PIN_MACRO_1, 5, true, 0, false},
-    {PIN_MACRO_2, 6, true, 0, false},
-    {PIN_MACRO_3, 7, true, 0, false}
-};
+// Button state and debounce logic are in buttons.h
+
+// Buttons and their actions are generated into config.h from config.py
+Button buttons[NUM_BUTTONS] = BUTTON_STATE_TABLE;
+
+#if BUTTON_MATRIX
+#include "soc/gpio_reg.h"
+
+static const uint8_t matrix_row_pins[MATRIX_ROWS] = MATRIX_ROW_PINS;
+static const uint8_t matrix_col_pins[MATRIX_COLS] = MATRIX_COL_PINS;
+static const uint8_t matrix_keymap[MATRIX_ROWS * MATRIX_COLS] = MATRIX_KEYMAP;
+static MatrixRow matrix_rows[MATRIX_ROWS];
+#endif
 
 // DEBOUNCE_MS is now in config.h
 
@@ -49,6 +45,9 @@ USBHIDGamepad Gamepad;
 USBHIDConsumerControl ConsumerControl;
 USBHIDSystemControl SystemControl;
 
+// Expanded here because the table refers to KEY_* codes from the HID headers
+static const ButtonAction button_actions[NUM_BUTTONS] = BUTTON_ACTION_TABLE;
+
 const int buttonPin = 0;
 int previousButtonState = HIGH;
 
@@ -95,9 +94,19 @@ void setup() {
   Serial.begin(115200);
 
   // Setup buttons
+#if BUTTON_MATRIX
+  for (uint8_t pin : matrix_row_pins) {
+      pinMode(pin, OUTPUT);
+      digitalWrite(pin, HIGH); // Deselected
+  }
+  for (uint8_t pin : matrix_col_pins) {
+      pinMode(pin, INPUT_PULLUP);
+  }
+#else
   for (auto& btn : buttons) {
       pinMode(btn.PIN, INPUT_PULLUP);
   }
+#endif
 
   // Setup LED
   pinMode(PIN_LED, OUTPUT);
@@ -130,47 +139,50 @@ void setup() {
   }
 }
 
-void handle_buttons() {
-    for (auto& btn : buttons) {
-        bool reading = (digitalRead(btn.PIN) == LOW); // LOW means pressed
+void dispatch_button(const Button& btn) {
+    Serial.printf("Button %d pressed\n", btn.number);
 
-        if (reading != btn.last_stable_state) {
-            btn.last_debounce_time = millis();
-        }
+    // Button numbers are 1-based indices into the action table
+    const ButtonAction& action = button_actions[btn.number - 1];
+    if (action.target != TARGET_USB && bleKeyboard.isConnected()) {
+        send_action(bleKeyboard, action);
+    } else if (action.target != TARGET_BLE && HID.ready()) {
+        send_action(Keyboard, action);
+    }
+}
 
-        if ((millis() - btn.last_debounce_time) > DEBOUNCE_MS) {
-            if (reading != btn.pressed) {
-                btn.pressed = reading;
-                if (btn.pressed) {
-                    Serial.printf("Button %d pressed\n", btn.number);
-
-                    if (bleKeyboard.isConnected()) {
-                        switch (btn.PIN) {
-                            case PIN_ENTER: bleKeyboard.write(KEY_RETURN); break;
-                            case PIN_ESC: bleKeyboard.write(KEY_ESC); break;
-                            case PIN_PAGE_UP: bleKeyboard.write(KEY_PAGE_UP); break;
-                            case PIN_PAGE_DOWN: bleKeyboard.write(KEY_PAGE_DOWN); break;
-                            case PIN_MACRO_1: bleKeyboard.print(MACRO_1_OUTPUT); break;
-                            case PIN_MACRO_2: bleKeyboard.print(MACRO_2_OUTPUT); break;
-                            case PIN_MACRO_3: bleKeyboard.print(MACRO_3_OUTPUT); break;
-                        }
-                    } else if (HID.ready()) {
-                        switch (btn.PIN) {
-                            case PIN_ENTER: Keyboard.write(KEY_RETURN); break;
-                            case PIN_ESC: Keyboard.write(KEY_ESC); break;
-                            case PIN_PAGE_UP: Keyboard.write(KEY_PAGE_UP); break;
-                            case PIN_PAGE_DOWN: Keyboard.write(KEY_PAGE_DOWN); break;
-                            case PIN_MACRO_1: Keyboard.print(MACRO_1_OUTPUT); break;
-                            case PIN_MACRO_2: Keyboard.print(MACRO_2_OUTPUT); break;
-                            case PIN_MACRO_3: Keyboard.print(MACRO_3_OUTPUT); break;
-                        }
-                    }
-                }
-            }
+#if BUTTON_MATRIX
+// All columns of the selected row from two GPIO input register reads instead
+// of one digitalRead per column
+static uint32_t read_matrix_columns() {
+    uint64_t levels = ((uint64_t)REG_READ(GPIO_IN1_REG) << 32) | REG_READ(GPIO_IN_REG);
+    uint32_t pressed = 0;
+    for (size_t col = 0; col < MATRIX_COLS; col++) {
+        if (!((levels >> matrix_col_pins[col]) & 1)) { // LOW means pressed
+            pressed |= 1UL << col;
         }
-        btn.last_stable_state = reading;
     }
+    return pressed;
+}
+
+static void select_matrix_row(size_t row, bool selected) {
+    digitalWrite(matrix_row_pins[row], selected ? LOW : HIGH);
+    if (selected) {
+        delayMicroseconds(MATRIX_SETTLE_US);
+    }
+}
+
+void handle_buttons() {
+    scan_matrix(buttons, matrix_keymap, matrix_rows, MATRIX_ROWS, MATRIX_COLS, millis(), DEBOUNCE_MS,
+                select_matrix_row, read_matrix_columns, dispatch_button);
+}
+#else
+void handle_buttons() {
+    scan_buttons(buttons, sizeof(buttons) / sizeof(buttons[0]), millis(), DEBOUNCE_MS,
+                 [](uint8_t pin) { return digitalRead(pin) == LOW; }, // LOW means pressed
+                 dispatch_button);
 }
+#endif
 
 void loop() {
   handle_buttons();
@@ -211,5 +223,5 @@ void loop() {
       digitalWrite(PIN_LED, LOW);
   }
 
-  delay(10);
+  delay(LOOP_DELAY_MS);
 }
\ No newline at end of file
@@ -0,0 +1,170 @@
+import argparse
+import importlib
+import inspect
+import os
+import sys
+import tempfile
+import time
+import config
+from config_trace import trace_config_reads
+from build import define_stages, select_stages, stage_dependencies
+
+# Watch mode: keep every generator imported in one process and regenerate only
+# the artifacts affected by an edit.
+#
+# Each stage runs under config_trace.trace_config_reads(), which records the
+# config attributes it reads. When config.py changes on disk it is reloaded and
+# its attributes are diffed against the previous values; only stages that read
+# a changed attribute (plus the stages consuming their outputs) run again, so
+# e.g. editing LED_OFFSET_X rebuilds the top panel DXF and its PNG but leaves
+# the other panels and the button board alone (the 3D lid, the nested sheets
+# and the BOM draw the same LED hole, so they rebuild too). `watch.py --check`
+# guards that. Edits to a generator script reload that module and rerun the
+# stages that list it as an input.
+
+MISSING = object()
+
+# The laser-cut panel and button board stages an LED_OFFSET_X edit may reach
+CHECK_STAGE_PREFIXES = ("lasercut_", "render_lasercut_", "pcb_")
+LED_EDIT_STAGES = {"lasercut_top", "render_lasercut_top"}
+
+def config_snapshot(cfg):
+    return {
+        name: value for name, value in vars(cfg).items()
+        if not name.startswith("_") and not inspect.ismodule(value)
+    }
+
+def changed_attributes(old, new):
+    return {name for name in old.keys() | new.keys() if old.get(name, MISSING) != new.get(name, MISSING)}
+
+def topological_order(stages):
+    deps = stage_dependencies(stages)
+    ordered, done = [], set()
+    while len(ordered) < len(stages):
+        for stage in stages:
+            if stage.name not in done and deps[stage.name] <= done:
+                ordered.append(stage)
+                done.add(stage.name)
+    return ordered
+
+class Watcher:
+    def __init__(self, stages):
+        self.stages = topological_order(stages)
+        self.deps = stage_dependencies(self.stages)
+        produced = {output for stage in self.stages for output in stage.outputs}
+        # Only hand-edited inputs are watched; generated ones are tracked through the stage graph
+        self.sources = sorted({i for stage in self.stages for i in stage.inputs if i not in produced})
+        self.reads = {} # Stage name -> config attributes read on its last run, None if it failed
+        self.snapshot = config_snapshot(config)
+        self.mtimes = self.source_mtimes()
+
+    def source_mtimes(self):
+        return {path: os.stat(path).st_mtime_ns if os.path.exists(path) else None for path in self.sources}
+
+    def affected_stages(self, attributes, files):
+        # Stages reading a changed attribute or file, failed stages, and everything downstream
+        names = {
+            stage.name for stage in self.stages
+            if self.reads.get(stage.name) is None
+            or self.reads[stage.name] & attributes
+            or set(stage.inputs) & files
+        }
+        grew = True
+        while grew:
+            downstream = {stage.name for stage in self.stages if self.deps[stage.name] & names}
+            grew = not downstream <= names
+            names |= downstream
+        return names
+
+    def run(self, names):
+        start = time.perf_counter()
+        for stage in self.stages:
+            if stage.name not in names:
+                continue
+            stage_start = time.perf_counter()
+            try:
+                with trace_config_reads() as tracer:
+                    stage.func(*stage.args)
+                self.reads[stage.name] = set(tracer.reads)
+                print(f"  {stage.name:<28} {(time.perf_counter() - stage_start) * 1000:8.1f} ms")
+            except Exception as e:
+                self.reads[stage.name] = None
+                print(f"  {stage.name:<28}   FAILED ({type(e).__name__}: {e})")
+        print(f"  {'total':<28} {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+    def reload_sources(self, files):
+        # Returns the names of the config attributes that changed
+        attributes = set()
+        for path in files:
+            module_name = os.path.splitext(os.path.basename(path))[0]
+            if path.endswith(".py") and module_name in sys.modules:
+                try:
+                    importlib.reload(sys.modules[module_name])
+                except Exception as e:
+                    print(f"Could not reload {path}: {type(e).__name__}: {e}")
+                    continue
+        if "config.py" in files:
+            new_snapshot = config_snapshot(config)
+            attributes = changed_attributes(self.snapshot, new_snapshot)
+            self.snapshot = new_snapshot
+        return attributes
+
+    def poll(self):
+        mtimes = self.source_mtimes()
+        files = {path for path, mtime in mtimes.items() if mtime != self.mtimes.get(path)}
+        if not files:
+            return False
+        self.mtimes = mtimes
+        attributes = self.reload_sources(files)
+        names = self.affected_stages(attributes, files - {"config.py"})
+        changed = ", ".join(sorted(attributes)) or "no config values"
+        print(f"\n[{time.strftime('%H:%M:%S')}] {', '.join(sorted(files))} changed ({changed})")
+        if names:
+            self.run(names)
+        else:
+            print("  Nothing to rebuild")
+        return True
+
+    def watch(self, interval):
+        print("Initial build:")
+        self.run({stage.name for stage in self.stages})
+        print(f"\nWatching {', '.join(self.sources)} (Ctrl+C to stop)")
+        try:
+            while True:
+                self.poll()
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            print("\nStopped watching.")
+
+def check_dependencies():
+    # Build the panel and board stages once in a scratch directory, then make
+    # sure an LED_OFFSET_X edit reaches only the top panel and its PNG among them
+    names = [stage.name for stage in define_stages()
+             if stage.name.startswith(CHECK_STAGE_PREFIXES) and stage.name != "lasercut_sheets"]
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        try:
+            os.makedirs("renderings")
+            watcher = Watcher(select_stages(define_stages(), names))
+            watcher.run(set(names))
+        finally:
+            os.chdir(cwd)
+    affected = watcher.affected_stages({"LED_OFFSET_X"}, set())
+    if affected != LED_EDIT_STAGES:
+        raise SystemExit(f"Dependency check failed: LED_OFFSET_X reaches {', '.join(sorted(affected))} "
+                         f"(expected only {', '.join(sorted(LED_EDIT_STAGES))})")
+    print(f"Dependency check passed: LED_OFFSET_X reaches only {', '.join(sorted(affected))}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Regenerate affected artifacts whenever config.py or a generator changes.")
+    parser.add_argument("stages", nargs="*", help="Stages to keep up to date (default: all). Dependencies are included.")
+    parser.add_argument("--interval", type=float, default=0.2, help="Polling interval in seconds")
+    parser.add_argument("--check", action="store_true", help="Check that config edits only reach the stages drawing the edited feature, then exit")
+    args = parser.parse_args()
+
+    if args.check:
+        check_dependencies()
+        raise SystemExit(0)
+    os.makedirs("renderings", exist_ok=True)
+    Watcher(select_stages(define_stages(), args.stages)).watch(args.interval)